@@ -0,0 +1,389 @@
+#!/usr/bin/env python3
+"""
+Bridge supervisor — runs the thermal and EMG bridges in one Python process.
+
+Instead of one interpreter (or node process) per bridge, the supervisor loads
+usb-thermal-receiver.py and usb-serial-emg-receiver.py as modules, runs each
+serial read loop on its own thread under a single asyncio loop, and:
+
+  - shares one pooled HTTP session for all API posts (and spool replays)
+  - restarts a bridge with exponential backoff when its port errors or vanishes
+  - serves combined status + metrics as JSON on http://127.0.0.1:8790/status
+
+The EMG Wi-Fi server (emg-server.js) has no Python port; with --emg-wifi it is
+run as a supervised child process so it gets the same restart handling.
+
+With --features, one ml/streaming_features.py engine is fed every thermal frame
+and EMG sample (on this PC's clock) from one patient's station, so it takes
+at most one thermal and one EMG port, and /status carries the current model
+feature vector (emg_variability, hr_trend_slope, temp_anomaly). Adding
+--baseline-store DIR --subject ID measures temp_anomaly against that subject's
+stored per-time-of-day baseline (ml/thermal_baseline.py, needs numpy) and folds
+every frame from that one thermal port into it.
+
+Usage:
+  python bridges/bridge-supervisor.py --thermal COM3 --emg auto
+  python bridges/bridge-supervisor.py --thermal /dev/ttyACM0 --emg-wifi
+  python bridges/bridge-supervisor.py --thermal COM3 COM7 --emg COM4 COM5   # a ward in one process
+  python bridges/bridge-supervisor.py --thermal COM3 --emg COM4 --features   # one patient's station
+  python bridges/bridge-supervisor.py --thermal COM3 --features --baseline-store ml/baselines --subject subj-17
+
+Env:
+  BRIDGE_STATUS_PORT=8790   (0 = no status endpoint)
+  BRIDGE_STATUS_HOST=127.0.0.1
+  plus each bridge's own env (NEXTJS_API_URL, EMG_API_URL, ..._WS_PORT, BRIDGE_SPOOL*)
+
+Requirements: pip install pyserial requests
+"""
+
+import argparse
+import asyncio
+import importlib.util
+import json
+import os
+import sys
+import threading
+import time
+
+try:
+    import requests
+    from requests.adapters import HTTPAdapter
+except ImportError:
+    print("requests is required: pip install requests")
+    sys.exit(1)
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+PROJECT_ROOT = os.path.dirname(HERE)
+if HERE not in sys.path:
+    sys.path.insert(0, HERE)
+
+TAG = "[supervisor]"
+STATUS_PORT = int(os.environ.get("BRIDGE_STATUS_PORT", "8790") or 0)
+STATUS_HOST = os.environ.get("BRIDGE_STATUS_HOST", "127.0.0.1")
+
+RESTART_MIN = 1.0
+RESTART_MAX = 60.0
+HEALTHY_AFTER = 30.0  # a bridge that ran this long restarts from the minimum delay again
+
+
+def load_bridge(filename, name):
+    """Import a hyphen-named bridge script as a module."""
+    spec = importlib.util.spec_from_file_location(name, os.path.join(HERE, filename))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def run_in_thread(fn, *args, name=None):
+    """Run a blocking bridge loop on a daemon thread; returns an awaitable for its result."""
+    loop = asyncio.get_running_loop()
+    future = loop.create_future()
+
+    def settle(setter, value):
+        if not future.done():
+            setter(value)
+
+    def target():
+        try:
+            result = fn(*args)
+        except BaseException as e:
+            loop.call_soon_threadsafe(settle, future.set_exception, e)
+        else:
+            loop.call_soon_threadsafe(settle, future.set_result, result)
+
+    threading.Thread(target=target, name=name, daemon=True).start()
+    return future
+
+
+class SupervisedBridge:
+    """Runs attempt() forever, restarting with backoff whenever it returns or raises."""
+
+    def __init__(self, name, attempt, describe=None):
+        self.name = name
+        self.attempt = attempt
+        self.describe = describe
+        self.state = "starting"
+        self.restarts = 0
+        self.last_error = None
+        self.started_at = None
+
+    async def run(self):
+        backoff = RESTART_MIN
+        while True:
+            self.state = "running"
+            self.started_at = time.time()
+            try:
+                await self.attempt()
+                self.last_error = "exited"
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self.last_error = f"{type(e).__name__}: {e}"
+            if time.time() - self.started_at >= HEALTHY_AFTER:
+                backoff = RESTART_MIN
+            self.state = "restarting"
+            self.restarts += 1
+            print(f"{TAG} {self.name} stopped ({self.last_error}); restarting in {backoff:.0f}s")
+            await asyncio.sleep(backoff)
+            backoff = min(backoff * 2, RESTART_MAX)
+
+    def status(self):
+        status = {
+            "state": self.state,
+            "restarts": self.restarts,
+            "last_error": self.last_error,
+            "uptime_s": round(time.time() - self.started_at, 1) if self.started_at and self.state == "running" else 0,
+        }
+        if self.describe:
+            status.update(self.describe())
+        return status
+
+
+def spool_status(module):
+    return module.spool.status() if getattr(module, "spool", None) else None
+
+
+def feature_engine(baseline_store=None, subject=None):
+    """A streaming feature engine from ml/ (stdlib only, so no extra requirements).
+
+    With baseline_store (a thermal_baseline.py store; needs numpy), temp_anomaly is
+    measured against the subject's stored baseline and every frame updates it, so
+    the engine must only be fed that subject's single thermal port (see supervise).
+    """
+    ml_dir = os.path.join(PROJECT_ROOT, "ml")
+    if ml_dir not in sys.path:
+        sys.path.append(ml_dir)
+    from streaming_features import FeatureEngine
+
+    engine = FeatureEngine()
+    if baseline_store:
+        from thermal_baseline import BaselineStore
+
+        store = BaselineStore(baseline_store)
+        engine.baseline = store.baseline_fn(subject)
+        engine.on_thermal = store.recorder(subject)
+    return engine
+
+
+def thermal_bridges(ports, session, features=None):
+    """One supervised reader per thermal port, plus a status function for what they share.
+
+    The module's spool, publisher, counters and latency histograms are shared by
+    every port, so they are reported once (under "modules" in /status); each
+    port reports only its own device clock.
+    """
+    thermal = load_bridge("usb-thermal-receiver.py", "usb_thermal_receiver")
+    thermal.session = session
+    thermal.features = features
+    thermal.start_services()
+
+    def make(port):
+        current = {"device": None}
+
+        async def attempt():
+            current["device"] = await run_in_thread(thermal.device_id_for, port, name=f"thermal-id-{port}")
+            if not await run_in_thread(thermal.run_with_pyserial, port, name=f"thermal-{port}"):
+                raise RuntimeError(f"could not open {port}")
+
+        def describe():
+            clock = thermal.clocks.get(current["device"])
+            return {"port": port, "device_id": current["device"], "clock": clock.snapshot() if clock else None}
+
+        return SupervisedBridge(f"thermal:{port}" if len(ports) > 1 else "thermal", attempt, describe)
+
+    def module_status():
+        return {
+            "ports": list(ports),
+            "stats": dict(thermal.stats),
+            "latency": {name: h.snapshot() for name, h in thermal.histograms.items()},
+            "spool": spool_status(thermal),
+        }
+
+    return [make(port) for port in ports], module_status
+
+
+def emg_usb_bridges(ports, session, features=None):
+    """One supervised reader per EMG port ("auto" detects a single ESP32), plus a status function for what they share."""
+    emg = load_bridge("usb-serial-emg-receiver.py", "usb_serial_emg_receiver")
+    emg.session = session
+    emg.features = features
+    emg.start_services()
+
+    def make(port):
+        current = {"port": None}
+
+        async def attempt():
+            target = port
+            if not target or target.lower() == "auto":
+                target = await run_in_thread(emg.auto_detect, name="emg-probe")
+                if not target:
+                    raise RuntimeError("no ESP32/MCU with EMG data found")
+            current["port"] = target
+            await run_in_thread(emg.run, target, name=f"emg-{target}")
+
+        def describe():
+            return {"port": current["port"]}
+
+        return SupervisedBridge(f"emg:{port}" if len(ports) > 1 else "emg", attempt, describe)
+
+    def module_status():
+        recent = list(emg.latencies)
+        latency = {f"p{q}": emg.percentile(recent, q) for q in (50, 95, 99)} if recent else None
+        return {"ports": list(ports), "stats": dict(emg.stats), "latency_ms": latency, "spool": spool_status(emg)}
+
+    return [make(port) for port in ports], module_status
+
+
+def emg_wifi_bridge():
+    server = os.path.join(HERE, "emg-server.js")
+
+    async def attempt():
+        proc = await asyncio.create_subprocess_exec("node", server, cwd=PROJECT_ROOT)
+        try:
+            code = await proc.wait()
+        finally:
+            if proc.returncode is None:
+                proc.terminate()
+                await proc.wait()
+        raise RuntimeError(f"emg-server.js exited with code {code}")
+
+    return SupervisedBridge("emg-wifi", attempt)
+
+
+def process_status(started_at, bridges, features=None, modules=None):
+    status = {
+        "pid": os.getpid(),
+        "uptime_s": round(time.time() - started_at, 1),
+        "threads": threading.active_count(),
+        "bridges": {b.name: b.status() for b in bridges},
+        "modules": {name: describe() for name, describe in (modules or {}).items()},
+    }
+    if features:
+        status["features"] = features.snapshot()
+    try:
+        import resource
+
+        usage = resource.getrusage(resource.RUSAGE_SELF)
+        status["max_rss_mb"] = round(usage.ru_maxrss / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+        status["cpu_s"] = round(usage.ru_utime + usage.ru_stime, 2)
+    except ImportError:
+        pass
+    return status
+
+
+async def serve_status(started_at, bridges, features=None, modules=None):
+    async def handle(reader, writer):
+        try:
+            request_line = (await reader.readline()).decode("latin-1").split()
+            while (await reader.readline()) not in (b"\r\n", b"\n", b""):
+                pass
+            path = request_line[1] if len(request_line) > 1 else "/"
+            if path.split("?")[0] in ("/", "/status", "/metrics"):
+                code, body = "200 OK", json.dumps(process_status(started_at, bridges, features, modules), indent=2)
+            else:
+                code, body = "404 Not Found", json.dumps({"error": "not found"})
+            data = body.encode("utf-8")
+            writer.write(
+                f"HTTP/1.1 {code}\r\nContent-Type: application/json\r\nContent-Length: {len(data)}\r\n"
+                "Access-Control-Allow-Origin: *\r\nConnection: close\r\n\r\n".encode("latin-1") + data
+            )
+            await writer.drain()
+        finally:
+            writer.close()
+
+    server = await asyncio.start_server(handle, STATUS_HOST, STATUS_PORT)
+    print(f"{TAG} status on http://{STATUS_HOST}:{STATUS_PORT}/status")
+    async with server:
+        await server.serve_forever()
+
+
+def shared_session():
+    """One keep-alive connection pool for every bridge's API posts."""
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=4, pool_maxsize=8)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+
+def as_list(ports):
+    if not ports:
+        return []
+    return [ports] if isinstance(ports, str) else list(ports)
+
+
+async def supervise(thermal_port=None, emg_port=None, emg_wifi=False, features=False, baseline_store=None, subject=None):
+    """Run the requested bridges until cancelled (Ctrl+C).
+
+    thermal_port / emg_port may be a single port or a list of ports. The feature
+    engine describes one patient, so features allows at most one port of each.
+    """
+    thermal_ports, emg_ports = as_list(thermal_port), as_list(emg_port)
+    if features and (len(thermal_ports) > 1 or len(emg_ports) > 1):
+        raise ValueError("features need at most one thermal and one EMG port: the engine describes one patient")
+    if baseline_store and not (features and subject):
+        raise ValueError("baseline_store needs features and a subject, like --baseline-store")
+    if emg_wifi and emg_ports:
+        raise ValueError("emg_port and emg_wifi are alternatives")
+    session = shared_session()
+    engine = feature_engine(baseline_store, subject) if features else None
+    bridges, modules = [], {}
+    if thermal_ports:
+        added, modules["thermal"] = thermal_bridges(thermal_ports, session, engine)
+        bridges += added
+    if emg_wifi:
+        bridges.append(emg_wifi_bridge())
+    elif emg_ports:
+        added, modules["emg"] = emg_usb_bridges(emg_ports, session, engine)
+        bridges += added
+    if not bridges:
+        print(f"{TAG} no bridges requested.")
+        return
+
+    print(f"{TAG} running {', '.join(b.name for b in bridges)} in one process (pid {os.getpid()})")
+    tasks = [asyncio.create_task(b.run(), name=b.name) for b in bridges]
+    if STATUS_PORT:
+        tasks.append(asyncio.create_task(serve_status(time.time(), bridges, engine, modules), name="status"))
+    try:
+        await asyncio.gather(*tasks)
+    finally:
+        for t in tasks:
+            t.cancel()
+        session.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run CCA sensor bridges in one supervised process")
+    parser.add_argument("--thermal", metavar="PORT", nargs="+", help="Thermal serial port(s) (Pi USB gadget / Bluetooth COM)")
+    parser.add_argument("--emg", metavar="PORT", nargs="+", help="EMG serial port(s), or 'auto' to detect the ESP32")
+    parser.add_argument("--emg-wifi", action="store_true", help="Supervise the EMG Wi-Fi server (node emg-server.js) instead of --emg")
+    parser.add_argument("--features", action="store_true", help="Compute the risk model's features from the streams (shown in /status)")
+    parser.add_argument("--baseline-store", metavar="DIR", help="With --features: per-subject thermal baseline store (ml/thermal_baseline.py)")
+    parser.add_argument("--subject", help="Subject id in --baseline-store (the patient on the --thermal port)")
+    args = parser.parse_args()
+
+    if not args.thermal and not args.emg and not args.emg_wifi:
+        parser.error("nothing to run: pass --thermal, --emg and/or --emg-wifi")
+    if args.emg and args.emg_wifi:
+        parser.error("--emg and --emg-wifi both post EMG for the station: pick one")
+    if args.features and (len(args.thermal or []) > 1 or len(args.emg or []) > 1):
+        parser.error("--features describes one patient: give at most one --thermal and one --emg port")
+    if args.baseline_store and not (args.features and args.subject):
+        parser.error("--baseline-store needs --features and --subject")
+    try:
+        asyncio.run(
+            supervise(
+                thermal_port=args.thermal,
+                emg_port=args.emg,
+                emg_wifi=args.emg_wifi,
+                features=args.features,
+                baseline_store=args.baseline_store,
+                subject=args.subject,
+            )
+        )
+    except KeyboardInterrupt:
+        print(f"\n{TAG} stopped.")
+
+
+if __name__ == "__main__":
+    main()
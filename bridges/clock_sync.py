@@ -0,0 +1,110 @@
+"""
+Clock offset / latency tracking for the bridges.
+
+The Pi stamps frames with its own clock (datetime.utcnow()), which is unrelated
+to the PC's. ClockSync runs an NTP-style exchange over whatever command channel
+a device offers (serial-wifi-listener.py and the thermal server's WebSocket both
+answer {"cmd": "ping", "t0": ...} with the times they received and answered it):
+
+  t0  PC sends ping          t1  device receives it
+  t3  PC receives pong       t2  device answers
+  offset = ((t1 - t0) + (t2 - t3)) / 2      (device clock minus PC clock)
+  rtt    = (t3 - t0) - (t2 - t1)
+
+The estimate comes from the lowest-RTT sample among the recent ones, since
+queueing delay only ever inflates RTT and skews the offset.
+
+LatencyHistogram keeps fixed-bucket counts (for tuning dashboards) plus a
+window of recent values for percentiles.
+"""
+
+import bisect
+import time
+from collections import deque
+from datetime import datetime, timezone
+
+BUCKETS_MS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000)
+
+
+def ping_command():
+    return {"cmd": "ping", "t0": time.time()}
+
+
+def parse_utc(ts):
+    """Seconds since the epoch for a naive-UTC ISO timestamp (as the Pi senders write), else None."""
+    if not isinstance(ts, str):
+        return None
+    try:
+        dt = datetime.fromisoformat(ts)
+    except ValueError:
+        return None
+    if dt.tzinfo is None:
+        dt = dt.replace(tzinfo=timezone.utc)
+    return dt.timestamp()
+
+
+class ClockSync:
+    def __init__(self, window=16):
+        self.samples = deque(maxlen=window)  # (rtt, offset)
+        self.offset = None
+        self.rtt = None
+
+    @property
+    def synced(self):
+        return self.offset is not None
+
+    def update(self, reply, t3=None):
+        """Fold in a ping reply carrying t0/t1/t2; returns False if it is not one."""
+        t3 = time.time() if t3 is None else t3
+        try:
+            t0, t1, t2 = float(reply["t0"]), float(reply["t1"]), float(reply["t2"])
+        except (KeyError, TypeError, ValueError):
+            return False
+        rtt = (t3 - t0) - (t2 - t1)
+        if rtt < 0:
+            return False
+        self.samples.append((rtt, ((t1 - t0) + (t2 - t3)) / 2))
+        self.rtt, self.offset = min(self.samples)
+        return True
+
+    def to_local(self, remote_ts):
+        """Convert a device timestamp (epoch seconds on the device clock) to the PC clock."""
+        return remote_ts - self.offset
+
+    def snapshot(self):
+        if not self.synced:
+            return None
+        return {"offset_ms": round(self.offset * 1000, 2), "rtt_ms": round(self.rtt * 1000, 2), "samples": len(self.samples)}
+
+
+class LatencyHistogram:
+    def __init__(self, recent=2000):
+        self.counts = [0] * (len(BUCKETS_MS) + 1)
+        self.recent = deque(maxlen=recent)
+        self.total = 0
+
+    def observe(self, ms):
+        self.counts[bisect.bisect_left(BUCKETS_MS, ms)] += 1
+        self.recent.append(ms)
+        self.total += 1
+
+    def percentile(self, q):
+        if not self.recent:
+            return None
+        ordered = sorted(self.recent)
+        return ordered[min(len(ordered) - 1, int(len(ordered) * q / 100))]
+
+    def snapshot(self):
+        labels = [f"<={b}ms" for b in BUCKETS_MS] + [f">{BUCKETS_MS[-1]}ms"]
+        return {
+            "count": self.total,
+            "p50": self.percentile(50),
+            "p95": self.percentile(95),
+            "p99": self.percentile(99),
+            "buckets": dict(zip(labels, self.counts)),
+        }
+
+    def describe(self):
+        if not self.recent:
+            return "n/a"
+        return f"p50={self.percentile(50):.1f} p95={self.percentile(95):.1f} p99={self.percentile(99):.1f}ms"
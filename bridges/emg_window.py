@@ -0,0 +1,95 @@
+"""
+Streaming EMG window features for the Python EMG bridge.
+
+Keeps a NumPy ring of recent samples (value + arrival time) and summarizes the
+last window on demand:
+
+  rms             root mean square of the raw value
+  envelope        one-pole low-pass of the rectified, mean-removed signal
+  peak            largest raw value in the window
+  zero_crossings  sign changes of the mean-removed signal
+  mean_freq_hz    power-weighted mean frequency of the window spectrum
+  median_freq_hz  frequency splitting the window's spectral power in half
+
+Used by usb-serial-emg-receiver.py when EMG_AGGREGATE_HZ is set.
+
+Requirements: pip install numpy
+"""
+
+import math
+
+import numpy as np
+
+
+class EmgWindowAggregator:
+    def __init__(self, window_ms=250, envelope_ms=100, sample_rate=0.0, capacity=8192):
+        self.window_s = window_ms / 1000
+        self.envelope_tau = envelope_ms / 1000
+        self.sample_rate = sample_rate  # 0 = estimate from arrival times
+        self.capacity = capacity
+        self.values = np.zeros(capacity)
+        self.times = np.zeros(capacity)
+        self.count = 0  # total samples ever added; write index is count % capacity
+        self.envelope = 0.0
+        self._baseline = None
+        self._last_t = None
+
+    def add(self, value, t):
+        """Append one sample taken at t (seconds, monotonic)."""
+        i = self.count % self.capacity
+        self.values[i] = value
+        self.times[i] = t
+        self.count += 1
+
+        # O(1) per-sample envelope: track a slow baseline, rectify around it, smooth.
+        if self._baseline is None:
+            self._baseline = value
+        dt = 0.0 if self._last_t is None else max(t - self._last_t, 0.0)
+        self._last_t = t
+        alpha = 1 - math.exp(-dt / self.envelope_tau) if dt > 0 else 0.0
+        self._baseline += (alpha / 10) * (value - self._baseline)
+        self.envelope += alpha * (abs(value - self._baseline) - self.envelope)
+
+    def window(self, now):
+        """Return (values, times) of samples within the window ending at now, oldest first."""
+        n = min(self.count, self.capacity)
+        if n == 0:
+            return self.values[:0], self.times[:0]
+        end = self.count % self.capacity
+        if self.count <= self.capacity:
+            values, times = self.values[:n], self.times[:n]
+        else:
+            values = np.concatenate((self.values[end:], self.values[:end]))
+            times = np.concatenate((self.times[end:], self.times[:end]))
+        keep = times >= now - self.window_s
+        return values[keep], times[keep]
+
+    def features(self, now):
+        """Summarize the current window; None if it holds fewer than two samples."""
+        values, times = self.window(now)
+        n = len(values)
+        if n < 2:
+            return None
+
+        centered = values - values.mean()
+        signs = np.signbit(centered)
+        feats = {
+            "samples": int(n),
+            "rms": float(np.sqrt(np.mean(values * values))),
+            "envelope": float(self.envelope),
+            "peak": float(values.max()),
+            "zero_crossings": int(np.count_nonzero(signs[1:] != signs[:-1])),
+        }
+
+        span = float(times[-1] - times[0])
+        fs = self.sample_rate or ((n - 1) / span if span > 0 else 0.0)
+        feats["sample_rate_hz"] = round(fs, 2)
+        if fs > 0 and n >= 8:
+            power = np.abs(np.fft.rfft(centered * np.hanning(n))) ** 2
+            freqs = np.fft.rfftfreq(n, d=1 / fs)
+            total = power.sum()
+            if total > 0:
+                cumulative = np.cumsum(power)
+                feats["mean_freq_hz"] = float((freqs * power).sum() / total)
+                feats["median_freq_hz"] = float(freqs[np.searchsorted(cumulative, total / 2)])
+        return feats
@@ -0,0 +1,212 @@
+"""
+Serial port discovery shared by the bridges and scripts/sensor-setup.py.
+
+  - identify_device / describe_port: classify ports by VID:PID and USB strings
+  - probe_ports: open all candidate ports at once (thread pool) and return the
+    first one that yields a recognized line, cancelling the other probes
+  - find_port: probe_ports plus a small on-disk cache keyed by the device's
+    VID:PID:serial number, so a restart with the same hardware goes straight to
+    its port (even if Windows renumbered the COM port) without probing
+  - probe_all / device_id: every port carrying a given stream, and a stable
+    per-device ID for tagging frames in multi-device bridges
+
+Env:
+  SERIAL_DISCOVERY_CACHE=~/.cca-serial-ports.json   ("" = no cache)
+
+Requirements: pip install pyserial
+"""
+
+import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import serial
+import serial.tools.list_ports
+
+PI_USB_VID_PID = ("0525", "A4A7")  # Linux USB Gadget serial
+ESP32_KEYWORDS = ["cp210", "ch340", "ch341", "ftdi", "silicon", "esp", "wch"]
+
+CACHE_PATH = os.path.expanduser(os.environ.get("SERIAL_DISCOVERY_CACHE", "~/.cca-serial-ports.json"))
+READ_SLICE = 0.25  # probes re-check for cancellation this often while blocked on a quiet port
+
+
+def list_ports():
+    return sorted(serial.tools.list_ports.comports(), key=lambda x: x.device)
+
+
+def vid_pid(port_info):
+    vid = f"{port_info.vid:04X}" if port_info.vid else ""
+    pid = f"{port_info.pid:04X}" if port_info.pid else ""
+    return vid, pid
+
+
+def is_raspberry_pi(port_info):
+    return vid_pid(port_info) == PI_USB_VID_PID
+
+
+def is_bluetooth(port_info):
+    desc = " ".join([port_info.description or "", port_info.manufacturer or "", port_info.hwid or ""]).lower()
+    return "bluetooth" in desc or "bthenum" in desc
+
+
+def is_esp32_port(port_info):
+    """Any non-Pi USB serial device counts; USB-UART bridge names make it likely."""
+    vid, _ = vid_pid(port_info)
+    return bool(vid) and vid != PI_USB_VID_PID[0]
+
+
+def identify_device(port_info):
+    """Guess what device is on this port."""
+    vid, _ = vid_pid(port_info)
+    desc = (port_info.description or "").lower()
+    mfg = (port_info.manufacturer or "").lower()
+
+    if is_raspberry_pi(port_info):
+        return "Raspberry Pi (USB gadget serial)"
+
+    for kw in ESP32_KEYWORDS:
+        if kw in desc or kw in mfg:
+            return "ESP32 / MCU (USB-serial adapter)"
+
+    if "bluetooth" in desc or "bluetooth" in mfg:
+        return "Bluetooth serial"
+
+    if vid:
+        return "USB serial device"
+
+    return "Unknown"
+
+
+def describe_port(port_info):
+    vid, pid = vid_pid(port_info)
+    return {
+        "port": port_info.device,
+        "description": port_info.description or "",
+        "manufacturer": port_info.manufacturer or "",
+        "vid": vid,
+        "pid": pid,
+        "serial_number": port_info.serial_number or "",
+        "device_type": identify_device(port_info),
+    }
+
+
+def device_key(port_info):
+    """Stable identity of the physical device (None for ports without USB ids)."""
+    vid, pid = vid_pid(port_info)
+    if not vid:
+        return None
+    return f"{vid}:{pid}:{port_info.serial_number or ''}"
+
+
+def probe_port(device, baud, recognize, window, stop=None):
+    """True if a line satisfying recognize() arrives on device within window seconds."""
+    deadline = time.monotonic() + window
+    try:
+        ser = serial.Serial(device, baud, timeout=READ_SLICE)
+    except (serial.SerialException, OSError):
+        return False
+    try:
+        buf = b""
+        while not (stop and stop.is_set()):
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return False
+            ser.timeout = min(remaining, READ_SLICE)
+            chunk = ser.read(ser.in_waiting or 1)
+            if not chunk:
+                continue
+            buf += chunk
+            while b"\n" in buf:
+                raw, buf = buf.split(b"\n", 1)
+                if recognize(raw.decode("utf-8", errors="replace").strip()):
+                    return True
+        return False
+    except (serial.SerialException, OSError):
+        return False
+    finally:
+        ser.close()
+
+
+def probe_ports(devices, baud, recognize, window, log=print):
+    """Probe all devices concurrently; return the first that yields a recognized line, else None."""
+    if not devices:
+        return None
+    stop = threading.Event()
+    with ThreadPoolExecutor(max_workers=len(devices), thread_name_prefix="probe") as pool:
+        futures = {pool.submit(probe_port, d, baud, recognize, window, stop): d for d in devices}
+        for future in as_completed(futures):
+            if future.result():
+                stop.set()
+                return futures[future]
+            log(f"  no match on {futures[future]}")
+    return None
+
+
+def probe_all(devices, baud, recognize, window):
+    """Probe all devices concurrently; return every device that yields a recognized line."""
+    if not devices:
+        return []
+    with ThreadPoolExecutor(max_workers=len(devices), thread_name_prefix="probe") as pool:
+        results = list(pool.map(lambda d: probe_port(d, baud, recognize, window), devices))
+    return [d for d, ok in zip(devices, results) if ok]
+
+
+def load_cache():
+    if not CACHE_PATH:
+        return {}
+    try:
+        with open(CACHE_PATH) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def remember_port(role, port_info, baud):
+    key = device_key(port_info)
+    if not CACHE_PATH or not key:
+        return
+    cache = load_cache()
+    cache[role] = {"key": key, "port": port_info.device, "baud": baud, "seen": time.time()}
+    try:
+        tmp = CACHE_PATH + ".tmp"
+        with open(tmp, "w") as f:
+            json.dump(cache, f, indent=2)
+        os.replace(tmp, CACHE_PATH)
+    except OSError:
+        pass
+
+
+def cached_port(role, ports):
+    """Current device path of the cached device for role, if it is plugged in."""
+    entry = load_cache().get(role)
+    if not entry:
+        return None
+    for p in ports:
+        if device_key(p) == entry.get("key"):
+            return p.device
+    return None
+
+
+def find_port(role, candidates, baud, recognize, window, ports=None, log=print):
+    """Cached port for role if present, else the first candidate that probes positive (then cached)."""
+    ports = ports if ports is not None else list_ports()
+    known = cached_port(role, ports)
+    if known:
+        log(f"  using cached {role} device on {known}")
+        return known
+    log(f"  probing {', '.join(p.device for p in candidates) or 'nothing'} concurrently @ {baud} (up to {window:g}s)...")
+    found = probe_ports([p.device for p in candidates], baud, recognize, window, log=log)
+    if found:
+        remember_port(role, next(p for p in candidates if p.device == found), baud)
+    return found
+
+
+def device_id(device, ports=None):
+    """Stable ID for whatever is plugged into device: VID:PID:serial when the USB serial
+    number is known (survives COM renumbering and replugging), else the port name."""
+    for p in ports if ports is not None else list_ports():
+        if p.device == device and p.serial_number:
+            return device_key(p)
+    return device
@@ -0,0 +1,176 @@
+"""
+Durable offline spool for the Python bridges.
+
+When the Next.js API is unreachable (deploy, restart, laptop sleep) the bridges
+append frames here instead of dropping them. A background drainer replays the
+spool in order, in batches, with exponential backoff until the API answers
+again. Payloads are stored verbatim, so the sensor's own timestamps survive; a
+payload without one gets the time the bridge received it.
+
+Storage is a single SQLite file in WAL mode (one row per frame). While the spool
+is non-empty, new frames are appended behind the backlog rather than posted
+directly, so the API still sees them in capture order.
+
+Env:
+  BRIDGE_SPOOL=1                  (0 = drop frames when the API is down, as before)
+  BRIDGE_SPOOL_DIR=bridges/.spool
+  BRIDGE_SPOOL_MAX_ROWS=500000    (oldest rows are dropped beyond this)
+"""
+
+import json
+import os
+import sqlite3
+import threading
+import time
+
+SPOOL_ENABLED = os.environ.get("BRIDGE_SPOOL", "1").strip().lower() not in ("0", "false", "no")
+SPOOL_DIR = os.environ.get("BRIDGE_SPOOL_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), ".spool"))
+MAX_ROWS = int(os.environ.get("BRIDGE_SPOOL_MAX_ROWS", "500000"))
+
+BATCH_SIZE = 500
+BACKOFF_MIN = 1.0
+BACKOFF_MAX = 60.0
+REPORT_INTERVAL = 10.0
+
+
+def open_spool(name, send, tag="[spool]"):
+    """Return a started Spool for this bridge, or None when BRIDGE_SPOOL=0."""
+    if not SPOOL_ENABLED:
+        return None
+    os.makedirs(SPOOL_DIR, exist_ok=True)
+    spool = Spool(os.path.join(SPOOL_DIR, f"{name}.sqlite3"), send, tag=tag)
+    spool.start()
+    return spool
+
+
+class Spool:
+    """Append-only frame queue on SQLite with an ordered background replayer.
+
+    send(payload) must return True once the API has dealt with the payload
+    (accepted or rejected as invalid) and False when it should be retried later.
+    """
+
+    def __init__(self, path, send, tag="[spool]", batch_size=BATCH_SIZE, max_rows=MAX_ROWS):
+        self.path = path
+        self.send = send
+        self.tag = tag
+        self.batch_size = batch_size
+        self.max_rows = max_rows
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._db = sqlite3.connect(path, isolation_level=None, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS frames (id INTEGER PRIMARY KEY AUTOINCREMENT, received_at REAL NOT NULL, payload TEXT NOT NULL)"
+        )
+        self.rows = self._db.execute("SELECT COUNT(*) FROM frames").fetchone()[0]
+        self._in_flight = (0, 0)  # (last id, rows) of the batch the drainer is sending
+        self.spooled = 0
+        self.replayed = 0
+        self.dropped = 0
+        self.replay_rate = 0.0
+
+    def start(self):
+        if self.rows:
+            print(f"{self.tag} {self.rows} frame(s) left in spool from a previous run; replaying")
+        threading.Thread(target=self._drain_loop, daemon=True).start()
+
+    def pending(self):
+        return self.rows
+
+    def append(self, payload):
+        """Queue payload behind anything already spooled."""
+        now = time.time()
+        with self._lock:
+            self._db.execute("INSERT INTO frames (received_at, payload) VALUES (?, ?)", (now, json.dumps(payload)))
+            self.rows += 1
+            self.spooled += 1
+            last_sending, sending = self._in_flight
+            if self.rows - sending > self.max_rows:
+                # the batch being sent is left alone (it may already be delivered), so the
+                # spool can hold one batch more than max_rows
+                deleted = self._db.execute(
+                    "DELETE FROM frames WHERE id IN (SELECT id FROM frames WHERE id > ? ORDER BY id LIMIT ?)",
+                    (last_sending, self.rows - sending - self.max_rows),
+                ).rowcount
+                self.rows -= deleted
+                self.dropped += deleted
+        if self.rows == 1:
+            print(f"{self.tag} API unavailable — spooling frames to {self.path}")
+        self._wake.set()
+
+    def status(self):
+        """Spool size, age and replay throughput for summaries."""
+        with self._lock:
+            oldest = self._db.execute("SELECT MIN(received_at) FROM frames").fetchone()[0]
+        try:
+            size = sum(os.path.getsize(self.path + ext) for ext in ("", "-wal") if os.path.exists(self.path + ext))
+        except OSError:
+            size = 0
+        return {
+            "rows": self.rows,
+            "bytes": size,
+            "oldest_age_s": round(time.time() - oldest, 1) if oldest else 0.0,
+            "spooled": self.spooled,
+            "replayed": self.replayed,
+            "dropped": self.dropped,
+            "replay_rate": round(self.replay_rate, 1),
+        }
+
+    def describe(self):
+        s = self.status()
+        return (
+            f"spool rows={s['rows']} size={s['bytes'] / 1024:.0f}KB oldest={s['oldest_age_s']:.0f}s "
+            f"replayed={s['replayed']} ({s['replay_rate']:.0f}/s) dropped={s['dropped']}"
+        )
+
+    def _next_batch(self):
+        with self._lock:
+            batch = self._db.execute(
+                "SELECT id, received_at, payload FROM frames ORDER BY id LIMIT ?", (self.batch_size,)
+            ).fetchall()
+            self._in_flight = (batch[-1][0], len(batch)) if batch else (0, 0)
+            return batch
+
+    def _ack(self, last_id, count):
+        with self._lock:
+            self.rows -= self._db.execute("DELETE FROM frames WHERE id <= ?", (last_id,)).rowcount
+            self.replayed += count
+            self._in_flight = (0, 0)
+
+    def _drain_loop(self):
+        backoff = BACKOFF_MIN
+        last_report = 0.0
+        while True:
+            if not self.rows:
+                self._wake.clear()
+                self._wake.wait(REPORT_INTERVAL)
+                continue
+
+            batch = self._next_batch()
+            started = time.perf_counter()
+            sent = 0
+            for row_id, received_at, text in batch:
+                payload = json.loads(text)
+                payload.setdefault("timestamp", int(received_at * 1000))
+                if not self.send(payload):
+                    break
+                sent += 1
+            if sent:
+                self._ack(batch[sent - 1][0], sent)
+                self.replay_rate = sent / max(time.perf_counter() - started, 1e-6)
+
+            now = time.time()
+            if not self.rows:
+                print(f"{self.tag} spool drained — {self.describe()}")
+                backoff = BACKOFF_MIN
+            elif now - last_report >= REPORT_INTERVAL:
+                print(f"{self.tag} {self.describe()}")
+                last_report = now
+
+            if sent < len(batch):
+                time.sleep(backoff)
+                backoff = min(backoff * 2, BACKOFF_MAX)
+            else:
+                backoff = BACKOFF_MIN
@@ -10,13 +10,38 @@ Usage:
   python bridges/usb-serial-emg-receiver.py              # auto-detect ESP32
   python bridges/usb-serial-emg-receiver.py COM4          # specify port
   python bridges/usb-serial-emg-receiver.py COM4 115200   # specify port + baud
+  python bridges/usb-serial-emg-receiver.py COM4 COM5 COM6  # several ESP32s, one process
+  python bridges/usb-serial-emg-receiver.py all           # every port that sends EMG data
+
+With several ports each gets a reader thread; all share one HTTP session and
+spool, and every frame is tagged with "device_id" (VID:PID:USB serial number,
+or the port name when the adapter has no serial number).
 
 Env:
-  EMG_SERIAL_PORT=auto|COMx   EMG_BAUD_RATE=115200
+  EMG_SERIAL_PORT=auto|all|COMx[,COMy...]   EMG_BAUD_RATE=115200
   EMG_API_URL=http://127.0.0.1:3000/api/emg/ws
+  EMG_PROBE_MS=6000   (auto-detect window; all candidate ports are probed at once)
   DEBUG_EMG=1
 
-Requirements: pip install pyserial requests
+Window aggregation (optional, needs numpy): instead of one POST per sample,
+post the newest emg_data sample EMG_AGGREGATE_HZ times a second with a
+"window" object of features over the last EMG_WINDOW_MS (rms, envelope, peak,
+zero_crossings, mean/median frequency). See emg_window.py.
+  EMG_AGGREGATE_HZ=10      (0 = off, forward every sample)
+  EMG_WINDOW_MS=250
+  EMG_SAMPLE_RATE=0        (Hz for the FFT; 0 = estimate from arrival times)
+  EMG_RAW_DECIMATE=0       (also forward every Nth raw sample; 0 = none)
+
+Live view (optional, needs websockets): EMG_WS_PORT=8766 also broadcasts every
+decoded sample on ws://BRIDGE_WS_HOST:EMG_WS_PORT for direct browser
+subscription; the API keeps receiving posts (use aggregation to thin them).
+  EMG_WS_PORT=0            (0 = off)
+  BRIDGE_WS_HOST=127.0.0.1
+
+Offline buffering: frames that cannot be posted are spooled to SQLite and
+replayed in order once the API is back (BRIDGE_SPOOL*, see spool.py).
+
+Requirements: pip install pyserial requests  (numpy for aggregation, websockets for EMG_WS_PORT)
 """
 
 import json
@@ -24,10 +49,13 @@ import os
 import sys
 import time
 import threading
+from collections import deque
+
+from spool import open_spool
 
 try:
     import serial
-    import serial.tools.list_ports
+    import serial_discovery as discovery
 except ImportError:
     print("pyserial is required: pip install pyserial")
     sys.exit(1)
@@ -41,74 +69,67 @@ except ImportError:
 TAG = "[emg-usb-py]"
 
 API_URL = os.environ.get("EMG_API_URL", "http://127.0.0.1:3000/api/emg/ws")
-SERIAL_PORT = sys.argv[1] if len(sys.argv) > 1 else os.environ.get("EMG_SERIAL_PORT", "")
-BAUD = int(sys.argv[2]) if len(sys.argv) > 2 else int(os.environ.get("EMG_BAUD_RATE", "115200"))
+SERIAL_PORT = os.environ.get("EMG_SERIAL_PORT", "")
+BAUD = int(os.environ.get("EMG_BAUD_RATE", "115200"))
 DEBUG = os.environ.get("DEBUG_EMG", "").strip().lower() in ("1", "true", "yes")
 RECONNECT_DELAY = 5
-
-PI_VID_PID = ("0525", "A4A7")
-ESP32_KEYWORDS = ["cp210", "ch340", "ch341", "ftdi", "silicon", "esp", "wch"]
-
-stats = {"posted": 0, "failures": 0, "parse_errors": 0, "skipped": 0}
-
-
-def is_esp32_port(p):
-    desc = ((p.description or "") + " " + (p.manufacturer or "")).lower()
-    if p.vid and f"{p.vid:04X}" != PI_VID_PID[0]:
-        for kw in ESP32_KEYWORDS:
-            if kw in desc:
-                return True
-        if p.vid:
-            return True
-    return False
-
-
-def is_bluetooth(p):
-    desc = ((p.description or "") + " " + (p.manufacturer or "") + " " + (p.hwid or "")).lower()
-    return "bluetooth" in desc or "bthenum" in desc
-
-
-def is_raspberry_pi(p):
-    return p.vid and f"{p.vid:04X}" == PI_VID_PID[0] and f"{p.pid:04X}" == PI_VID_PID[1]
+PROBE_SECONDS = max(1.0, int(os.environ.get("EMG_PROBE_MS", "6000")) / 1000)
+AGGREGATE_HZ = float(os.environ.get("EMG_AGGREGATE_HZ", "0") or 0)
+WINDOW_MS = int(os.environ.get("EMG_WINDOW_MS", "250"))
+SAMPLE_RATE = float(os.environ.get("EMG_SAMPLE_RATE", "0") or 0)
+RAW_DECIMATE = int(os.environ.get("EMG_RAW_DECIMATE", "0") or 0)
+WS_PORT = int(os.environ.get("EMG_WS_PORT", "0") or 0)
+WS_HOST = os.environ.get("BRIDGE_WS_HOST", "127.0.0.1")
+READ_TIMEOUT = 1.0  # only bounds how long a blocked read waits before re-checking; data wakes it immediately
+
+stats = {"posted": 0, "failures": 0, "parse_errors": 0, "skipped": 0, "aggregated": 0, "windows": 0}
+# Sample-to-POST latency (ms): from the moment a line's bytes are read to the POST completing.
+latencies = deque(maxlen=2000)
+publisher = None  # WebSocketPublisher when EMG_WS_PORT is set
+spool = None  # Spool absorbing frames while the API is down (BRIDGE_SPOOL, see spool.py)
+session = requests.Session()  # bridge-supervisor.py swaps in its shared pool
+features = None  # ml/streaming_features.FeatureEngine fed every sample (bridge-supervisor.py --features)
 
 
 def auto_detect():
     print(f"{TAG} scanning for ESP32/MCU ports...\n")
-    ports = sorted(serial.tools.list_ports.comports(), key=lambda x: x.device)
+    ports = discovery.list_ports()
 
     for p in ports:
         vid_pid = f"{p.vid:04X}:{p.pid:04X}" if p.vid else "-"
         print(f"  {p.device:<10} {p.description or '?':<40} {vid_pid}")
     print()
 
-    candidates = [p for p in ports if is_esp32_port(p) and not is_bluetooth(p) and not is_raspberry_pi(p)]
+    usable = [p for p in ports if not discovery.is_bluetooth(p) and not discovery.is_raspberry_pi(p)]
+    candidates = [p for p in usable if discovery.is_esp32_port(p)] or usable
 
-    if not candidates:
-        non_bt = [p for p in ports if not is_bluetooth(p) and not is_raspberry_pi(p)]
-        candidates = non_bt
-
-    for p in candidates:
-        print(f"{TAG} probing {p.device} @ {BAUD}...")
-        try:
-            ser = serial.Serial(p.device, BAUD, timeout=6)
-            deadline = time.time() + 6
-            while time.time() < deadline:
-                if ser.in_waiting:
-                    line = ser.readline().decode("utf-8", errors="replace").strip()
-                    if looks_like_emg(line):
-                        ser.close()
-                        print(f"{TAG} EMG data detected on {p.device}\n")
-                        return p.device
-                time.sleep(0.05)
-            ser.close()
-            print(f"{TAG}   no EMG data on {p.device}")
-        except serial.SerialException as e:
-            print(f"{TAG}   cannot open {p.device}: {e}")
+    port = discovery.find_port("emg", candidates, BAUD, looks_like_emg, PROBE_SECONDS, ports=ports, log=lambda m: print(f"{TAG} {m.strip()}"))
+    if port:
+        print(f"{TAG} EMG data detected on {port}\n")
+        return port
 
     print(f"{TAG} no ESP32/MCU with EMG data found.")
     return None
 
 
+def read_lines(ser):
+    """Yield (line, arrived_at) as soon as each line arrives.
+
+    Blocks inside the serial driver instead of polling in_waiting, so a sample is
+    dispatched the moment its newline lands and an idle port costs no CPU.
+    """
+    buf = b""
+    while True:
+        chunk = ser.read(ser.in_waiting or 1)
+        if not chunk:
+            continue
+        arrived = time.perf_counter()
+        buf += chunk
+        while b"\n" in buf:
+            raw, buf = buf.split(b"\n", 1)
+            yield raw.decode("utf-8", errors="replace").strip(), arrived
+
+
 def looks_like_emg(line):
     try:
         obj = json.loads(line)
@@ -121,92 +142,223 @@ def looks_like_emg(line):
         return False
 
 
-def post_data(payload):
+def send(payload):
+    """POST one payload. Returns False only when it should be retried (network error or 5xx)."""
     try:
-        r = requests.post(API_URL, json=payload, timeout=5)
-        if r.ok:
-            stats["posted"] += 1
-        else:
-            stats["failures"] += 1
-            if DEBUG:
-                print(f"{TAG} API {r.status_code}")
+        r = session.post(API_URL, json=payload, timeout=5)
     except Exception as e:
         stats["failures"] += 1
         if stats["failures"] <= 3 or stats["failures"] % 50 == 0:
             print(f"{TAG} API error: {e} (failures: {stats['failures']})")
+        return False
+    if r.ok:
+        stats["posted"] += 1
+        return True
+    stats["failures"] += 1
+    if DEBUG:
+        print(f"{TAG} API {r.status_code}")
+    return r.status_code < 500
+
+
+def post_data(payload, arrived=None):
+    if spool and spool.pending():
+        spool.append(payload)
+        return
+    if send(payload):
+        if arrived is not None:
+            latencies.append((time.perf_counter() - arrived) * 1000)
+    elif spool:
+        spool.append(payload)
+
+
+def percentile(values, q):
+    """Nearest-rank percentile of a sequence (q in 0..100); None when empty."""
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * q / 100))]
 
 
 def log_summary():
     while True:
         time.sleep(10)
         if stats["posted"] > 0 or stats["failures"] > 0:
-            print(f"{TAG} summary: posted={stats['posted']} failures={stats['failures']} parse_errors={stats['parse_errors']} skipped={stats['skipped']}")
+            line = f"{TAG} summary: posted={stats['posted']} failures={stats['failures']} parse_errors={stats['parse_errors']} skipped={stats['skipped']}"
+            if AGGREGATE_HZ > 0:
+                line += f" aggregated={stats['aggregated']} windows={stats['windows']}"
+            recent = list(latencies)
+            if recent:
+                p50, p95, p99 = (percentile(recent, q) for q in (50, 95, 99))
+                line += f" latency_ms p50={p50:.1f} p95={p95:.1f} p99={p99:.1f}"
+            if spool and (spool.pending() or spool.replayed):
+                line += f" {spool.describe()}"
+            print(line)
+
+
+def make_aggregator():
+    """Return an EmgWindowAggregator when EMG_AGGREGATE_HZ is set, else None."""
+    if AGGREGATE_HZ <= 0:
+        return None
+    try:
+        from emg_window import EmgWindowAggregator
+    except ImportError:
+        print(f"{TAG} numpy is required for EMG_AGGREGATE_HZ: pip install numpy")
+        sys.exit(1)
+    return EmgWindowAggregator(window_ms=WINDOW_MS, sample_rate=SAMPLE_RATE)
+
+
+class WindowForwarder:
+    """Folds emg_data samples into an aggregator and posts window features at a fixed rate."""
+
+    def __init__(self, aggregator):
+        self.aggregator = aggregator
+        self.period = 1 / AGGREGATE_HZ
+        self.next_emit = 0.0
+        self.seen = 0
+
+    def handle(self, obj, arrived):
+        value = obj.get("muscleActivity", obj.get("voltage"))
+        if obj.get("type") != "emg_data" or not isinstance(value, (int, float)):
+            post_data(obj, arrived)
+            return
+        self.aggregator.add(float(value), arrived)
+        self.seen += 1
+        stats["aggregated"] += 1
+        if arrived >= self.next_emit:
+            # never earlier than a period after this emit: after a gap (or on the first sample)
+            # next_emit lags, and samples from the same read share arrived
+            self.next_emit = max(self.next_emit + self.period, arrived + self.period)
+            feats = self.aggregator.features(arrived)
+            if feats:
+                stats["windows"] += 1
+                post_data({**obj, "window": feats}, arrived)
+                return
+        if RAW_DECIMATE and self.seen % RAW_DECIMATE == 0:
+            post_data(obj, arrived)
+
+
+def detect_all():
+    """Every non-Pi, non-Bluetooth port that yields EMG data within the probe window."""
+    ports = [p for p in discovery.list_ports() if not discovery.is_bluetooth(p) and not discovery.is_raspberry_pi(p)]
+    print(f"{TAG} probing {len(ports)} port(s) for EMG data...")
+    found = discovery.probe_all([p.device for p in ports], BAUD, looks_like_emg, PROBE_SECONDS)
+    print(f"{TAG} EMG data on: {', '.join(found) or 'none'}\n")
+    return found
 
 
 def run(port_path):
     print(f"{TAG} opening {port_path} @ {BAUD}...")
-    ser = serial.Serial(port_path, BAUD, timeout=1)
-    print(f"{TAG} connected — forwarding to {API_URL}")
-    print(f"{TAG} debug: {'on' if DEBUG else 'off'}\n")
+    ser = serial.Serial(port_path, BAUD, timeout=READ_TIMEOUT)
+    device_id = discovery.device_id(port_path)
+    print(f"{TAG} connected to {device_id} — forwarding to {API_URL}")
+    print(f"{TAG} debug: {'on' if DEBUG else 'off'}")
+    aggregator = make_aggregator()
+    forwarder = WindowForwarder(aggregator) if aggregator else None
+    if forwarder:
+        print(f"{TAG} aggregating: {AGGREGATE_HZ:g} windows/s over {WINDOW_MS} ms")
+    print()
 
     first_frame = True
 
     try:
-        while True:
-            if ser.in_waiting:
-                line = ser.readline().decode("utf-8", errors="replace").strip()
-                if not line or not line.startswith("{"):
+        for line, arrived in read_lines(ser):
+            if not line or not line.startswith("{"):
+                stats["skipped"] += 1
+                continue
+
+            try:
+                obj = json.loads(line)
+            except json.JSONDecodeError:
+                stats["parse_errors"] += 1
+                continue
+
+            if "type" not in obj:
+                if isinstance(obj.get("muscleActivity"), (int, float)):
+                    obj["type"] = "emg_data"
+                else:
                     stats["skipped"] += 1
                     continue
-
-                try:
-                    obj = json.loads(line)
-                except json.JSONDecodeError:
-                    stats["parse_errors"] += 1
-                    continue
-
-                if "type" not in obj:
-                    if isinstance(obj.get("muscleActivity"), (int, float)):
-                        obj["type"] = "emg_data"
-                    else:
-                        stats["skipped"] += 1
-                        continue
-
-                if first_frame:
-                    first_frame = False
-                    print(f"{TAG} first frame: type={obj.get('type')} muscleActivity={obj.get('muscleActivity')} voltage={obj.get('voltage')}")
-
-                post_data(obj)
+            obj["device_id"] = device_id
+
+            if first_frame:
+                first_frame = False
+                print(f"{TAG} first frame from {device_id}: type={obj.get('type')} muscleActivity={obj.get('muscleActivity')} voltage={obj.get('voltage')}")
+
+            if publisher:
+                publisher.publish(obj)
+            if features:
+                features.observe(obj, time.time())
+            if forwarder:
+                forwarder.handle(obj, arrived)
             else:
-                time.sleep(0.01)
+                post_data(obj, arrived)
     except serial.SerialException as e:
         print(f"{TAG} serial error: {e}")
-    except KeyboardInterrupt:
-        print(f"\n{TAG} stopped.")
     finally:
         ser.close()
 
 
+def start_services():
+    """Start the optional WebSocket publisher and the offline spool (also used by bridge-supervisor.py)."""
+    global publisher, spool
+    if WS_PORT:
+        from ws_publisher import WebSocketPublisher
+        publisher = WebSocketPublisher(WS_HOST, WS_PORT, tag=TAG).start()
+    spool = open_spool("emg", send, tag=TAG)
+
+
+def serve_port(port):
+    """Forward one port forever, reconnecting after serial errors."""
+    while True:
+        try:
+            run(port)
+        except serial.SerialException as e:
+            print(f"{TAG} {e} — reconnecting in {RECONNECT_DELAY}s...")
+        time.sleep(RECONNECT_DELAY)
+
+
+def parse_ports(args):
+    """Split argv into (ports, baud): numeric args are the baud rate, the rest ports (or auto/all)."""
+    baud = next((int(a) for a in args if a.isdigit()), None)
+    ports = [a for a in args if not a.isdigit()]
+    if not ports:
+        ports = [p.strip() for p in SERIAL_PORT.split(",") if p.strip()]
+    return ports, baud
+
+
 def main():
-    port = SERIAL_PORT.strip()
-    if not port or port.lower() == "auto":
+    global BAUD
+    ports, baud = parse_ports(sys.argv[1:])
+    if baud:
+        BAUD = baud
+    if [p.lower() for p in ports] == ["all"]:
+        ports = detect_all()
+        if not ports:
+            print(f"{TAG} No port is sending EMG data.")
+            sys.exit(1)
+    elif not ports or ports[0].lower() == "auto":
         port = auto_detect()
         if not port:
             print(f"\n{TAG} Could not find an ESP32/MCU.")
             print(f"{TAG} Plug in the ESP32 via USB and try again, or specify: python {sys.argv[0]} COM4")
             sys.exit(1)
+        ports = [port]
+
+    start_services()
 
     summary_thread = threading.Thread(target=log_summary, daemon=True)
     summary_thread.start()
 
-    while True:
-        try:
-            run(port)
-        except serial.SerialException as e:
-            print(f"{TAG} {e} — reconnecting in {RECONNECT_DELAY}s...")
-        except KeyboardInterrupt:
-            break
-        time.sleep(RECONNECT_DELAY)
+    try:
+        if len(ports) == 1:
+            serve_port(ports[0])
+        for port in ports:
+            threading.Thread(target=serve_port, args=(port,), name=f"emg-{port}", daemon=True).start()
+        print(f"{TAG} forwarding {len(ports)} devices: {', '.join(ports)}")
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        print(f"\n{TAG} stopped.")
 
 
 if __name__ == "__main__":
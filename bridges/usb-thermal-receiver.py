@@ -7,51 +7,202 @@ Use this if the Node bridge fails with "Unknown error code 31" on Windows with
 the Pi's USB serial (COM3). Uses PySerial by default; on Windows, if that fails
 with error 31, falls back to opening the port without configuring it (raw read).
 
-Requires: pip install pyserial
+Requires: pip install pyserial  (websockets for THERMAL_WS_PORT)
 
 Usage:
   python usb-thermal-receiver.py COM3
   python usb-thermal-receiver.py COM9
+  python usb-thermal-receiver.py COM3 COM7 COM9   # several Pis, one process
+  python usb-thermal-receiver.py all              # every port sending thermal frames
+
+Every forwarded frame carries "device_id" (VID:PID:USB serial number of the Pi's
+gadget port, else the port name). With several ports each gets a reader thread;
+they share the spool and WebSocket publisher. Standalone, every POST opens its
+own urllib connection; under bridge-supervisor.py they share its pooled
+requests.Session.
+
+Live view: THERMAL_WS_PORT=8765 also broadcasts every frame on
+ws://BRIDGE_WS_HOST:THERMAL_WS_PORT (default host 127.0.0.1) so the browser can
+subscribe directly; THERMAL_API_EVERY=N then forwards only every Nth frame to
+the API for persistence.
+
+Latency: every THERMAL_CLOCK_SYNC_S (default 5, 0 = off) the bridge sends
+{"cmd": "ping"} down the serial link; serial-wifi-listener.py on the Pi answers
+with its clock, giving a Pi↔PC offset (see clock_sync.py). Frames then carry
+"latency_ms" with the corrected capture→forward time, and sensor→bridge and
+bridge→API histograms are printed with the periodic log (and served by
+bridge-supervisor.py's /status).
+
+Encodings: frames sent as thermal_packed / thermal_delta / thermal_batch (the
+Pi sender's live "sender_config" settings, see thermal_codec.py) are decoded
+back to plain thermal_data before anything else sees them, one decoder per
+device so a lost delta line only skips frames until that Pi's next keyframe.
+
+Offline buffering: frames the API does not accept (down, restarting, laptop
+asleep) are spooled to SQLite and replayed in order once it is back
+(BRIDGE_SPOOL*, see spool.py).
 """
 
 import json
 import os
 import sys
+import threading
 import time
 import urllib.request
 import urllib.error
 
+from clock_sync import ClockSync, LatencyHistogram, parse_utc, ping_command
+from spool import open_spool
+
+SENSOR_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "sensor code", "thermal_sensor")
+if SENSOR_DIR not in sys.path:
+    sys.path.append(SENSOR_DIR)
+from thermal_codec import FRAME_TYPES, FrameDecoder  # noqa: E402  (shared with the Pi senders)
+
 # Same API as the Node bridge
 API_URL = os.environ.get("NEXTJS_API_URL", "http://localhost:3000/api/thermal/bt")
 DEFAULT_BAUD = int(os.environ.get("THERMAL_SERIAL_BAUD", "115200"))
+WS_PORT = int(os.environ.get("THERMAL_WS_PORT", "0") or 0)
+WS_HOST = os.environ.get("BRIDGE_WS_HOST", "127.0.0.1")
+API_EVERY = max(1, int(os.environ.get("THERMAL_API_EVERY", "1") or 1))
+RECONNECT_DELAY = 5
+PROBE_SECONDS = 6
+CLOCK_SYNC_INTERVAL = float(os.environ.get("THERMAL_CLOCK_SYNC_S", "5") or 0)
+
+publisher = None  # WebSocketPublisher when THERMAL_WS_PORT is set
+spool = None  # Spool absorbing frames while the API is down
+session = None  # requests.Session shared by bridge-supervisor.py; plain urllib otherwise
+features = None  # ml/streaming_features.FeatureEngine fed every frame (bridge-supervisor.py --features)
+
+stats = {"frames": 0, "posted": 0, "failures": 0}
+clocks = {}  # device_id → ClockSync (Pi clock vs this PC)
+decoders = {}  # device_id → FrameDecoder (delta reference per Pi)
+histograms = {"sensor_to_bridge": LatencyHistogram(), "bridge_to_api": LatencyHistogram()}
+
+
+def send(data):
+    """POST one frame. Returns False only when it should be retried (network error or 5xx)."""
+    if session is not None:
+        return send_with_session(data)
+    body = json.dumps(data).encode("utf-8")
+    req = urllib.request.Request(
+        API_URL,
+        data=body,
+        headers={"Content-Type": "application/json"},
+        method="POST",
+    )
+    try:
+        with urllib.request.urlopen(req, timeout=5):
+            stats["posted"] += 1
+            return True
+    except urllib.error.HTTPError as e:
+        stats["failures"] += 1
+        print("API error:", e)
+        return e.code < 500
+    except (urllib.error.URLError, OSError) as e:
+        stats["failures"] += 1
+        print("API error:", e)
+        return False
+
+
+def send_with_session(data):
+    try:
+        r = session.post(API_URL, json=data, timeout=5)
+    except Exception as e:
+        stats["failures"] += 1
+        print("API error:", e)
+        return False
+    if r.ok:
+        stats["posted"] += 1
+        return True
+    stats["failures"] += 1
+    print("API error:", r.status_code)
+    return r.status_code < 500
+
+
+def device_id_for(port_name):
+    try:
+        import serial_discovery
+    except ImportError:
+        return port_name
+    return serial_discovery.device_id(port_name)
 
 
-def post_thermal(data, success_count, last_log):
-    """Parse one line and POST if it's thermal_data; return (new_success_count, new_last_log)."""
+def looks_like_thermal(line):
+    try:
+        return json.loads(line).get("type") in FRAME_TYPES
+    except (ValueError, AttributeError):
+        return False
+
+
+def post_thermal(data, success_count, last_log, device_id=None):
+    """Parse one line and POST the thermal_data it carries; return (new_success_count, new_last_log)."""
     try:
         data = json.loads(data)
-        if data.get("type") != "thermal_data":
-            return success_count, last_log
-        success_count += 1
-        now = time.time()
-        if now - last_log >= 5.0 and data.get("thermal_data"):
-            grid = data["thermal_data"]
-            n = sum(len(r) for r in grid)
-            avg = sum(sum(r) for r in grid) / n if n else 0
-            print(f"Received thermal data: avg {avg:.1f}C, forwarded #{success_count}")
-            last_log = now
-        body = json.dumps(data).encode("utf-8")
-        req = urllib.request.Request(
-            API_URL,
-            data=body,
-            headers={"Content-Type": "application/json"},
-            method="POST",
-        )
-        urllib.request.urlopen(req, timeout=5)
     except json.JSONDecodeError:
-        pass
-    except urllib.error.URLError as e:
-        print("API error:", e)
+        return success_count, last_log
+    if not isinstance(data, dict):
+        return success_count, last_log
+    key = device_id or "sensor"
+    clock = clocks.get(key)
+    if clock is None:
+        clock = clocks[key] = ClockSync()
+    if data.get("cmd") == "ping":
+        clock.update(data, time.time())
+        return success_count, last_log
+    if data.get("type") not in FRAME_TYPES:
+        return success_count, last_log
+    decoder = decoders.get(key)
+    if decoder is None:
+        decoder = decoders[key] = FrameDecoder()
+    for frame in decoder.decode(data):
+        success_count, last_log = forward_frame(frame, success_count, last_log, device_id, clock)
+    return success_count, last_log
+
+
+def forward_frame(data, success_count, last_log, device_id, clock):
+    now = time.time()
+    if device_id:
+        data["device_id"] = device_id
+    success_count += 1
+    stats["frames"] += 1
+    captured = parse_utc(data.get("timestamp"))
+    if clock.synced and captured is not None:
+        captured = clock.to_local(captured)
+        histograms["sensor_to_bridge"].observe((now - captured) * 1000)
+    else:
+        captured = None
+    if now - last_log >= 5.0 and data.get("thermal_data"):
+        grid = data["thermal_data"]
+        n = sum(len(r) for r in grid)
+        avg = sum(sum(r) for r in grid) / n if n else 0
+        print(f"Received thermal data from {device_id or 'sensor'}: avg {avg:.1f}C, forwarded #{success_count}")
+        if clock.synced:
+            print(
+                f"  clock offset {clock.offset * 1000:+.1f}ms (rtt {clock.rtt * 1000:.1f}ms); "
+                f"sensor→bridge {histograms['sensor_to_bridge'].describe()}; bridge→API {histograms['bridge_to_api'].describe()}"
+            )
+        last_log = now
+    if publisher:
+        publisher.publish(data)
+    if features:
+        features.observe(data, now)
+    if success_count % API_EVERY:
+        return success_count, last_log
+    if captured is not None:
+        data["latency_ms"] = {
+            "capture_to_forward": round((time.time() - captured) * 1000, 2),
+            "clock_offset": round(clock.offset * 1000, 2),
+            "rtt": round(clock.rtt * 1000, 2),
+        }
+    if spool and spool.pending():
+        spool.append(data)
+        return success_count, last_log
+    started = time.perf_counter()
+    if send(data):
+        histograms["bridge_to_api"].observe((time.perf_counter() - started) * 1000)
+    elif spool:
+        spool.append(data)
     return success_count, last_log
 
 
@@ -87,12 +238,19 @@ def run_with_pyserial(port_name):
         print(f"Opened at {baud} baud (115200 was rejected).\n")
     else:
         print("Serial port opened. Waiting for thermal data...\n")
+    device_id = device_id_for(port_name)
     success_count = 0
     last_log = 0
+    last_ping = 0.0
     buf = b""
     try:
         while True:
-            chunk = ser.read(4096)
+            if CLOCK_SYNC_INTERVAL and time.monotonic() - last_ping >= CLOCK_SYNC_INTERVAL:
+                last_ping = time.monotonic()
+                ser.write((json.dumps(ping_command()) + "\n").encode("utf-8"))
+            # Block for the first byte, then take whatever else is buffered; read(4096)
+            # would sit on a partial frame until the 0.5 s timeout.
+            chunk = ser.read(ser.in_waiting or 1)
             if not chunk:
                 continue
             buf += chunk
@@ -101,7 +259,7 @@ def run_with_pyserial(port_name):
                 line = line.decode("utf-8", errors="ignore").strip()
                 if not line:
                     continue
-                success_count, last_log = post_thermal(line, success_count, last_log)
+                success_count, last_log = post_thermal(line, success_count, last_log, device_id)
     except KeyboardInterrupt:
         print(f"\nStopped. Forwarded {success_count} payloads.")
     finally:
@@ -137,6 +295,7 @@ def run_with_windows_raw(port_name):
         print(f"CreateFile failed (error {err}). Is {port_name} in use or unplugged?")
         return False
     print("Opened port (raw read, no baud config). Waiting for thermal data...\n")
+    device_id = port_name
     success_count = 0
     last_log = 0
     buf = b""
@@ -155,7 +314,7 @@ def run_with_windows_raw(port_name):
                 line = line.decode("utf-8", errors="ignore").strip()
                 if not line:
                     continue
-                success_count, last_log = post_thermal(line, success_count, last_log)
+                success_count, last_log = post_thermal(line, success_count, last_log, device_id)
     except KeyboardInterrupt:
         print(f"\nStopped. Forwarded {success_count} payloads.")
     finally:
@@ -163,16 +322,62 @@ def run_with_windows_raw(port_name):
     return True
 
 
+def start_services():
+    """Start the optional WebSocket publisher and the offline spool (also used by bridge-supervisor.py)."""
+    global publisher, spool
+    if WS_PORT:
+        from ws_publisher import WebSocketPublisher
+        publisher = WebSocketPublisher(WS_HOST, WS_PORT, tag="[thermal-ws]").start()
+    spool = open_spool("thermal", send, tag="[thermal-spool]")
+
+
+def serve_port(port_name):
+    """Forward one port forever (multi-device mode), reopening it after errors."""
+    while True:
+        try:
+            run_with_pyserial(port_name)
+        except Exception as e:
+            print(f"{port_name}: {e}")
+        time.sleep(RECONNECT_DELAY)
+
+
+def run_many(ports):
+    start_services()
+    for port in ports:
+        threading.Thread(target=serve_port, args=(port,), name=f"thermal-{port}", daemon=True).start()
+    print(f"Forwarding {len(ports)} thermal devices: {', '.join(ports)}. Press Ctrl+C to stop\n")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        print(f"\nStopped. Forwarded {stats['frames']} frames.")
+
+
 def main():
     if len(sys.argv) < 2:
-        print("Usage: python usb-thermal-receiver.py COM3")
+        print("Usage: python usb-thermal-receiver.py COM3 [COM7 ...] | all")
         sys.exit(1)
-    port_name = sys.argv[1]
+    ports = sys.argv[1:]
+    if [p.lower() for p in ports] == ["all"]:
+        import serial_discovery
+
+        candidates = [p.device for p in serial_discovery.list_ports()]
+        print(f"Probing {len(candidates)} port(s) for thermal frames...")
+        ports = serial_discovery.probe_all(candidates, DEFAULT_BAUD, looks_like_thermal, PROBE_SECONDS)
+        if not ports:
+            print("No port is sending thermal frames.")
+            sys.exit(1)
+    if len(ports) > 1:
+        print(f"Forwarding to: {API_URL}")
+        run_many(ports)
+        return
+    port_name = ports[0]
 
     print("USB/Bluetooth Thermal Receiver (PySerial)")
     print("==========================================")
     print(f"Serial port: {port_name}")
-    print(f"Forwarding to: {API_URL}")
+    print(f"Forwarding to: {API_URL}" + (f" (every {API_EVERY} frames)" if API_EVERY > 1 else ""))
+    start_services()
     print("Press Ctrl+C to stop\n")
 
     # Try PySerial first
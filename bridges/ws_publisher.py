@@ -0,0 +1,103 @@
+"""
+Local WebSocket publisher for the Python bridges.
+
+Hosts a WebSocket endpoint on a background asyncio thread and broadcasts every
+decoded frame to connected subscribers, so a browser on the same machine can
+render live data without the bridge → Next.js → browser round trip:
+
+  const ws = new WebSocket("ws://127.0.0.1:8765");
+  ws.onmessage = (e) => render(JSON.parse(e.data));
+
+Subscribers may send {"cmd": "ping", "t0": <their clock>} and get t0 back with
+t1/t2 (bridge receive/answer time, epoch seconds) to estimate clock offset.
+
+Publishing from the serial thread never blocks: frames are handed to the event
+loop and dropped for clients that are too slow (websockets.broadcast semantics).
+
+Requirements: pip install websockets
+"""
+
+import asyncio
+import json
+import threading
+import time
+
+try:
+    import websockets
+except ImportError:
+    websockets = None
+
+
+class WebSocketPublisher:
+    def __init__(self, host, port, tag="[ws]"):
+        self.host = host
+        self.port = port
+        self.tag = tag
+        self.clients = set()
+        self.published = 0
+        self.loop = None
+        self._ready = threading.Event()
+        self._error = None
+
+    def start(self):
+        """Start serving on a daemon thread; returns once the socket is listening.
+
+        Raises RuntimeError if it could not listen (port in use, bad host) within 5 s,
+        rather than leaving publish() a silent no-op.
+        """
+        if websockets is None:
+            raise RuntimeError("websockets is required for the WebSocket publisher: pip install websockets")
+        threading.Thread(target=lambda: asyncio.run(self._serve()), daemon=True).start()
+        if not self._ready.wait(5):
+            raise RuntimeError(f"WebSocket publisher on {self.host}:{self.port} did not start within 5 s")
+        if self._error is not None:
+            raise RuntimeError(f"WebSocket publisher could not listen on {self.host}:{self.port}: {self._error}") from self._error
+        return self
+
+    async def _serve(self):
+        try:
+            server = await websockets.serve(self._handler, self.host, self.port)
+        except Exception as e:
+            self._error = e
+            self._ready.set()
+            return
+        self.loop = asyncio.get_running_loop()
+        async with server:
+            print(f"{self.tag} WebSocket publisher on ws://{self.host}:{self.port}")
+            self._ready.set()
+            await asyncio.Future()
+
+    async def _handler(self, websocket):
+        self.clients.add(websocket)
+        print(f"{self.tag} subscriber connected ({len(self.clients)} total)")
+        try:
+            async for message in websocket:
+                await self._answer_ping(websocket, message)
+        except websockets.exceptions.ConnectionClosed:
+            pass
+        finally:
+            self.clients.discard(websocket)
+            print(f"{self.tag} subscriber disconnected ({len(self.clients)} total)")
+
+    async def _answer_ping(self, websocket, message):
+        """{"cmd": "ping", "t0": ...} → t1/t2 on the bridge clock, for browser-side clock sync."""
+        received_at = time.time()
+        try:
+            msg = json.loads(message)
+        except (TypeError, ValueError):
+            return
+        if isinstance(msg, dict) and msg.get("cmd") == "ping":
+            reply = {"cmd": "ping", "ok": True, "t0": msg.get("t0"), "t1": received_at}
+            reply["t2"] = time.time()
+            await websocket.send(json.dumps(reply))
+
+    def publish(self, obj):
+        """Broadcast obj as JSON to all subscribers (thread-safe, non-blocking)."""
+        if self.loop is None or not self.clients:
+            return
+        message = json.dumps(obj)
+        self.loop.call_soon_threadsafe(self._broadcast, message)
+        self.published += 1
+
+    def _broadcast(self, message):
+        websockets.broadcast(self.clients, message)
@@ -0,0 +1,309 @@
+"""
+Benchmarks for the cognitive-decline model, with regression tracking between runs.
+
+Three suites:
+
+  fit      the trainer's fit stage (StandardScaler + lbfgs LogisticRegression)
+           on --fit-rows simulated rows: median seconds, and rows/s
+  predict  predict_proba latency at --predict-rows rows per call, for the
+           joblib pipeline and the exported NumPy scorer (plus any --extra
+           .npz/.json/.joblib model): median and p95 ms per call, and rows/s
+  cold     imports + load + first prediction in a fresh interpreter, with its
+           peak RSS (see cognitive_decline_scorer.py --benchmark)
+
+Each fit and predict case also records its peak traced allocation (MB), from
+a separate tracemalloc run so tracing does not slow the timed runs. The process's
+peak RSS is recorded once, under machine. Results go to a JSON file together
+with the machine, library versions, BLAS threads and git commit they came from.
+
+compare reads two result files. It flags any case whose median time or memory
+grew by more than --threshold (default 10%) and exits with 1 if one did, so it
+can gate CI. p95 changes are listed too but do not fail it: one slow call
+moves them. A difference smaller than --min-ms is treated as timer noise, and a
+warning is printed when the two runs come from different machines or library
+versions.
+
+  python benchmark.py run                                   # artifacts/benchmarks/<timestamp>.json
+  python benchmark.py run --quick --suites predict
+  python benchmark.py run --compare artifacts/benchmarks/baseline.json
+  python benchmark.py compare old.json new.json --threshold 0.2
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+import tracemalloc
+import warnings
+from pathlib import Path
+
+import joblib
+import numpy as np
+import sklearn
+
+from cognitive_decline_scorer import ARTIFACT, COLD_START, JOBLIB_ARTIFACT, LinearScorer, cold_start
+from out_of_core import peak_rss_mb
+
+HERE = Path(__file__).resolve().parent
+RESULTS_DIR = HERE / "artifacts" / "benchmarks"
+SCHEMA = 1
+SEED = 42
+
+FIT_ROWS = (1_000, 10_000, 100_000, 1_000_000)
+PREDICT_ROWS = (1, 64, 4096, 1_000_000)
+QUICK_FIT_ROWS = (1_000, 10_000, 100_000)
+QUICK_PREDICT_ROWS = (1, 64, 4096, 100_000)
+SUITES = ("fit", "predict", "cold")
+# lower is better for all of these; rows/s is derived from them and not compared separately
+COMPARED = ("seconds", "median_ms", "peak_mb", "load_and_first_predict_ms", "max_rss_mb")
+# a single slow call moves p95, so it is reported but never counts as a regression
+INFORMATIONAL = ("p95_ms",)
+
+
+def machine_info() -> dict:
+    info = {
+        "platform": platform.platform(),
+        "machine": platform.machine(),
+        "processor": platform.processor() or None,
+        "cpu_count": os.cpu_count(),
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "sklearn": sklearn.__version__,
+        "joblib": joblib.__version__,
+    }
+    try:
+        from threadpoolctl import threadpool_info
+
+        pools = [{key: pool.get(key) for key in ("internal_api", "version", "num_threads")} for pool in threadpool_info()]
+        info["blas"] = sorted(pools, key=lambda pool: (pool["internal_api"], str(pool["version"])))  # load order varies
+    except ImportError:
+        info["blas"] = None
+    try:
+        info["git_commit"] = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=HERE, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        info["git_commit"] = None
+    return info
+
+
+def traced_peak_mb(fn) -> float:
+    """Peak memory allocated while fn() runs, as seen by tracemalloc (NumPy buffers included)."""
+    tracemalloc.start()
+    try:
+        fn()
+        return round(tracemalloc.get_traced_memory()[1] / 2**20, 2)
+    finally:
+        tracemalloc.stop()
+
+
+def call_times_ms(fn, budget_s: float, min_calls: int = 5, max_calls: int = 10_000) -> np.ndarray:
+    """Wall time of repeated fn() calls after one warm-up, until budget_s is spent."""
+    fn()
+    times = []
+    deadline = time.perf_counter() + budget_s
+    while len(times) < max_calls and (len(times) < min_calls or time.perf_counter() < deadline):
+        started = time.perf_counter_ns()
+        fn()
+        times.append((time.perf_counter_ns() - started) / 1e6)
+    return np.array(times)
+
+
+# --- Suites ------------------------------------------------------------------
+
+
+def bench_fit(rows_list, repeat: int, memory: bool) -> dict:
+    from train_cognitive_decline_model import simulate_dataset, stage_fit
+
+    results = {}
+    for rows in rows_list:
+        X, y = simulate_dataset(rows, np.random.default_rng(SEED))
+        data = {"X_train": X, "y_train": y}
+
+        def fit():
+            return stage_fit(data, select=False, folds=5, classifiers="logreg")
+
+        seconds = []
+        for _ in range(repeat):
+            started = time.perf_counter()
+            fit()
+            seconds.append(time.perf_counter() - started)
+        median = float(np.median(seconds))
+        result = {"seconds": round(median, 4), "rows_per_s": round(len(y) / median)}
+        if memory:
+            result["peak_mb"] = traced_peak_mb(fit)
+        results[f"fit/rows={rows}"] = result
+        print(f"  fit      {rows:>10,} rows  {median:9.3f} s  {len(y) / median:>12,.0f} rows/s  {result.get('peak_mb', '-')} MB")
+    return results
+
+
+def load_scorers(extra) -> dict:
+    """name -> predict_proba for the pipeline, the NumPy export and any extra models."""
+    scorers = {"sklearn": joblib.load(JOBLIB_ARTIFACT).predict_proba, "numpy": LinearScorer.load(ARTIFACT).predict_proba}
+    for path in extra:
+        path = Path(path)
+        model = joblib.load(path) if path.suffix == ".joblib" else LinearScorer.load(path)
+        scorers[f"{path.stem}{path.suffix}"] = model.predict_proba
+    return scorers
+
+
+def bench_predict(rows_list, extra, budget_s: float, memory: bool) -> dict:
+    scorers = load_scorers(extra)
+    X = np.random.default_rng(SEED).normal(0.5, 0.3, (max(rows_list), 3))
+    results = {}
+    for rows in rows_list:
+        batch = X[:rows]
+        for name, predict_proba in scorers.items():
+            times = call_times_ms(lambda: predict_proba(batch), budget_s)
+            median = float(np.median(times))
+            result = {
+                "median_ms": round(median, 5),
+                "p95_ms": round(float(np.percentile(times, 95)), 5),
+                "rows_per_s": round(rows / median * 1000),
+                "calls": len(times),
+            }
+            if memory:
+                result["peak_mb"] = traced_peak_mb(lambda: predict_proba(batch))
+            results[f"predict/{name}/rows={rows}"] = result
+            print(
+                f"  predict  {rows:>10,} rows  {name:<10} {median:10.4f} ms  p95 {result['p95_ms']:10.4f} ms  "
+                f"{result['rows_per_s']:>12,} rows/s  {result.get('peak_mb', '-')} MB"
+            )
+    return results
+
+
+def bench_cold(runs: int) -> dict:
+    results = {}
+    for name, body in COLD_START.items():
+        result = cold_start(body.format(artifact=str(ARTIFACT), joblib_artifact=str(JOBLIB_ARTIFACT)), runs)
+        results[f"cold/{name}"] = result
+        print(f"  cold     {name:<10} {result['load_and_first_predict_ms']:9.1f} ms  {result['max_rss_mb']} MB")
+    return results
+
+
+def run(args) -> dict:
+    warnings.simplefilter("ignore")  # committed pipeline may be from another sklearn release
+    fit_rows = args.fit_rows or (QUICK_FIT_ROWS if args.quick else FIT_ROWS)
+    predict_rows = args.predict_rows or (QUICK_PREDICT_ROWS if args.quick else PREDICT_ROWS)
+    report = {"schema": SCHEMA, "created": time.strftime("%Y-%m-%dT%H:%M:%S%z"), "machine": machine_info(), "results": {}}
+    started = time.perf_counter()
+    if "fit" in args.suites:
+        report["results"].update(bench_fit(fit_rows, args.repeat, not args.no_memory))
+    if "predict" in args.suites:
+        report["results"].update(bench_predict(predict_rows, args.extra, args.budget, not args.no_memory))
+    if "cold" in args.suites:
+        report["results"].update(bench_cold(args.runs))
+    report["machine"]["peak_rss_mb"] = peak_rss_mb()
+    report["elapsed_s"] = round(time.perf_counter() - started, 1)
+    return report
+
+
+# --- Compare -----------------------------------------------------------------
+
+
+def compare(old: dict, new: dict, threshold: float, min_ms: float) -> list[dict]:
+    """One row per (case, metric) present in both runs; status is regression, improvement, noted or ok.
+
+    INFORMATIONAL metrics that grew past threshold are "noted", never "regression".
+    """
+    rows = []
+    for case in sorted(old["results"].keys() & new["results"].keys()):
+        for metric in COMPARED + INFORMATIONAL:
+            before, after = old["results"][case].get(metric), new["results"][case].get(metric)
+            if before is None or after is None or before <= 0:
+                continue
+            change = after / before - 1
+            delta_ms = abs(after - before) * (1000 if metric == "seconds" else 1)
+            if metric.endswith("_mb") or delta_ms >= min_ms:
+                status = "regression" if change > threshold else "improvement" if change < -threshold else "ok"
+            else:
+                status = "ok"
+            if status == "regression" and metric in INFORMATIONAL:
+                status = "noted"
+            rows.append({"case": case, "metric": metric, "before": before, "after": after, "change": change, "status": status})
+    return rows
+
+
+def environment_differences(old: dict, new: dict) -> list[str]:
+    keys = ("machine", "processor", "cpu_count", "python", "numpy", "sklearn", "blas")
+    return [key for key in keys if old["machine"].get(key) != new["machine"].get(key)]
+
+
+def print_comparison(old: dict, new: dict, rows: list[dict], threshold: float) -> int:
+    differences = environment_differences(old, new)
+    if differences:
+        print(f"warning: runs differ in {', '.join(differences)}; changes may not come from the code")
+    print(f"{old['machine'].get('git_commit') or old['created']} -> {new['machine'].get('git_commit') or new['created']}, threshold {threshold:.0%}")
+    for row in rows:
+        if row["status"] != "ok":
+            if row["status"] == "regression":
+                marker = "REGRESSION"
+            elif row["status"] == "noted":
+                marker = "slower"
+            else:
+                marker = "smaller" if row["metric"].endswith("_mb") else "faster"
+            print(f"  {marker:<10} {row['case']:<36} {row['metric']:<26} {row['before']:>12g} -> {row['after']:<12g} {row['change']:+.1%}")
+    regressions = sum(row["status"] == "regression" for row in rows)
+    missing = sorted(old["results"].keys() - new["results"].keys())
+    if missing:
+        print(f"  not in the new run: {', '.join(missing)}")
+    noted = sum(row["status"] == "noted" for row in rows)
+    print(f"{len(rows)} metrics compared, {regressions} regression(s)" + (f", {noted} p95 slowdown(s) not gated" if noted else ""))
+    return 1 if regressions else 0
+
+
+def rows_list(text: str) -> tuple[int, ...]:
+    return tuple(int(value.replace("_", "")) for value in text.split(",") if value.strip())
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Benchmark fit and inference of the cognitive-decline model")
+    sub = parser.add_subparsers(dest="command")
+    p = sub.add_parser("run", help="Run the benchmarks and write a JSON result")
+    p.add_argument("--suites", default=",".join(SUITES), help=f"Comma-separated, from {', '.join(SUITES)}")
+    p.add_argument("--quick", action="store_true", help="Smaller sizes: fit up to 100k rows, predict up to 100k rows")
+    p.add_argument("--fit-rows", type=rows_list, help=f"Comma-separated (default {','.join(map(str, FIT_ROWS))})")
+    p.add_argument("--predict-rows", type=rows_list, help=f"Comma-separated (default {','.join(map(str, PREDICT_ROWS))})")
+    p.add_argument("--extra", action="append", default=[], metavar="MODEL", help="Another .npz/.json/.joblib model to time (repeatable)")
+    p.add_argument("--repeat", type=int, default=3, help="Fits per size (median is reported)")
+    p.add_argument("--budget", type=float, default=0.5, help="Seconds of predict calls per case (at least 5 calls)")
+    p.add_argument("--runs", type=int, default=5, help="Fresh interpreters per cold-start measurement")
+    p.add_argument("--no-memory", action="store_true", help="Skip the tracemalloc runs")
+    p.add_argument("--out", type=Path, help="Result file (default: artifacts/benchmarks/<timestamp>.json)")
+    p.add_argument("--compare", type=Path, metavar="BASELINE", help="Compare against an earlier result when done")
+    p.add_argument("--threshold", type=float, default=0.10, help="Relative growth that counts as a regression")
+    p.add_argument("--min-ms", type=float, default=0.002, help="Ignore time differences below this many ms")
+    p = sub.add_parser("compare", help="Flag regressions between two result files")
+    p.add_argument("old", type=Path)
+    p.add_argument("new", type=Path)
+    p.add_argument("--threshold", type=float, default=0.10, help="Relative growth that counts as a regression")
+    p.add_argument("--min-ms", type=float, default=0.002, help="Ignore time differences below this many ms")
+    args = parser.parse_args()
+
+    if args.command == "run":
+        args.suites = [name.strip() for name in args.suites.split(",") if name.strip()]
+        unknown = set(args.suites) - set(SUITES)
+        if unknown:
+            parser.error(f"unknown suite(s): {', '.join(sorted(unknown))}")
+        report = run(args)
+        out = args.out or RESULTS_DIR / f"{time.strftime('%Y%m%d-%H%M%S')}.json"
+        out.parent.mkdir(parents=True, exist_ok=True)
+        out.write_text(json.dumps(report, indent=2))
+        print(f"Wrote {out} ({report['elapsed_s']} s)")
+        if args.compare:
+            old = json.loads(args.compare.read_text())
+            sys.exit(print_comparison(old, report, compare(old, report, args.threshold, args.min_ms), args.threshold))
+    elif args.command == "compare":
+        old, new = (json.loads(path.read_text()) for path in (args.old, args.new))
+        sys.exit(print_comparison(old, new, compare(old, new, args.threshold, args.min_ms), args.threshold))
+    else:
+        parser.print_help()
+
+
+if __name__ == "__main__":
+    main()
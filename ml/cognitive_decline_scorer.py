@@ -0,0 +1,265 @@
+"""
+Dependency-free scorer for the cognitive-decline logistic model (NumPy only).
+
+train_cognitive_decline_model.py exports the fitted StandardScaler
+(mean_/scale_) and LogisticRegression (coef_/intercept_/classes_) next to the
+joblib pipeline:
+
+  artifacts/cognitive_decline_logreg.npz   — the arrays, for loading
+  artifacts/cognitive_decline_logreg.json  — the same numbers, human-readable
+
+LinearScorer.predict_proba reproduces Pipeline.predict_proba (standardize, then
+softmax of the decision function, or sigmoid for a two-class model; one-vs-rest
+models such as SGDClassifier normalize per-class sigmoids) for a whole batch in
+one matrix product, without importing scikit-learn or joblib —
+which is what makes it usable on the Pi and in short-lived bridge processes.
+
+Usage:
+  python cognitive_decline_scorer.py 0.5 0.4 0.3      # score one row
+  python cognitive_decline_scorer.py --benchmark      # parity with sklearn + cold start / latency vs joblib
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+from dataclasses import dataclass
+from pathlib import Path
+
+import numpy as np
+
+HERE = Path(__file__).resolve().parent
+ARTIFACT = HERE / "artifacts" / "cognitive_decline_logreg.npz"
+JOBLIB_ARTIFACT = HERE / "artifacts" / "cognitive_decline_logreg.joblib"
+FORMAT_VERSION = 1
+
+
+@dataclass(frozen=True)
+class LinearScorer:
+    mean: np.ndarray  # (n_features,)
+    scale: np.ndarray  # (n_features,)
+    coef: np.ndarray  # (n_classes, n_features), or (1, n_features) for two classes
+    intercept: np.ndarray  # (n_classes,) or (1,)
+    classes: np.ndarray
+    feature_names: tuple[str, ...]
+    class_names: tuple[str, ...]
+    ovr: bool = False  # one-vs-rest probabilities (SGDClassifier) instead of softmax
+
+    @classmethod
+    def load(cls, path: str | Path = ARTIFACT) -> LinearScorer:
+        """Load an exported .npz or .json artifact."""
+        path = Path(path)
+        if path.suffix == ".json":
+            raw = json.loads(path.read_text())
+        else:
+            with np.load(path, allow_pickle=False) as npz:
+                raw = {key: npz[key] for key in npz.files}
+            raw["feature_names"] = raw["feature_names"].tolist()
+            raw["class_names"] = raw["class_names"].tolist()
+            if "ovr" in raw:
+                raw["ovr"] = bool(raw["ovr"])
+        return cls(
+            mean=np.asarray(raw["mean"], dtype=np.float64),
+            scale=np.asarray(raw["scale"], dtype=np.float64),
+            coef=np.asarray(raw["coef"], dtype=np.float64),
+            intercept=np.asarray(raw["intercept"], dtype=np.float64),
+            classes=np.asarray(raw["classes"]),
+            feature_names=tuple(raw["feature_names"]),
+            class_names=tuple(raw["class_names"]),
+            ovr=bool(raw.get("ovr", False)),
+        )
+
+    def decision_function(self, X: np.ndarray) -> np.ndarray:
+        X = np.array(X, dtype=np.float64, ndmin=2)  # copy: standardized in place below
+        if X.shape[1] != self.mean.shape[0]:
+            raise ValueError(f"expected {self.mean.shape[0]} features ({', '.join(self.feature_names)}), got {X.shape[1]}")
+        X -= self.mean
+        X /= self.scale
+        return X @ self.coef.T + self.intercept
+
+    def predict_proba(self, X: np.ndarray) -> np.ndarray:
+        """Class probabilities, shape (n_rows, n_classes), columns ordered as self.classes."""
+        scores = self.decision_function(X)
+        if self.coef.shape[0] == 1:
+            p = 1.0 / (1.0 + np.exp(-scores[:, 0]))
+            return np.column_stack([1.0 - p, p])
+        if self.ovr:
+            scores = 1.0 / (1.0 + np.exp(-scores))
+            scores /= scores.sum(axis=1, keepdims=True)
+            return scores
+        scores -= scores.max(axis=1, keepdims=True)
+        np.exp(scores, out=scores)
+        scores /= scores.sum(axis=1, keepdims=True)
+        return scores
+
+    def predict(self, X: np.ndarray) -> np.ndarray:
+        return self.classes[np.argmax(self.predict_proba(X), axis=1)]
+
+
+def export_linear_model(model, out_path: str | Path, feature_names, class_names) -> tuple[Path, Path]:
+    """Write a fitted StandardScaler + linear classifier pipeline as .npz and .json; returns both paths."""
+    scaler = model.named_steps["scaler"]
+    clf = model.named_steps["clf"]
+    if hasattr(clf, "coefs_"):
+        # MLPClassifier without hidden layers (online_update.py): softmax regression, stored as (n_features, n_classes)
+        if len(clf.coefs_) != 1:
+            raise ValueError("only an MLPClassifier without hidden layers is a linear model")
+        coef, intercept, ovr = clf.coefs_[0].T, clf.intercepts_[0], False
+    else:
+        coef, intercept = clf.coef_, clf.intercept_
+        # LogisticRegression is multinomial for >2 classes; SGDClassifier and friends are one-vs-rest
+        ovr = type(clf).__name__ != "LogisticRegression" or getattr(clf, "multi_class", None) == "ovr"
+    arrays = {
+        "mean": np.asarray(scaler.mean_, dtype=np.float64),
+        "scale": np.asarray(scaler.scale_, dtype=np.float64),
+        "coef": np.asarray(coef, dtype=np.float64),
+        "intercept": np.asarray(intercept, dtype=np.float64),
+        "classes": np.asarray(clf.classes_),
+    }
+    out_path = Path(out_path)
+    npz_path = out_path.with_suffix(".npz")
+    json_path = out_path.with_suffix(".json")
+    np.savez(
+        npz_path,
+        feature_names=np.array(feature_names),
+        class_names=np.array(class_names),
+        format_version=np.array(FORMAT_VERSION),
+        ovr=np.array(ovr),
+        **arrays,
+    )
+    doc = {
+        "format_version": FORMAT_VERSION,
+        "feature_names": list(feature_names),
+        "class_names": list(class_names),
+        "ovr": ovr,
+    }
+    doc.update({key: value.tolist() for key, value in arrays.items()})
+    # repr-exact floats, so the JSON scorer matches the .npz one bit for bit
+    json_path.write_text(json.dumps(doc, indent=2))
+    return npz_path, json_path
+
+
+# --- Benchmark -------------------------------------------------------------
+
+COLD_START = {
+    "numpy": (
+        "from cognitive_decline_scorer import LinearScorer\n"
+        "scorer = LinearScorer.load({artifact!r})\n"
+        "scorer.predict_proba([[0.5, 0.4, 0.3]])\n"
+    ),
+    "joblib": (
+        "import joblib, warnings\n"
+        "warnings.simplefilter('ignore')\n"
+        "model = joblib.load({joblib_artifact!r})\n"
+        "model.predict_proba([[0.5, 0.4, 0.3]])\n"
+    ),
+}
+
+CHILD = """
+import time
+started = time.perf_counter()
+{body}
+elapsed = time.perf_counter() - started
+rss = None
+try:
+    # VmHWM is this process's own peak; ru_maxrss on Linux carries the parent's over exec
+    with open("/proc/self/status") as status:
+        rss = next(int(line.split()[1]) / 1024 for line in status if line.startswith("VmHWM:"))
+except OSError:
+    try:
+        import resource, sys
+        rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / (1024 * 1024 if sys.platform == "darwin" else 1024)
+    except ImportError:
+        pass
+print(elapsed * 1000, rss)
+"""
+
+
+def cold_start(body: str, runs: int) -> dict:
+    """Median load+first-prediction time and peak RSS over fresh interpreters."""
+    times, rss = [], []
+    for _ in range(runs):
+        out = subprocess.run(
+            [sys.executable, "-c", CHILD.format(body=body)],
+            cwd=HERE,
+            capture_output=True,
+            text=True,
+            check=True,
+            env={**os.environ, "PYTHONDONTWRITEBYTECODE": "1"},
+        ).stdout.split()
+        times.append(float(out[0]))
+        if out[1] != "None":
+            rss.append(float(out[1]))
+    return {"load_and_first_predict_ms": round(float(np.median(times)), 2), "max_rss_mb": round(max(rss), 1) if rss else None}
+
+
+def per_call_ms(fn, X: np.ndarray, repeat: int) -> float:
+    fn(X)
+    started = time.perf_counter()
+    for _ in range(repeat):
+        fn(X)
+    return (time.perf_counter() - started) * 1000 / repeat
+
+
+def benchmark(artifact: Path, joblib_artifact: Path, runs: int) -> int:
+    import warnings
+
+    import joblib
+
+    warnings.simplefilter("ignore")  # committed pipeline may be from another sklearn release
+    model = joblib.load(joblib_artifact)
+    scorer = LinearScorer.load(artifact)
+    json_scorer = LinearScorer.load(artifact.with_suffix(".json"))
+
+    rng = np.random.default_rng(0)
+    X = np.vstack([rng.normal(0.5, 0.3, (100_000, 3)), rng.normal(0, 50, (1000, 3))])  # incl. saturating rows
+    expected = model.predict_proba(X)
+    diff = float(np.abs(scorer.predict_proba(X) - expected).max())
+    json_diff = float(np.abs(json_scorer.predict_proba(X) - expected).max())
+    labels_match = bool((scorer.predict(X) == model.predict(X)).all())
+    ok = diff <= 1e-12 and json_diff <= 1e-12 and labels_match
+    print(f"Parity on {len(X):,} rows: max |Δp| npz {diff:.2e}, json {json_diff:.2e}, labels {'match' if labels_match else 'DIFFER'}")
+
+    print(f"\nCold start (imports + load + first prediction in a fresh interpreter, median of {runs}):")
+    baseline = cold_start("pass", runs)
+    print(f"  {'bare interpreter':<18} {'':>8}      {baseline['max_rss_mb']} MB")
+    for name, body in COLD_START.items():
+        result = cold_start(body.format(artifact=str(artifact), joblib_artifact=str(joblib_artifact)), runs)
+        print(f"  {name:<18} {result['load_and_first_predict_ms']:8.1f} ms   {result['max_rss_mb']} MB")
+
+    print("\nLatency per call:")
+    print(f"  {'rows':>8} {'sklearn ms':>12} {'numpy ms':>10} {'speedup':>8}")
+    for rows in (1, 64, 4096, 100_000):
+        batch = X[:rows]
+        repeat = max(3, min(2000, 200_000 // rows))
+        sk = per_call_ms(model.predict_proba, batch, repeat)
+        np_ms = per_call_ms(scorer.predict_proba, batch, repeat)
+        print(f"  {rows:>8,} {sk:12.4f} {np_ms:10.4f} {sk / np_ms:7.1f}x")
+    return 0 if ok else 1
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Score rows with the exported cognitive-decline model (NumPy only)")
+    parser.add_argument("features", nargs="*", type=float, help="One row: emg_variability hr_trend_slope temp_anomaly")
+    parser.add_argument("--model", type=Path, default=ARTIFACT, help=f"Exported .npz or .json (default: {ARTIFACT.name})")
+    parser.add_argument("--benchmark", action="store_true", help="Check parity with the joblib pipeline and compare speed")
+    parser.add_argument("--joblib", type=Path, default=JOBLIB_ARTIFACT, help="Pipeline to compare against in --benchmark")
+    parser.add_argument("--runs", type=int, default=5, help="Fresh interpreters per cold-start measurement")
+    args = parser.parse_args()
+
+    if args.benchmark:
+        sys.exit(benchmark(args.model, args.joblib, args.runs))
+    scorer = LinearScorer.load(args.model)
+    if len(args.features) != len(scorer.feature_names):
+        parser.error(f"give {len(scorer.feature_names)} values: {' '.join(scorer.feature_names)}")
+    probs = scorer.predict_proba([args.features])[0]
+    for name, p in zip(scorer.class_names, probs):
+        print(f"{name:<10} {p:.4f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,235 @@
+"""
+Cross-validated model selection for the cognitive-decline model
+(train_cognitive_decline_model.py --select).
+
+Runs stratified K-fold CV over a grid of candidates: regularization strength
+C and class_weight for LogisticRegression, and optionally alpha / class_weight
+for SGDClassifier(loss="log_loss"), and picks the lowest mean log loss. Only
+linear models are offered, so the winner can still be exported for
+cognitive_decline_scorer.py. Every (candidate, fold) fit is a separate task on
+a process pool (--jobs, default all cores), and the data is sent to each
+worker once, not once per task.
+
+Each finished fold's scores are cached as one small JSON file under
+artifacts/cv_cache/. The key is a hash of the data, the fold layout, the
+candidate's parameters and the code that fits it (this file plus the
+scikit-learn version). A re-run, or a sweep widened by a few values, fits only
+the folds it has not seen; changing any of those inputs misses the cache.
+
+  python model_selection.py --rows 200000 --folds 5            # sweep on simulated rows
+  python model_selection.py --rows 200000 --classifiers logreg,sgd --jobs 8
+"""
+
+from __future__ import annotations
+
+import argparse
+import hashlib
+import json
+import os
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from itertools import product
+from pathlib import Path
+
+import numpy as np
+import sklearn
+from sklearn.linear_model import LogisticRegression, SGDClassifier
+from sklearn.metrics import f1_score, log_loss
+from sklearn.model_selection import StratifiedKFold
+from sklearn.pipeline import Pipeline
+from sklearn.preprocessing import StandardScaler
+
+HERE = Path(__file__).resolve().parent
+CACHE_DIR = HERE / "artifacts" / "cv_cache"
+SEED = 42
+
+C_GRID = (0.01, 0.1, 1.0, 10.0, 100.0)
+ALPHA_GRID = (1e-5, 1e-4, 1e-3)
+CLASS_WEIGHTS = (None, "balanced")
+CLASSIFIERS = ("logreg", "sgd")
+
+
+def candidates(classifiers=("logreg",)) -> list[dict]:
+    """The parameter grid, one dict per candidate."""
+    grid = []
+    if "logreg" in classifiers:
+        grid += [{"classifier": "logreg", "C": c, "class_weight": w} for c, w in product(C_GRID, CLASS_WEIGHTS)]
+    if "sgd" in classifiers:
+        grid += [{"classifier": "sgd", "alpha": a, "class_weight": w} for a, w in product(ALPHA_GRID, CLASS_WEIGHTS)]
+    return grid
+
+
+def build_model(params: dict) -> Pipeline:
+    if params["classifier"] == "logreg":
+        clf = LogisticRegression(C=params["C"], class_weight=params["class_weight"], max_iter=1000, solver="lbfgs")
+    elif params["classifier"] == "sgd":
+        clf = SGDClassifier(
+            loss="log_loss", alpha=params["alpha"], class_weight=params["class_weight"], average=True, random_state=SEED
+        )
+    else:
+        raise ValueError(f"unknown classifier {params['classifier']!r}")
+    return Pipeline([("scaler", StandardScaler()), ("clf", clf)])
+
+
+def describe(params: dict) -> str:
+    return ", ".join(f"{key}={value}" for key, value in params.items())
+
+
+# --- Cache -------------------------------------------------------------------
+
+
+def code_fingerprint() -> str:
+    return hashlib.sha256(Path(__file__).read_bytes() + sklearn.__version__.encode()).hexdigest()
+
+
+def data_fingerprint(X: np.ndarray, y: np.ndarray) -> str:
+    digest = hashlib.sha256()
+    for array in (np.ascontiguousarray(X, dtype=np.float64), np.ascontiguousarray(y)):
+        digest.update(f"{array.dtype}{array.shape}".encode())
+        digest.update(array.tobytes())
+    return digest.hexdigest()
+
+
+def fold_key(data_hash: str, code_hash: str, folds: int, fold: int, params: dict) -> str:
+    doc = {"data": data_hash, "code": code_hash, "folds": folds, "fold": fold, "seed": SEED, "params": params}
+    return hashlib.sha256(json.dumps(doc, sort_keys=True).encode()).hexdigest()
+
+
+def read_cached(cache_dir: Path, key: str) -> dict | None:
+    try:
+        return json.loads((cache_dir / f"{key}.json").read_text())
+    except (OSError, ValueError):
+        return None
+
+
+def write_cached(cache_dir: Path, key: str, result: dict) -> None:
+    cache_dir.mkdir(parents=True, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(prefix=".fold-", dir=cache_dir)
+    with os.fdopen(fd, "w") as f:
+        json.dump(result, f)
+    os.replace(tmp, cache_dir / f"{key}.json")
+
+
+# --- Workers -----------------------------------------------------------------
+
+_X = _y = _splits = None
+
+
+def _init_worker(X: np.ndarray, y: np.ndarray, splits) -> None:
+    global _X, _y, _splits
+    _X, _y, _splits = X, y, splits
+
+
+def _fit_fold(task: tuple[int, dict]) -> dict:
+    fold, params = task
+    train, test = _splits[fold]
+    started = time.perf_counter()
+    model = build_model(params)
+    model.fit(_X[train], _y[train])
+    proba = model.predict_proba(_X[test])
+    pred = model.classes_[np.argmax(proba, axis=1)]
+    return {
+        "macro_f1": float(f1_score(_y[test], pred, average="macro")),
+        "accuracy": float(np.mean(pred == _y[test])),
+        "log_loss": float(log_loss(_y[test], proba, labels=model.classes_)),
+        "fit_s": time.perf_counter() - started,
+    }
+
+
+# --- Selection ---------------------------------------------------------------
+
+
+def cross_validate(
+    X: np.ndarray,
+    y: np.ndarray,
+    grid: list[dict],
+    folds: int = 5,
+    jobs: int | None = None,
+    cache_dir: Path | None = CACHE_DIR,
+) -> dict:
+    """CV every candidate in grid; returns per-candidate scores, the best candidate and cache stats."""
+    X = np.asarray(X, dtype=np.float64)
+    y = np.asarray(y)
+    splits = list(StratifiedKFold(n_splits=folds, shuffle=True, random_state=SEED).split(X, y))
+    data_hash, code_hash = data_fingerprint(X, y), code_fingerprint()
+
+    tasks, keys, results = [], [], {}
+    for index, params in enumerate(grid):
+        for fold in range(folds):
+            key = fold_key(data_hash, code_hash, folds, fold, params)
+            cached = read_cached(cache_dir, key) if cache_dir else None
+            if cached is not None:
+                results[index, fold] = cached
+            else:
+                tasks.append((fold, params))
+                keys.append((index, fold, key))
+
+    started = time.perf_counter()
+    jobs = min(jobs or os.cpu_count() or 1, max(len(tasks), 1))
+    if tasks and jobs > 1:
+        with ProcessPoolExecutor(jobs, initializer=_init_worker, initargs=(X, y, splits)) as pool:
+            fitted = list(pool.map(_fit_fold, tasks, chunksize=max(1, len(tasks) // (jobs * 4))))
+    else:
+        _init_worker(X, y, splits)
+        fitted = [_fit_fold(task) for task in tasks]
+    for (index, fold, key), result in zip(keys, fitted):
+        results[index, fold] = result
+        if cache_dir:
+            write_cached(cache_dir, key, result)
+
+    scores = []
+    for index, params in enumerate(grid):
+        per_fold = [results[index, fold] for fold in range(folds)]
+        summary = {"params": params}
+        for metric in ("macro_f1", "accuracy", "log_loss"):
+            values = np.array([r[metric] for r in per_fold])
+            summary[f"{metric}_mean"] = round(float(values.mean()), 5)
+            summary[f"{metric}_std"] = round(float(values.std()), 5)
+        scores.append(summary)
+    # Lowest log loss: the service returns probabilities, and F1 barely separates close C values
+    best = min(scores, key=lambda s: (s["log_loss_mean"], -s["macro_f1_mean"]))
+    return {
+        "folds": folds,
+        "n_rows": int(len(y)),
+        "candidates": scores,
+        "best": best,
+        "fits_run": len(tasks),
+        "fits_cached": len(grid) * folds - len(tasks),
+        "jobs": jobs,
+        "elapsed_s": round(time.perf_counter() - started, 3),
+    }
+
+
+def print_summary(cv: dict) -> None:
+    print(
+        f"{cv['folds']}-fold CV over {len(cv['candidates'])} candidates on {cv['n_rows']:,} rows: "
+        f"{cv['fits_run']} fits on {cv['jobs']} process(es), {cv['fits_cached']} from cache, {cv['elapsed_s']:.2f} s"
+    )
+    for s in sorted(cv["candidates"], key=lambda s: s["log_loss_mean"]):
+        marker = "*" if s is cv["best"] else " "
+        print(f" {marker} log loss {s['log_loss_mean']:.4f} ±{s['log_loss_std']:.4f}  F1 {s['macro_f1_mean']:.4f}  {describe(s['params'])}")
+
+
+def main() -> None:
+    from train_cognitive_decline_model import simulate_dataset
+
+    parser = argparse.ArgumentParser(description="Cross-validated sweep over cognitive-decline model candidates")
+    parser.add_argument("--rows", type=int, default=600, help="Simulated rows to cross-validate on")
+    parser.add_argument("--folds", type=int, default=5)
+    parser.add_argument("--jobs", type=int, help="Worker processes (default: all cores)")
+    parser.add_argument("--classifiers", default="logreg", help=f"Comma-separated, from {', '.join(CLASSIFIERS)}")
+    parser.add_argument("--no-cache", action="store_true", help="Fit every fold and leave the cache untouched")
+    args = parser.parse_args()
+
+    classifiers = [name.strip() for name in args.classifiers.split(",") if name.strip()]
+    unknown = set(classifiers) - set(CLASSIFIERS)
+    if unknown or not classifiers:
+        parser.error(f"--classifiers: give one or more of {', '.join(CLASSIFIERS)}" + (f" (unknown: {', '.join(sorted(unknown))})" if unknown else ""))
+    X, y = simulate_dataset(args.rows, np.random.default_rng(SEED))
+    cv = cross_validate(X, y, candidates(classifiers), args.folds, args.jobs, None if args.no_cache else CACHE_DIR)
+    print_summary(cv)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,202 @@
+"""
+Out-of-core training for the cognitive-decline model (train_cognitive_decline_model.py --out-of-core).
+
+The data is streamed in chunks of --chunk-size rows and never held in memory
+as a whole, so peak memory depends on the chunk size, not on the row count:
+
+  1. one pass fits a StandardScaler with partial_fit on the training rows
+  2. --epochs passes fit SGDClassifier(loss="log_loss") with partial_fit on the
+     standardized rows (shuffled within each chunk)
+  3. one pass scores the hold-out rows, accumulating a confusion matrix and log
+     loss rather than keeping predictions
+
+Which rows are held out is decided per chunk from a seeded generator, so every
+pass sees the same split. Sources are simulated rows (--rows, generated chunk by
+chunk from simulate_dataset), a CSV with the FEATURE_NAMES columns and "label",
+or a .npy matrix (memory-mapped) with the label in the last column.
+
+Writes artifacts/cognitive_decline_sgd.joblib, the NumPy export next to it
+(cognitive_decline_sgd.npz/.json, for cognitive_decline_scorer.py) and
+artifacts/metrics_out_of_core.json, including rows/s per pass and peak RSS.
+
+  python train_cognitive_decline_model.py --out-of-core --rows 10000000
+  python train_cognitive_decline_model.py --out-of-core --data readings.csv --epochs 5
+"""
+
+from __future__ import annotations
+
+import itertools
+import json
+import time
+from pathlib import Path
+
+import joblib
+import numpy as np
+from sklearn.linear_model import SGDClassifier
+from sklearn.pipeline import Pipeline
+from sklearn.preprocessing import StandardScaler
+
+from cognitive_decline_scorer import export_linear_model
+from streaming_features import FEATURE_NAMES
+
+CLASSES = np.array([0, 1, 2])
+CLASS_NAMES = ["Normal", "Mild Risk", "High Risk"]
+SEED = 42
+
+
+def simulated_chunks(rows: int, chunk_size: int, seed: int = SEED):
+    """Re-iterable source of simulated (X, y) chunks; chunk i is the same on every pass."""
+    from train_cognitive_decline_model import simulate_dataset
+
+    def chunks():
+        for i, start in enumerate(range(0, rows, chunk_size)):
+            n = min(chunk_size, rows - start)
+            # simulate_dataset makes n // 3 rows per class; round up, then trim the shuffled rows to n
+            X, y = simulate_dataset(n + (-n) % 3, np.random.default_rng([seed, i]))
+            yield X[:n], y[:n]
+
+    return chunks
+
+
+def csv_chunks(path: Path, chunk_size: int):
+    """Re-iterable source of (X, y) chunks from a CSV with a header row."""
+    with open(path, newline="") as f:
+        header = [name.strip() for name in f.readline().split(",")]
+    missing = [name for name in (*FEATURE_NAMES, "label") if name not in header]
+    if missing:
+        raise SystemExit(f"{path}: missing column(s) {', '.join(missing)}")
+    usecols = [header.index(name) for name in (*FEATURE_NAMES, "label")]
+
+    def chunks():
+        with open(path, newline="") as f:
+            f.readline()
+            while True:
+                lines = list(itertools.islice(f, chunk_size))
+                if not lines:
+                    return
+                block = np.loadtxt(lines, delimiter=",", usecols=usecols, ndmin=2)
+                yield block[:, :-1], block[:, -1].astype(int)
+
+    return chunks
+
+
+def npy_chunks(path: Path, chunk_size: int):
+    """Re-iterable source of (X, y) chunks from a memory-mapped .npy (label in the last column)."""
+    data = np.load(path, mmap_mode="r")
+    if data.ndim != 2 or data.shape[1] != len(FEATURE_NAMES) + 1:
+        raise SystemExit(f"{path}: expected shape (rows, {len(FEATURE_NAMES) + 1}), got {data.shape}")
+
+    def chunks():
+        for start in range(0, len(data), chunk_size):
+            block = np.asarray(data[start : start + chunk_size], dtype=np.float64)
+            yield block[:, :-1], block[:, -1].astype(int)
+
+    return chunks
+
+
+def split(chunks, holdout: float):
+    """(chunk index, train X, train y, holdout X, holdout y) — the same split on every pass."""
+    for i, (X, y) in enumerate(chunks()):
+        held = np.random.default_rng([SEED, i, 1]).random(len(y)) < holdout
+        yield i, X[~held], y[~held], X[held], y[held]
+
+
+def peak_rss_mb() -> float | None:
+    try:
+        with open("/proc/self/status") as status:
+            return next(int(line.split()[1]) / 1024 for line in status if line.startswith("VmHWM:"))
+    except (OSError, StopIteration):
+        try:
+            import resource
+            import sys
+
+            return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / (1024 * 1024 if sys.platform == "darwin" else 1024)
+        except ImportError:
+            return None
+
+
+def report_from_confusion(cm: np.ndarray) -> dict:
+    tp = np.diag(cm).astype(float)
+    precision = np.divide(tp, cm.sum(axis=0), out=np.zeros_like(tp), where=cm.sum(axis=0) > 0)
+    recall = np.divide(tp, cm.sum(axis=1), out=np.zeros_like(tp), where=cm.sum(axis=1) > 0)
+    f1 = np.divide(2 * precision * recall, precision + recall, out=np.zeros_like(tp), where=precision + recall > 0)
+    per_class = {
+        name: {"precision": round(float(p), 4), "recall": round(float(r), 4), "f1": round(float(f), 4), "support": int(s)}
+        for name, p, r, f, s in zip(CLASS_NAMES, precision, recall, f1, cm.sum(axis=1))
+    }
+    return {"accuracy": round(float(tp.sum() / max(cm.sum(), 1)), 4), "macro_f1": round(float(f1.mean()), 4), "per_class": per_class}
+
+
+def train_out_of_core(args, out_dir: Path) -> dict:
+    if args.data is None:
+        chunks, source = simulated_chunks(args.rows, args.chunk_size), f"simulated ({args.rows:,} rows)"
+    elif args.data.suffix == ".npy":
+        chunks, source = npy_chunks(args.data, args.chunk_size), str(args.data)
+    else:
+        chunks, source = csv_chunks(args.data, args.chunk_size), str(args.data)
+    print(f"Out-of-core training on {source}, chunks of {args.chunk_size:,} rows, {args.holdout:.0%} held out")
+
+    passes = []
+    scaler = StandardScaler()
+    started = time.perf_counter()
+    n_train = 0
+    for _, X, _, _, _ in split(chunks, args.holdout):
+        if len(X):
+            scaler.partial_fit(X)
+            n_train += len(X)
+    if not n_train:
+        raise SystemExit("no training rows")
+    passes.append(("scaler", n_train, time.perf_counter() - started))
+
+    # average=True: the averaged weights settle without tuning a decaying learning rate
+    clf = SGDClassifier(loss="log_loss", alpha=1e-5, average=True, random_state=SEED)
+    for epoch in range(args.epochs):
+        started = time.perf_counter()
+        for i, X, y, _, _ in split(chunks, args.holdout):
+            if not len(y):
+                continue
+            order = np.random.default_rng([SEED, i, 2, epoch]).permutation(len(y))
+            clf.partial_fit(scaler.transform(X[order]), y[order], classes=CLASSES)
+        passes.append((f"epoch {epoch + 1}", n_train, time.perf_counter() - started))
+
+    model = Pipeline([("scaler", scaler), ("clf", clf)])
+    cm = np.zeros((len(CLASSES), len(CLASSES)), dtype=np.int64)
+    log_loss = 0.0
+    started = time.perf_counter()
+    for _, _, _, X, y in split(chunks, args.holdout):
+        if not len(y):
+            continue
+        proba = model.predict_proba(X)
+        pred = CLASSES[np.argmax(proba, axis=1)]
+        np.add.at(cm, (np.searchsorted(CLASSES, y), np.searchsorted(CLASSES, pred)), 1)
+        log_loss -= float(np.log(np.clip(proba[np.arange(len(y)), np.searchsorted(CLASSES, y)], 1e-15, None)).sum())
+    n_test = int(cm.sum())
+    passes.append(("evaluate", n_test, time.perf_counter() - started))
+
+    out_dir.mkdir(exist_ok=True)
+    joblib.dump(model, out_dir / "cognitive_decline_sgd.joblib")
+    for path in export_linear_model(model, out_dir / "cognitive_decline_sgd", list(FEATURE_NAMES), CLASS_NAMES):
+        print(f"Saved {path}")
+
+    metrics = {
+        "mode": "out_of_core",
+        "source": source,
+        "n_train": n_train,
+        "n_test": n_test,
+        "chunk_size": args.chunk_size,
+        "epochs": args.epochs,
+        "log_loss": round(log_loss / max(n_test, 1), 5),
+        **report_from_confusion(cm),
+        "confusion_matrix": cm.tolist(),
+        "feature_names": list(FEATURE_NAMES),
+        "throughput_rows_per_s": {name: round(rows / seconds) for name, rows, seconds in passes if seconds > 0},
+        "peak_rss_mb": peak_rss_mb(),
+    }
+    (out_dir / "metrics_out_of_core.json").write_text(json.dumps(metrics, indent=2))
+
+    for name, rows, seconds in passes:
+        print(f"  {name:<10} {rows:>12,} rows  {seconds:7.2f} s  {rows / seconds if seconds else 0:>12,.0f} rows/s")
+    print(f"Hold-out: accuracy {metrics['accuracy']:.3f}, macro F1 {metrics['macro_f1']:.3f}, log loss {metrics['log_loss']:.4f}")
+    print("Confusion matrix:\n", cm)
+    print(f"Peak RSS: {metrics['peak_rss_mb']:.0f} MB" if metrics["peak_rss_mb"] else "Peak RSS: n/a")
+    return metrics
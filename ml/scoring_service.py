@@ -0,0 +1,450 @@
+"""
+Long-running risk-scoring service for the cognitive-decline model.
+
+Loads the model once and serves it over HTTP (or a Unix socket). Concurrent
+requests are micro-batched: the first request to arrive opens a window of
+--window-ms, everything that queues up inside it (up to --max-rows rows) is
+stacked into one predict_proba call, and each caller gets its own slice back.
+Under load this turns many tiny model calls into a few vectorized ones.
+
+  POST /predict  {"features": [0.5, 0.4, 0.3]}
+                 → {"probabilities": [...], "label": "Mild Risk", "classes": [...]}
+  POST /predict  {"rows": [[...], [...]], "ids": ["p1", "p2"]}     (ids optional)
+                 → {"probabilities": [[...], ...], "labels": [...], "ids": [...], "classes": [...]}
+  GET  /stats    requests, rows, batches, mean batch size, rows/s over the last 10 s and request
+                 latency p50/p95/p99 (queueing + scoring, measured server-side)
+  GET  /health
+
+By default it scores with the exported NumPy artifact (cognitive_decline_scorer.py);
+--joblib serves the scikit-learn pipeline instead.
+
+With --reload-every S the served file is checked every S seconds, and a changed
+one is loaded and swapped in between batches without a restart. A file that
+fails to load, or that has different features or classes, is logged and the
+current model keeps serving. Pointing --model at artifacts/online/current.npz
+follows the versions published by online_update.py. /stats reports which file
+is loaded and how often it was swapped.
+
+Usage:
+  python scoring_service.py                         # http://127.0.0.1:8795
+  python scoring_service.py --unix /tmp/cca-risk.sock
+  python scoring_service.py --model artifacts/online/current.npz --reload-every 2
+  python scoring_service.py --load-test http://127.0.0.1:8795 --clients 32 --requests 200
+"""
+
+from __future__ import annotations
+
+import argparse
+import hashlib
+import http.client
+import json
+import logging
+import os
+import queue
+import socket
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from urllib.parse import urlparse
+
+import numpy as np
+
+from cognitive_decline_scorer import ARTIFACT, JOBLIB_ARTIFACT, LinearScorer
+
+DEFAULT_PORT = int(os.environ.get("CCA_RISK_PORT", "8795"))
+DEFAULT_WINDOW_MS = 2.0
+DEFAULT_MAX_ROWS = 65536
+MAX_BODY = 64 * 1024 * 1024
+CLASS_NAMES = ["Normal", "Mild Risk", "High Risk"]
+
+logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+logger = logging.getLogger("risk-service")
+
+
+def percentile(ordered, q):
+    if not ordered:
+        return None
+    return ordered[min(len(ordered) - 1, int(len(ordered) * q / 100))]
+
+
+class MicroBatcher:
+    """Collects concurrent predict() calls into one vectorized model call per window."""
+
+    def __init__(self, predict_proba, window_ms=DEFAULT_WINDOW_MS, max_rows=DEFAULT_MAX_ROWS):
+        self.predict_proba = predict_proba
+        self.window = window_ms / 1000.0
+        self.max_rows = max_rows
+        self.queue = queue.Queue()
+        self.lock = threading.Lock()
+        self.started_at = time.time()
+        self.started_monotonic = time.monotonic()
+        self.requests = 0
+        self.rows = 0
+        self.batches = 0
+        self.latencies = deque(maxlen=10000)  # ms per request
+        self.recent = deque()  # (monotonic time, rows) for the last 10 s
+
+    def start(self):
+        threading.Thread(target=self._run, name="micro-batcher", daemon=True).start()
+        return self
+
+    def predict(self, X: np.ndarray) -> np.ndarray:
+        """Block until the batch holding X has been scored; returns X's probabilities."""
+        future = Future()
+        self.queue.put((X, future, time.perf_counter()))
+        return future.result()
+
+    def _run(self):
+        while True:
+            batch = [self.queue.get()]
+            rows = len(batch[0][0])
+            deadline = time.monotonic() + self.window
+            while rows < self.max_rows:
+                try:
+                    item = self.queue.get_nowait()
+                except queue.Empty:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    try:
+                        item = self.queue.get(timeout=remaining)
+                    except queue.Empty:
+                        break
+                batch.append(item)
+                rows += len(item[0])
+            self._score(batch, rows)
+
+    def _score(self, batch, rows):
+        try:
+            # self.predict_proba is read once per batch, so a reload swaps models between batches
+            proba = self.predict_proba(np.vstack([X for X, _, _ in batch]) if len(batch) > 1 else batch[0][0])
+        except Exception as e:
+            for _, future, _ in batch:
+                future.set_exception(e)
+            return
+        done = time.perf_counter()
+        offset = 0
+        for X, future, queued_at in batch:
+            future.set_result(proba[offset : offset + len(X)])
+            offset += len(X)
+        with self.lock:
+            self.requests += len(batch)
+            self.rows += rows
+            self.batches += 1
+            self.latencies.extend((done - queued_at) * 1000 for _, _, queued_at in batch)
+            now = time.monotonic()
+            self.recent.append((now, rows))
+            while self.recent and self.recent[0][0] < now - 10:
+                self.recent.popleft()
+
+    def stats(self):
+        with self.lock:
+            ordered = sorted(self.latencies)
+            recent = list(self.recent)
+            snapshot = {
+                "uptime_s": round(time.time() - self.started_at, 1),
+                "requests": self.requests,
+                "rows": self.rows,
+                "batches": self.batches,
+                "mean_batch_rows": round(self.rows / self.batches, 1) if self.batches else 0,
+                "window_ms": self.window * 1000,
+            }
+        # rows scored in the last 10 s over the whole 10 s (or the uptime, if shorter), idle time included
+        now = time.monotonic()
+        window = min(10.0, now - self.started_monotonic)
+        scored = sum(rows for at, rows in recent if at >= now - 10)
+        snapshot["rows_per_s_10s"] = round(scored / window, 1) if window > 0 else 0
+        snapshot["latency_ms"] = {f"p{q}": percentile(ordered, q) for q in (50, 95, 99)}
+        return snapshot
+
+
+def parse_rows(data, n_features):
+    """(X, single) from {"features": [...]} or {"rows": [[...], ...]}; raises ValueError."""
+    if "features" in data:
+        X, single = np.asarray([data["features"]], dtype=np.float64), True
+    elif "rows" in data:
+        X, single = np.asarray(data["rows"], dtype=np.float64), False
+    else:
+        raise ValueError('send {"features": [...]} or {"rows": [[...], ...]}')
+    if X.ndim != 2 or X.shape[1] != n_features or not len(X):
+        raise ValueError(f"each row needs {n_features} numbers")
+    if not np.isfinite(X).all():
+        raise ValueError("features must be finite numbers")
+    return X, single
+
+
+class ScoringHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep-alive: a busy client reuses its connection
+    batcher: MicroBatcher = None
+    reloader: ModelReloader = None
+    class_names: list[str] = CLASS_NAMES
+    n_features = 3
+
+    def do_GET(self):
+        path = urlparse(self.path).path
+        if path == "/stats":
+            self._send_json(200, {**self.batcher.stats(), "model": self.reloader.stats()})
+        elif path == "/health":
+            self._send_json(200, {"ok": True})
+        else:
+            self._send_json(404, {"error": "not found"})
+
+    def do_POST(self):
+        header = self.headers.get("Content-Length")
+        if header is None:
+            self.close_connection = True  # the body, if any, cannot be told from the next request
+            self._send_json(411, {"error": "Content-Length required"})
+            return
+        try:
+            content_length = int(header)
+            if content_length < 0:
+                raise ValueError
+        except ValueError:
+            self.close_connection = True
+            self._send_json(400, {"error": "invalid Content-Length"})
+            return
+        if content_length > MAX_BODY:
+            self.close_connection = True
+            self._send_json(413, {"error": "request too large"})
+            return
+        body = self.rfile.read(content_length)
+        if urlparse(self.path).path != "/predict":
+            self._send_json(404, {"error": "not found"})
+            return
+        try:
+            data = json.loads(body.decode("utf-8")) if body else {}
+            if not isinstance(data, dict):
+                raise ValueError("body must be a JSON object")
+            X, single = parse_rows(data, self.n_features)
+        except (UnicodeDecodeError, TypeError, ValueError) as e:
+            self._send_json(400, {"error": str(e)})
+            return
+        try:
+            proba = self.batcher.predict(X)
+        except Exception as e:
+            logger.error("Scoring failed: %s", e)
+            self._send_json(500, {"error": "scoring failed"})
+            return
+        labels = [self.class_names[i] for i in np.argmax(proba, axis=1)]
+        if single:
+            self._send_json(200, {"probabilities": proba[0].tolist(), "label": labels[0], "classes": self.class_names})
+            return
+        resp = {"probabilities": proba.tolist(), "labels": labels, "classes": self.class_names}
+        if isinstance(data.get("ids"), list) and len(data["ids"]) == len(X):
+            resp["ids"] = data["ids"]
+        self._send_json(200, resp)
+
+    def _send_json(self, status, obj):
+        body = json.dumps(obj).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def address_string(self):
+        return self.client_address[0] if isinstance(self.client_address, tuple) else "unix"
+
+    def log_message(self, format, *args):
+        logger.debug(format % args)
+
+
+class ScoringServer(ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = 128  # socketserver's default backlog of 5 resets bursts of concurrent clients
+
+
+class UnixScoringServer(ScoringServer):
+    address_family = socket.AF_UNIX
+
+    def server_bind(self):
+        if os.path.exists(self.server_address):
+            os.unlink(self.server_address)
+        self.socket.bind(self.server_address)
+        self.server_name, self.server_port = "localhost", 0
+
+
+def load_model(joblib_path: Path | None, artifact: Path):
+    """(predict_proba, class names, n_features) for the NumPy artifact or a joblib pipeline."""
+    if joblib_path is None:
+        scorer = LinearScorer.load(artifact)
+        return scorer.predict_proba, list(scorer.class_names), len(scorer.feature_names)
+    import joblib
+
+    model = joblib.load(joblib_path)
+    return model.predict_proba, CLASS_NAMES, int(model.n_features_in_)
+
+
+class ModelReloader:
+    """Polls the served model file and swaps a changed one into the batcher."""
+
+    def __init__(self, batcher: MicroBatcher, joblib_path: Path | None, artifact: Path, every: float, class_names, n_features):
+        self.batcher = batcher
+        self.shape = (list(class_names), n_features)  # what the handlers were built for
+        self.joblib_path = joblib_path
+        self.path = joblib_path or artifact
+        self.every = every
+        self.lock = threading.Lock()
+        self.signature = self._signature()
+        self.loaded = {"path": str(self.path), "sha256": self._digest(), "loaded_at": time.time(), "reloads": 0, "failed_reloads": 0}
+
+    def start(self):
+        if self.every > 0:
+            threading.Thread(target=self._run, name="model-reloader", daemon=True).start()
+        return self
+
+    def _signature(self):
+        try:
+            st = os.stat(self.path)
+        except OSError:
+            return None
+        return st.st_mtime_ns, st.st_size, st.st_ino
+
+    def _digest(self):
+        return hashlib.sha256(self.path.read_bytes()).hexdigest()[:16]
+
+    def _run(self):
+        while True:
+            time.sleep(self.every)
+            signature = self._signature()
+            if signature is None or signature == self.signature:
+                continue  # unchanged, or removed
+            self.signature = signature
+            self.reload()
+
+    def reload(self) -> bool:
+        try:
+            predict_proba, class_names, n_features = load_model(self.joblib_path, self.path)
+            digest = self._digest()
+        except Exception as e:
+            logger.warning("Reloading %s failed, still serving the previous model: %s", self.path, e)
+            with self.lock:
+                self.loaded["failed_reloads"] += 1
+            return False
+        if (list(class_names), n_features) != self.shape:
+            logger.warning("Not reloading %s: features or classes differ from the served model", self.path)
+            with self.lock:
+                self.loaded["failed_reloads"] += 1
+            return False
+        self.batcher.predict_proba = predict_proba
+        with self.lock:
+            self.loaded.update(sha256=digest, loaded_at=time.time(), reloads=self.loaded["reloads"] + 1)
+        logger.info("Reloaded %s (sha256 %s)", self.path, digest)
+        return True
+
+    def stats(self):
+        with self.lock:
+            return dict(self.loaded)
+
+
+def serve(args):
+    predict_proba, class_names, n_features = load_model(args.joblib, args.model)
+    batcher = MicroBatcher(predict_proba, args.window_ms, args.max_rows).start()
+    reloader = ModelReloader(batcher, args.joblib, args.model, args.reload_every, class_names, n_features).start()
+    handler = type(
+        "Handler",
+        (ScoringHandler,),
+        {
+            "batcher": batcher,
+            "reloader": reloader,
+            "class_names": class_names,
+            "n_features": n_features,
+            # headers and body go out in separate writes; with Nagle on, delayed ACKs add ~40 ms to each
+            "disable_nagle_algorithm": not args.unix,
+        },
+    )
+    if args.unix:
+        server = UnixScoringServer(args.unix, handler)
+        where = f"unix:{args.unix}"
+    else:
+        server = ScoringServer((args.host, args.port), handler)
+        where = f"http://{args.host}:{args.port}"
+    logger.info("Scoring on %s (window %.1f ms, up to %d rows per batch)", where, args.window_ms, args.max_rows)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        logger.info("Shutting down")
+    finally:
+        server.server_close()
+        if args.unix and os.path.exists(args.unix):
+            os.unlink(args.unix)
+
+
+def load_test(url, clients, requests, rows):
+    """Fire requests from concurrent keep-alive clients; prints client-side rows/s and latency."""
+    target = urlparse(url)
+    latencies = []
+    errors = []
+    lock = threading.Lock()
+
+    def client(seed):
+        rng = np.random.default_rng(seed)
+        conn = http.client.HTTPConnection(target.hostname, target.port or 80, timeout=30)
+        mine = []
+        try:
+            for _ in range(requests):
+                X = rng.normal(0.5, 0.3, (rows, 3)).round(4).tolist()
+                body = json.dumps({"features": X[0]} if rows == 1 else {"rows": X})
+                started = time.perf_counter()
+                conn.request("POST", "/predict", body, {"Content-Type": "application/json"})
+                resp = conn.getresponse()
+                resp.read()
+                if resp.status != 200:
+                    raise RuntimeError(f"HTTP {resp.status}")
+                mine.append((time.perf_counter() - started) * 1000)
+        except (OSError, RuntimeError, http.client.HTTPException) as e:
+            with lock:
+                errors.append(str(e))
+        finally:
+            conn.close()
+        with lock:
+            latencies.extend(mine)
+
+    started = time.perf_counter()
+    threads = [threading.Thread(target=client, args=(i,)) for i in range(clients)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - started
+    ordered = sorted(latencies)
+    total = len(ordered) * rows
+    print(f"{len(ordered):,} requests ({total:,} rows) from {clients} clients in {elapsed:.2f}s")
+    print(f"  {len(ordered) / elapsed:,.0f} req/s, {total / elapsed:,.0f} rows/s")
+    if errors:
+        print(f"  {len(errors)} client(s) failed, first: {errors[0]}")
+    if not ordered:
+        return
+    print(f"  latency p50 {percentile(ordered, 50):.2f} ms, p95 {percentile(ordered, 95):.2f} ms, p99 {percentile(ordered, 99):.2f} ms")
+    conn = http.client.HTTPConnection(target.hostname, target.port or 80, timeout=5)
+    conn.request("GET", "/stats")
+    print("  server:", conn.getresponse().read().decode())
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Serve cognitive-decline risk scores with micro-batching")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    parser.add_argument("--unix", metavar="PATH", help="Listen on a Unix socket instead of TCP")
+    parser.add_argument("--model", type=Path, default=ARTIFACT, help="Exported .npz/.json model (default)")
+    parser.add_argument("--joblib", type=Path, nargs="?", const=JOBLIB_ARTIFACT, help="Serve the sklearn pipeline instead")
+    parser.add_argument("--reload-every", type=float, default=0, metavar="S", help="Check the model file every S seconds and hot-swap it when it changes (0 = never)")
+    parser.add_argument("--window-ms", type=float, default=DEFAULT_WINDOW_MS, help="Micro-batching window (0 = only what is already queued)")
+    parser.add_argument("--max-rows", type=int, default=DEFAULT_MAX_ROWS, help="Rows per model call at most")
+    parser.add_argument("--load-test", metavar="URL", help="Benchmark a running service instead of serving")
+    parser.add_argument("--clients", type=int, default=16)
+    parser.add_argument("--requests", type=int, default=200, help="Requests per client (--load-test)")
+    parser.add_argument("--rows", type=int, default=1, help="Rows per request (--load-test)")
+    args = parser.parse_args()
+
+    if args.load_test:
+        load_test(args.load_test, args.clients, args.requests, args.rows)
+    else:
+        serve(args)
+
+
+if __name__ == "__main__":
+    main()
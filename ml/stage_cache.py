@@ -0,0 +1,139 @@
+"""
+Content-addressed cache for the training stages (data → fit → evaluate → plots).
+
+A stage's key is a hash of its name, the source of the code that computes it,
+its parameters, the keys of the stages it consumes and the numpy /
+scikit-learn versions. So a key changes exactly when something that could
+change the result does. Results are pickled with joblib to
+artifacts/stage_cache/<stage>/<key>.joblib. A run whose key is already there
+loads the result instead of recomputing it, and everything downstream of an
+unchanged stage keeps its key too.
+
+Stages that write files (the plots) return their paths with a content hash;
+verify() re-runs the stage if any of those files went missing or was edited.
+
+Entries are never overwritten, only added; prune() keeps the newest few per
+stage.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import inspect
+import json
+import os
+import tempfile
+import time
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Callable
+
+import joblib
+import numpy as np
+import sklearn
+
+HERE = Path(__file__).resolve().parent
+CACHE_DIR = HERE / "artifacts" / "stage_cache"
+
+
+@dataclass
+class StageResult:
+    name: str
+    key: str
+    value: Any
+    cached: bool
+    seconds: float
+
+
+def file_digest(path: str | Path) -> str:
+    return hashlib.sha256(Path(path).read_bytes()).hexdigest()
+
+
+def files_unchanged(files: dict) -> bool:
+    """True if every {path: sha256} entry still exists with that content."""
+    try:
+        return all(file_digest(path) == digest for path, digest in files.items())
+    except OSError:
+        return False
+
+
+class StageCache:
+    def __init__(self, root: str | Path = CACHE_DIR, enabled: bool = True):
+        self.root = Path(root)
+        self.enabled = enabled
+        self.results: list[StageResult] = []
+
+    def key(self, name: str, code, params: dict, inputs) -> str:
+        doc = {
+            "stage": name,
+            "code": [hashlib.sha256(inspect.getsource(obj).encode()).hexdigest() for obj in code],
+            "params": params,
+            "inputs": [result.key for result in inputs],
+            "versions": [np.__version__, sklearn.__version__],
+        }
+        return hashlib.sha256(json.dumps(doc, sort_keys=True, default=str).encode()).hexdigest()[:20]
+
+    def run(
+        self,
+        name: str,
+        fn: Callable,
+        inputs: tuple[StageResult, ...] = (),
+        params: dict | None = None,
+        unkeyed: dict | None = None,
+        code: tuple = (),
+        verify: Callable[[Any], bool] | None = None,
+    ) -> StageResult:
+        """fn(*input values, **params, **unkeyed), or its cached result.
+
+        unkeyed arguments (worker counts, output directories) do not change what
+        the stage computes and stay out of the key; code lists extra functions or
+        modules whose source the result depends on besides fn itself.
+        """
+        params = params or {}
+        key = self.key(name, (fn, *code), params, inputs)
+        path = self.root / name / f"{key}.joblib"
+        started = time.perf_counter()
+        if self.enabled and path.exists():
+            try:
+                value = joblib.load(path)
+            except Exception:  # truncated or unreadable entry: recompute
+                value = None
+            else:
+                if verify is None or verify(value):
+                    os.utime(path)  # keeps entries in use out of prune()
+                    return self._record(StageResult(name, key, value, True, time.perf_counter() - started))
+        value = fn(*(result.value for result in inputs), **params, **(unkeyed or {}))
+        if self.enabled:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            fd, tmp = tempfile.mkstemp(prefix=f".{key}-", dir=path.parent)
+            os.close(fd)
+            try:
+                joblib.dump(value, tmp)
+                os.replace(tmp, path)
+            except BaseException:
+                os.unlink(tmp)
+                raise
+        return self._record(StageResult(name, key, value, False, time.perf_counter() - started))
+
+    def _record(self, result: StageResult) -> StageResult:
+        self.results.append(result)
+        return result
+
+    def summary(self) -> str:
+        return "\n".join(
+            f"  {r.name:<9} {'cached' if r.cached else 'ran':<7} {r.seconds * 1000:9.1f} ms  {r.key}" for r in self.results
+        )
+
+    def prune(self, keep: int = 5) -> int:
+        """Delete all but the newest keep entries of each stage; returns how many were removed."""
+        removed = 0
+        if not self.root.is_dir():
+            return removed
+        for stage in self.root.iterdir():
+            if not stage.is_dir():
+                continue
+            entries = sorted(stage.glob("*.joblib"), key=lambda p: p.stat().st_mtime, reverse=True)
+            for entry in entries[keep:]:
+                entry.unlink()
+                removed += 1
+        return removed
@@ -0,0 +1,373 @@
+"""
+Streaming feature engine for the cognitive-decline model.
+
+Turns the raw sample streams the bridges forward into the model's feature
+vector, in FEATURE_NAMES order, with O(1) work per sample:
+
+  emg_variability  coefficient of variation (std / mean) of EMG amplitude over
+                   the last emg_window_s, from a sliding Welford mean/variance
+  hr_trend_slope   least-squares slope of heart rate over the last hr_window_s,
+                   in beats/min per window, from running sums
+  temp_anomaly     |mean of the hottest thermal pixels over temp_window_s −
+                   baseline|, the baseline being a slow exponential average
+                   (time constant baseline_s) unless one is supplied
+
+Each window evicts samples older than its length, so a sample enters and
+leaves exactly once; the running sums are recomputed from the window every
+RESYNC_EVERY evictions so floating-point drift cannot build up. A feature is
+NaN until its window has enough samples.
+
+Inputs are bridge frames: emg_data (muscleActivity / voltage), thermal_data
+(the 8×8 grid) and anything carrying heart_rate / heartRate / hr / bpm (no
+sensor in the current stack produces it yet). bridge-supervisor.py --features
+feeds one engine from both bridges; offline, this script replays recorded
+JSONL (bridge frames, or emg_sessions exports with "readings"):
+
+  python streaming_features.py session.jsonl --out features.csv --every 1
+  python streaming_features.py --bench 1000000
+"""
+
+from __future__ import annotations
+
+import argparse
+import csv
+import itertools
+import json
+import math
+import sys
+import threading
+import time
+from collections import deque
+from dataclasses import dataclass
+from datetime import datetime, timezone
+
+FEATURE_NAMES = ("emg_variability", "hr_trend_slope", "temp_anomaly")
+HR_KEYS = ("heart_rate", "heartRate", "hr", "bpm")
+RESYNC_EVERY = 4096
+
+
+class RollingStats:
+    """Mean / variance over a sliding time window (Welford add + remove)."""
+
+    def __init__(self, window_s: float):
+        self.window_s = window_s
+        self.samples: deque[tuple[float, float]] = deque()
+        self.n = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+        self.evictions = 0
+
+    def add(self, t: float, x: float) -> None:
+        self.samples.append((t, x))
+        self.n += 1
+        d = x - self.mean
+        self.mean += d / self.n
+        self.m2 += d * (x - self.mean)
+        cutoff = t - self.window_s
+        while self.samples[0][0] < cutoff:
+            self._remove(self.samples.popleft()[1])
+
+    def _remove(self, x: float) -> None:
+        self.n -= 1
+        if self.n == 0:
+            self.mean = self.m2 = 0.0
+            return
+        d = x - self.mean
+        self.mean -= d / self.n
+        self.m2 = max(self.m2 - d * (x - self.mean), 0.0)
+        self.evictions += 1
+        if self.evictions % RESYNC_EVERY == 0:
+            self._resync()
+
+    def _resync(self) -> None:
+        values = [x for _, x in self.samples]
+        self.mean = math.fsum(values) / self.n
+        self.m2 = math.fsum((x - self.mean) ** 2 for x in values)
+
+    @property
+    def variance(self) -> float:
+        return self.m2 / self.n if self.n else math.nan
+
+
+class RollingSlope:
+    """Least-squares slope of y over t in a sliding time window, from running sums."""
+
+    def __init__(self, window_s: float, min_samples: int = 3):
+        self.window_s = window_s
+        self.min_samples = min_samples
+        self.samples: deque[tuple[float, float]] = deque()
+        self.t0 = None  # sums are kept on t - t0 so t² does not swamp the differences
+        self.n = 0
+        self.st = self.sy = self.stt = self.sty = 0.0
+        self.evictions = 0
+
+    def add(self, t: float, y: float) -> None:
+        if self.t0 is None:
+            self.t0 = t
+        self.samples.append((t, y))
+        self._accumulate(t - self.t0, y, 1)
+        cutoff = t - self.window_s
+        while self.samples[0][0] < cutoff:
+            old_t, old_y = self.samples.popleft()
+            self._accumulate(old_t - self.t0, old_y, -1)
+            self.evictions += 1
+            if self.evictions % RESYNC_EVERY == 0:
+                self._resync()
+
+    def _accumulate(self, u: float, y: float, sign: int) -> None:
+        self.n += sign
+        self.st += sign * u
+        self.sy += sign * y
+        self.stt += sign * u * u
+        self.sty += sign * u * y
+
+    def _resync(self) -> None:
+        self.t0 = self.samples[0][0]
+        self.n = 0
+        self.st = self.sy = self.stt = self.sty = 0.0
+        for t, y in self.samples:
+            self._accumulate(t - self.t0, y, 1)
+
+    @property
+    def slope(self) -> float:
+        """dy/dt, NaN until min_samples spread over some time."""
+        if self.n < self.min_samples:
+            return math.nan
+        denom = self.n * self.stt - self.st * self.st
+        if denom <= 1e-12 * max(self.n * self.stt, 1.0):
+            return math.nan
+        return (self.n * self.sty - self.st * self.sy) / denom
+
+
+@dataclass
+class FeatureConfig:
+    emg_window_s: float = 30.0
+    hr_window_s: float = 300.0
+    temp_window_s: float = 30.0
+    baseline_s: float = 1800.0
+    hot_pixels: int = 8  # subject surface ≈ the hottest pixels; the rest is background
+
+
+class FeatureEngine:
+    """Feeds raw samples in, reads FEATURE_NAMES out. Thread-safe (one lock per engine).
+
+    baseline, when given, replaces the running thermal baseline: a number (°C)
+    or a callable(t) returning one (e.g. thermal_baseline.BaselineStore.baseline_fn);
+    while the callable returns None the running baseline is used. on_thermal, if
+    set, is called as on_thermal(t, grid) for every frame (e.g. to update that store).
+    """
+
+    def __init__(self, config: FeatureConfig | None = None, baseline=None):
+        self.config = config or FeatureConfig()
+        self.emg = RollingStats(self.config.emg_window_s)
+        self.hr = RollingSlope(self.config.hr_window_s)
+        self.temp = RollingStats(self.config.temp_window_s)
+        self.baseline = baseline
+        self.on_thermal = None
+        self.running_baseline = None
+        self.last_thermal_t = None
+        self.counts = {"emg": 0, "hr": 0, "thermal": 0}
+        self.lock = threading.Lock()
+
+    def add_emg(self, t: float, value: float) -> None:
+        with self.lock:
+            self.emg.add(t, value)
+            self.counts["emg"] += 1
+
+    def add_hr(self, t: float, bpm: float) -> None:
+        with self.lock:
+            self.hr.add(t, bpm)
+            self.counts["hr"] += 1
+
+    def add_thermal(self, t: float, grid) -> None:
+        pixels = sorted(itertools.chain.from_iterable(grid), reverse=True)  # ~2x faster than a float() genexpr
+        if not pixels:
+            return
+        hot = pixels[: max(1, self.config.hot_pixels)]
+        surface = float(sum(hot)) / len(hot)
+        with self.lock:
+            self.temp.add(t, surface)
+            if self.running_baseline is None:
+                self.running_baseline = surface
+            else:
+                dt = max(t - self.last_thermal_t, 0.0)
+                self.running_baseline += (1 - math.exp(-dt / self.config.baseline_s)) * (surface - self.running_baseline)
+            self.last_thermal_t = t
+            self.counts["thermal"] += 1
+        if self.on_thermal is not None:
+            self.on_thermal(t, grid)
+
+    def observe(self, obj: dict, t: float) -> str | None:
+        """Route one bridge frame by its content; returns the channel it fed, if any."""
+        kind = obj.get("type")
+        if kind == "thermal_data" and isinstance(obj.get("thermal_data"), list):
+            self.add_thermal(t, obj["thermal_data"])
+            return "thermal"
+        value = obj.get("muscleActivity", obj.get("voltage"))
+        if kind in ("emg_data", None) and isinstance(value, (int, float)) and not isinstance(value, bool):
+            self.add_emg(t, float(value))
+            return "emg"
+        for key in HR_KEYS:
+            bpm = obj.get(key)
+            if isinstance(bpm, (int, float)) and not isinstance(bpm, bool) and bpm > 0:
+                self.add_hr(t, float(bpm))
+                return "hr"
+        return None
+
+    def vector(self, t: float | None = None) -> list[float]:
+        """[emg_variability, hr_trend_slope, temp_anomaly]; NaN where a window has too little data."""
+        with self.lock:
+            emg_cv = math.nan
+            if self.emg.n >= 2 and abs(self.emg.mean) > 1e-12:
+                emg_cv = math.sqrt(self.emg.variance) / abs(self.emg.mean)
+            hr_slope = self.hr.slope * self.config.hr_window_s if self.hr.n else math.nan
+            anomaly = math.nan
+            if self.temp.n:
+                if callable(self.baseline):
+                    reference = self.baseline(self.last_thermal_t if t is None else t)
+                    if reference is None:
+                        reference = self.running_baseline
+                else:
+                    reference = self.running_baseline if self.baseline is None else self.baseline
+                if reference is not None:
+                    anomaly = abs(self.temp.mean - reference)
+        return [emg_cv, hr_slope, anomaly]
+
+    def snapshot(self) -> dict:
+        values = self.vector()
+        features = {name: (None if math.isnan(v) else round(v, 6)) for name, v in zip(FEATURE_NAMES, values)}
+        return {"features": features, "samples": dict(self.counts), "ready": all(v is not None for v in features.values())}
+
+
+# --- Offline replay ----------------------------------------------------------
+
+
+def record_time(obj: dict, fallback: float) -> float:
+    """Seconds for a recorded frame: "t", an ISO timestamp, or epoch s/ms; else fallback."""
+    t = obj.get("t")
+    if isinstance(t, (int, float)):
+        return float(t)
+    ts = obj.get("timestamp")
+    if isinstance(ts, str):
+        try:
+            dt = datetime.fromisoformat(ts.replace("Z", "+00:00"))
+        except ValueError:
+            return fallback
+        if dt.tzinfo is None:
+            dt = dt.replace(tzinfo=timezone.utc)
+        return dt.timestamp()
+    if isinstance(ts, (int, float)) and not isinstance(ts, bool):
+        return ts / 1000.0 if ts > 1e11 else float(ts)
+    return fallback
+
+
+def iter_records(paths):
+    """Frames from JSONL files (or one JSON document / array per file); session exports are expanded."""
+    for path in paths:
+        with open(path, encoding="utf-8") if path != "-" else sys.stdin as f:
+            text = f.read() if path.endswith(".json") else None
+            lines = [text] if text is not None else f
+            for line in lines:
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    doc = json.loads(line)
+                except json.JSONDecodeError:
+                    continue
+                for obj in doc if isinstance(doc, list) else [doc]:
+                    if not isinstance(obj, dict):
+                        continue
+                    if isinstance(obj.get("readings"), list):  # emg_sessions export
+                        for reading in obj["readings"]:
+                            if isinstance(reading, dict):
+                                yield {"type": "emg_data", **reading}
+                    else:
+                        yield obj
+
+
+def replay(paths, out, every: float, emit_on: str, config: FeatureConfig) -> int:
+    engine = FeatureEngine(config)
+    writer = csv.writer(out)
+    writer.writerow(["t", *FEATURE_NAMES])
+    next_emit = None
+    rows = 0
+    last_t = 0.0
+    for obj in iter_records(paths):
+        last_t = record_time(obj, last_t)
+        channel = engine.observe(obj, last_t)
+        if channel != emit_on:
+            continue
+        if next_emit is None or last_t >= next_emit:
+            next_emit = last_t + every
+            writer.writerow([f"{last_t:.3f}", *("" if math.isnan(v) else f"{v:.6f}" for v in engine.vector())])
+            rows += 1
+    return rows
+
+
+def bench(n: int) -> None:
+    import random
+
+    rng = random.Random(0)
+    engine = FeatureEngine()
+    emg = [(i / 1000.0, 0.5 + 0.2 * rng.random()) for i in range(n)]
+    started = time.perf_counter()
+    for t, v in emg:
+        engine.add_emg(t, v)
+    emg_rate = n / (time.perf_counter() - started)
+
+    hr = [(i / 10.0, 70 + 0.01 * i + rng.gauss(0, 2)) for i in range(n)]
+    started = time.perf_counter()
+    for t, v in hr:
+        engine.add_hr(t, v)
+    hr_rate = n / (time.perf_counter() - started)
+
+    frames = max(1, n // 100)
+    grid = [[22 + rng.random() for _ in range(8)] for _ in range(8)]
+    started = time.perf_counter()
+    for i in range(frames):
+        engine.add_thermal(i / 10.0, grid)
+    thermal_rate = frames / (time.perf_counter() - started)
+
+    started = time.perf_counter()
+    for i in range(10000):
+        engine.observe({"type": "emg_data", "muscleActivity": 0.5}, 1e6 + i / 1000.0)
+    observe_rate = 10000 / (time.perf_counter() - started)
+
+    print(f"emg samples       {emg_rate:12,.0f}/s")
+    print(f"hr samples        {hr_rate:12,.0f}/s")
+    print(f"thermal frames    {thermal_rate:12,.0f}/s  (8×8)")
+    print(f"observe() frames  {observe_rate:12,.0f}/s  (dict routing + lock)")
+    print("features:", engine.snapshot()["features"])
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Compute model features from recorded bridge frames")
+    parser.add_argument("inputs", nargs="*", help="JSONL/JSON files of bridge frames or session exports ('-' = stdin)")
+    parser.add_argument("--out", help="CSV output (default: stdout)")
+    parser.add_argument("--every", type=float, default=1.0, help="Seconds between output rows")
+    parser.add_argument("--emit-on", choices=("emg", "thermal", "hr"), default="thermal", help="Channel whose clock paces the output")
+    parser.add_argument("--emg-window", type=float, default=FeatureConfig.emg_window_s)
+    parser.add_argument("--hr-window", type=float, default=FeatureConfig.hr_window_s)
+    parser.add_argument("--temp-window", type=float, default=FeatureConfig.temp_window_s)
+    parser.add_argument("--baseline", type=float, default=FeatureConfig.baseline_s, help="Thermal baseline time constant (s)")
+    parser.add_argument("--bench", type=int, metavar="N", help="Measure per-sample throughput on N synthetic samples")
+    args = parser.parse_args()
+
+    if args.bench:
+        bench(args.bench)
+        return
+    if not args.inputs:
+        parser.error("give input files (or --bench N)")
+    config = FeatureConfig(args.emg_window, args.hr_window, args.temp_window, args.baseline)
+    out = open(args.out, "w", newline="") if args.out else sys.stdout
+    try:
+        rows = replay(args.inputs, out, args.every, args.emit_on, config)
+    finally:
+        if args.out:
+            out.close()
+    print(f"{rows} feature rows", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,385 @@
+"""
+Per-subject thermal baseline store: the "expected thermal baseline" temp_anomaly is measured against.
+
+For every subject it keeps running count / mean / M2 (Welford) per pixel and
+for the surface temperature (mean of the hottest pixels, as streaming_features
+computes it), separately for each time-of-day bucket (24 hourly buckets by
+default). Updates are incremental, from single frames, batches of frames or
+session summaries (average_surface_temp), so history never has to be
+re-scanned. A lookup is a dict hit plus one array index.
+
+On disk, a store is a directory:
+
+  meta.json     format, bucket layout, time-of-day offset
+  subjects.txt  one subject id per line, append-only; line i is row i of stats
+  stats.npy   float64 (capacity, buckets, pixels + 1, 3) memory-mapped array of
+              [n, mean, M2]; the last channel is the surface temperature
+
+1,000 subjects x 24 buckets x 65 channels is ~37 MB. The file doubles in
+capacity when it fills. One process should write a store at a time; any
+number may read it.
+
+Plugs into the feature engine as its baseline:
+
+  store = BaselineStore("baselines/")
+  engine = FeatureEngine(baseline=store.baseline_fn("subj-17"))
+  engine.on_thermal = store.recorder("subj-17")   # keep learning from live frames
+
+  python thermal_baseline.py ingest baselines/ thermal_sessions.jsonl
+  python thermal_baseline.py show baselines/ subj-17
+  python thermal_baseline.py --bench 2000
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+import numpy as np
+
+from streaming_features import FeatureConfig, record_time
+
+FORMAT_VERSION = 1
+PIXELS = 64  # AMG8833 8x8
+MIN_COUNT = 30  # frames a bucket needs before it is trusted over the all-day pooled baseline
+
+
+def local_offset_s() -> int:
+    return -time.timezone if not time.localtime().tm_isdst else -time.altzone
+
+
+def surface_temperatures(frames: np.ndarray, hot_pixels: int) -> np.ndarray:
+    """Mean of the hottest pixels per frame (frames: (n, pixels)), like FeatureEngine.add_thermal."""
+    k = max(1, min(hot_pixels, frames.shape[1]))
+    return np.partition(frames, frames.shape[1] - k, axis=1)[:, -k:].mean(axis=1)
+
+
+def merge(stats: np.ndarray, n: np.ndarray, mean: np.ndarray, m2: np.ndarray) -> None:
+    """Fold a batch's (n, mean, M2) into stats[..., 0:3] in place (Chan et al. parallel update)."""
+    na = stats[..., 0]
+    total = na + n
+    delta = mean - stats[..., 1]
+    safe = np.where(total > 0, total, 1)
+    stats[..., 2] += m2 + delta**2 * na * n / safe
+    stats[..., 1] += delta * n / safe
+    stats[..., 0] = total
+
+
+class BaselineStore:
+    def __init__(
+        self,
+        path: str | Path,
+        buckets: int = 24,
+        pixels: int = PIXELS,
+        offset_s: int | None = None,
+        hot_pixels: int = FeatureConfig.hot_pixels,
+        capacity: int = 64,
+        readonly: bool = False,
+    ):
+        """Open the store at path, creating it with these settings if it does not exist (unless readonly)."""
+        self.path = Path(path)
+        self.lock = threading.Lock()
+        self.readonly = readonly
+        meta_path = self.path / "meta.json"
+        if meta_path.exists():
+            self.meta = json.loads(meta_path.read_text())
+            if self.meta.get("format_version") != FORMAT_VERSION:
+                raise ValueError(f"{meta_path}: unsupported format {self.meta.get('format_version')}")
+            self.stats = np.load(self.path / "stats.npy", mmap_mode="r" if readonly else "r+")
+        elif readonly:
+            raise FileNotFoundError(f"no baseline store at {self.path}")
+        else:
+            self.path.mkdir(parents=True, exist_ok=True)
+            self.meta = {
+                "format_version": FORMAT_VERSION,
+                "buckets": buckets,
+                "pixels": pixels,
+                "offset_s": local_offset_s() if offset_s is None else offset_s,
+                "hot_pixels": hot_pixels,
+            }
+            self.stats = np.lib.format.open_memmap(
+                self.path / "stats.npy", mode="w+", dtype=np.float64, shape=(capacity, buckets, pixels + 1, 3)
+            )
+            self._write_meta()
+        self.buckets = self.meta["buckets"]
+        self.pixels = self.meta["pixels"]
+        self.subjects: dict[str, int] = {}
+        subjects_path = self.path / "subjects.txt"
+        if subjects_path.exists():
+            with open(subjects_path, encoding="utf-8") as f:
+                self.subjects = {line.rstrip("\n"): row for row, line in enumerate(f)}
+        self.subjects_file = None if readonly else open(subjects_path, "a", encoding="utf-8")
+
+    # --- Layout --------------------------------------------------------------
+
+    def bucket(self, t: float) -> int:
+        return int((t + self.meta["offset_s"]) % 86400 // (86400 / self.buckets))
+
+    def buckets_of(self, ts: np.ndarray) -> np.ndarray:
+        return ((np.asarray(ts, dtype=np.float64) + self.meta["offset_s"]) % 86400 // (86400 / self.buckets)).astype(np.intp)
+
+    def _write_meta(self) -> None:
+        fd, tmp = tempfile.mkstemp(prefix=".meta-", dir=self.path)
+        try:
+            with os.fdopen(fd, "w") as f:
+                json.dump(self.meta, f)
+            os.replace(tmp, self.path / "meta.json")
+        except BaseException:
+            os.unlink(tmp)
+            raise
+
+    def _row(self, subject: str) -> int:
+        """Row index for subject, adding it (and growing the file) if needed. Call with the lock held."""
+        row = self.subjects.get(subject)
+        if row is not None:
+            return row
+        if self.readonly:
+            raise ValueError(f"{self.path} is open read-only")
+        if not subject or "\n" in subject or "\r" in subject:
+            raise ValueError(f"invalid subject id {subject!r}")
+        row = len(self.subjects)
+        if row >= self.stats.shape[0]:
+            self._grow(2 * self.stats.shape[0])
+        self.subjects_file.write(subject + "\n")
+        self.subjects_file.flush()
+        self.subjects[subject] = row
+        return row
+
+    def _grow(self, capacity: int) -> None:
+        old = self.stats
+        tmp = self.path / ".stats-grow.npy"
+        grown = np.lib.format.open_memmap(tmp, mode="w+", dtype=np.float64, shape=(capacity, *old.shape[1:]))
+        grown[: old.shape[0]] = old
+        grown.flush()
+        del grown
+        old.flush()
+        self.stats = None
+        del old
+        os.replace(tmp, self.path / "stats.npy")
+        self.stats = np.load(self.path / "stats.npy", mmap_mode="r+")
+
+    # --- Updates -------------------------------------------------------------
+
+    def _flat(self, grid) -> np.ndarray:
+        values = np.asarray(grid, dtype=np.float64).reshape(-1)
+        if values.size != self.pixels:
+            raise ValueError(f"expected {self.pixels} pixels, got {values.size}")
+        return values
+
+    def update_frame(self, subject: str, t: float, grid) -> None:
+        """One frame: a Welford step for every pixel and the surface temperature."""
+        values = self._flat(grid)
+        x = np.append(values, surface_temperatures(values[None, :], self.meta["hot_pixels"])[0])
+        with self.lock:
+            row = self._row(subject)  # before touching self.stats: adding a subject may remap it
+            cell = self.stats[row, self.bucket(t)]
+            n = cell[:, 0] + 1
+            delta = x - cell[:, 1]
+            cell[:, 1] += delta / n
+            cell[:, 2] += delta * (x - cell[:, 1])
+            cell[:, 0] = n
+
+    def update_frames(self, subject: str, ts, grids) -> None:
+        """Many frames at once (e.g. a stored session): per-bucket batch statistics, merged in one step."""
+        frames = np.asarray(grids, dtype=np.float64).reshape(len(ts), -1)
+        if frames.shape[1] != self.pixels:
+            raise ValueError(f"expected {self.pixels} pixels, got {frames.shape[1]}")
+        x = np.column_stack([frames, surface_temperatures(frames, self.meta["hot_pixels"])])
+        buckets = self.buckets_of(ts)
+        with self.lock:
+            row = self._row(subject)
+            for b in np.unique(buckets):
+                batch = x[buckets == b]
+                mean = batch.mean(axis=0)
+                merge(self.stats[row, b], len(batch), mean, ((batch - mean) ** 2).sum(axis=0))
+
+    def update_summary(self, subject: str, t: float, surface: float, count: int = 1, variance: float = 0.0) -> None:
+        """A session summary (its average surface temperature) when frames were not kept; pixels untouched."""
+        with self.lock:
+            row = self._row(subject)
+            cell = self.stats[row, self.bucket(t), self.pixels]
+            merge(cell, count, float(surface), variance * count)
+
+    def flush(self) -> None:
+        if self.readonly:
+            return
+        with self.lock:
+            self.stats.flush()
+            self.subjects_file.flush()
+
+    # --- Lookups -------------------------------------------------------------
+
+    def baseline(self, subject: str, t: float, min_count: int = MIN_COUNT) -> float | None:
+        """Expected surface temperature at time t: this bucket's mean, else all buckets pooled, else None."""
+        row = self.subjects.get(subject)
+        if row is None:
+            return None
+        with self.lock:  # _grow() swaps the mapping
+            surface = self.stats[row, :, self.pixels]
+            n, mean = surface[self.bucket(t), :2]
+            if n >= min_count:
+                return float(mean)
+            total = surface[:, 0].sum()
+            return float((surface[:, 0] * surface[:, 1]).sum() / total) if total else None
+
+    def pixel_stats(self, subject: str, t: float) -> tuple[np.ndarray, np.ndarray, np.ndarray] | None:
+        """(mean, std, n) per pixel for t's bucket, or None for an unknown subject."""
+        row = self.subjects.get(subject)
+        if row is None:
+            return None
+        with self.lock:
+            cell = np.array(self.stats[row, self.bucket(t), : self.pixels])
+        n = cell[:, 0]
+        std = np.sqrt(np.divide(cell[:, 2], n - 1, out=np.zeros_like(n), where=n > 1))
+        return cell[:, 1], std, n
+
+    def baseline_fn(self, subject: str):
+        """callable(t) for FeatureEngine(baseline=...)."""
+        return lambda t: self.baseline(subject, t)
+
+    def recorder(self, subject: str):
+        """callable(t, grid) for FeatureEngine.on_thermal: every live frame updates the store."""
+        return lambda t, grid: self.update_frame(subject, t, grid)
+
+
+# --- Ingest / CLI --------------------------------------------------------------
+
+
+def session_subject(session: dict, key: str) -> str | None:
+    value = session.get(key) or session.get("subjectIdentifier") or session.get("user_id")
+    return str(value) if value else None
+
+
+def ingest(store: BaselineStore, paths, subject_key: str) -> dict:
+    counts = {"sessions": 0, "frames": 0, "summaries": 0, "skipped": 0}
+    for path in paths:
+        with open(path, encoding="utf-8") as f:
+            lines = [f.read()] if path.endswith(".json") else f
+            for line in lines:
+                try:
+                    doc = json.loads(line)
+                except json.JSONDecodeError:
+                    continue
+                for session in doc if isinstance(doc, list) else [doc]:
+                    subject = session_subject(session, subject_key) if isinstance(session, dict) else None
+                    if subject is None:
+                        counts["skipped"] += 1
+                        continue
+                    start = record_time({"timestamp": session.get("started_at")}, 0.0)
+                    samples = [
+                        s for s in session.get("samples") or []
+                        if isinstance(s, dict) and isinstance(s.get("thermalData"), list)
+                    ]
+                    grids, ts = [], []
+                    for sample in samples:
+                        grid = np.asarray(sample["thermalData"], dtype=np.float64)
+                        if grid.size == store.pixels:
+                            grids.append(grid.reshape(-1))
+                            ts.append(record_time(sample, start))
+                    if grids:
+                        store.update_frames(subject, np.array(ts), np.array(grids))
+                        counts["frames"] += len(grids)
+                    elif session.get("average_surface_temp") is not None:
+                        store.update_summary(subject, start, float(session["average_surface_temp"]))
+                        counts["summaries"] += 1
+                    else:
+                        counts["skipped"] += 1
+                        continue
+                    counts["sessions"] += 1
+    store.flush()
+    return counts
+
+
+def show(store: BaselineStore, subject: str) -> int:
+    row = store.subjects.get(subject)
+    if row is None:
+        print(f"unknown subject {subject!r} ({len(store.subjects)} in store)", file=sys.stderr)
+        return 1
+    hours = 24 / store.buckets
+    print(f"{'bucket':>13} {'frames':>8} {'surface °C':>11} {'std':>6}")
+    for b, (n, mean, m2) in enumerate(store.stats[row, :, store.pixels]):
+        if n:
+            std = (m2 / (n - 1)) ** 0.5 if n > 1 else 0.0
+            print(f"{b * hours:5.1f}-{(b + 1) * hours:4.1f} h {int(n):>8} {mean:11.2f} {std:6.2f}")
+    return 0
+
+
+def bench(subjects: int) -> None:
+    with tempfile.TemporaryDirectory() as tmp:
+        store = BaselineStore(tmp, offset_s=0)
+        rng = np.random.default_rng(0)
+        grid = 22 + rng.random((8, 8))
+        started = time.perf_counter()
+        for i in range(subjects):
+            store.update_frame(f"s{i}", i * 37.0, grid)
+        created = subjects / (time.perf_counter() - started)
+        started = time.perf_counter()
+        for i in range(subjects):
+            store.update_frame(f"s{i}", i * 37.0, grid)
+        single = subjects / (time.perf_counter() - started)
+
+        session = 22 + rng.random((600, 64))
+        ts = 1_700_000_000 + np.arange(600.0)
+        started = time.perf_counter()
+        for i in range(subjects):
+            store.update_frames(f"s{i}", ts, session)
+        batch = subjects * 600 / (time.perf_counter() - started)
+
+        started = time.perf_counter()
+        lookups = 0
+        for _ in range(5):
+            for i in range(subjects):
+                store.baseline(f"s{i}", 1_700_000_000 + i)
+                lookups += 1
+        lookup_rate = lookups / (time.perf_counter() - started)
+        store.flush()
+        size = os.path.getsize(Path(tmp) / "stats.npy")
+    print(f"subjects               {subjects:,}")
+    print(f"new subjects           {created:,.0f}/s")
+    print(f"update_frame()         {single:,.0f} frames/s")
+    print(f"update_frames()        {batch:,.0f} frames/s  (600-frame sessions)")
+    print(f"baseline() lookups     {lookup_rate:,.0f}/s")
+    print(f"stats.npy              {size / 2**20:.1f} MB")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Per-subject thermal baseline store")
+    parser.add_argument("--bench", type=int, metavar="SUBJECTS", help="Measure update and lookup rates")
+    sub = parser.add_subparsers(dest="command")
+    p = sub.add_parser("ingest", help="Fold stored thermal_sessions exports (JSONL) into a store")
+    p.add_argument("store")
+    p.add_argument("inputs", nargs="+")
+    p.add_argument("--subject-key", default="subject_identifier", help="Session field naming the subject")
+    p.add_argument("--buckets", type=int, default=24, help="Time-of-day buckets, for a new store")
+    p = sub.add_parser("show", help="Print a subject's surface baseline by time of day")
+    p.add_argument("store")
+    p.add_argument("subject")
+    args = parser.parse_args()
+
+    if args.bench:
+        bench(args.bench)
+    elif args.command == "ingest":
+        store = BaselineStore(args.store, buckets=args.buckets)
+        started = time.perf_counter()
+        counts = ingest(store, args.inputs, args.subject_key)
+        elapsed = time.perf_counter() - started
+        print(
+            f"{counts['sessions']:,} sessions ({counts['frames']:,} frames, {counts['summaries']:,} summaries, "
+            f"{counts['skipped']:,} skipped) into {len(store.subjects):,} subjects in {elapsed:.2f} s"
+        )
+    elif args.command == "show":
+        if not (Path(args.store) / "meta.json").exists():
+            parser.error(f"no store at {args.store}")
+        sys.exit(show(BaselineStore(args.store), args.subject))
+    else:
+        parser.print_help()
+
+
+if __name__ == "__main__":
+    main()
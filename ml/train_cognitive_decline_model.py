@@ -15,11 +15,11 @@ Output classes:
 
 from __future__ import annotations
 
+import argparse
 import json
 from pathlib import Path
 
 import joblib
-import matplotlib.pyplot as plt
 import numpy as np
 from sklearn.linear_model import LogisticRegression
 from sklearn.metrics import classification_report, confusion_matrix
@@ -27,89 +27,165 @@ from sklearn.model_selection import train_test_split
 from sklearn.preprocessing import StandardScaler
 from sklearn.pipeline import Pipeline
 
+from cognitive_decline_scorer import FORMAT_VERSION, export_linear_model
+from streaming_features import FEATURE_NAMES
+
 RNG = np.random.default_rng(42)
 N_SAMPLES = 600
 HERE = Path(__file__).resolve().parent
 
 
-def simulate_dataset(n: int) -> tuple[np.ndarray, np.ndarray]:
+def simulate_dataset(n: int, rng: np.random.Generator | None = None) -> tuple[np.ndarray, np.ndarray]:
     """Generate synthetic but plausible correlations with class labels."""
+    rng = RNG if rng is None else rng
     n_per = n // 3
     # Normal: low EMG variability, stable HR, small thermal deviation
     normal = np.column_stack(
         [
-            RNG.normal(0.35, 0.08, n_per),
-            RNG.normal(0.02, 0.15, n_per),
-            RNG.normal(0.15, 0.06, n_per),
+            rng.normal(0.35, 0.08, n_per),
+            rng.normal(0.02, 0.15, n_per),
+            rng.normal(0.15, 0.06, n_per),
         ]
     )
     mild = np.column_stack(
         [
-            RNG.normal(0.55, 0.1, n_per),
-            RNG.normal(0.35, 0.22, n_per),
-            RNG.normal(0.35, 0.1, n_per),
+            rng.normal(0.55, 0.1, n_per),
+            rng.normal(0.35, 0.22, n_per),
+            rng.normal(0.35, 0.1, n_per),
         ]
     )
     high = np.column_stack(
         [
-            RNG.normal(0.82, 0.12, n_per),
-            RNG.normal(0.72, 0.28, n_per),
-            RNG.normal(0.62, 0.14, n_per),
+            rng.normal(0.82, 0.12, n_per),
+            rng.normal(0.72, 0.28, n_per),
+            rng.normal(0.62, 0.14, n_per),
         ]
     )
     X = np.vstack([normal, mild, high])
     y = np.array([0] * n_per + [1] * n_per + [2] * n_per)
     # Add noise & shuffle
-    X += RNG.normal(0, 0.05, X.shape)
-    idx = RNG.permutation(len(X))
+    X += rng.normal(0, 0.05, X.shape)
+    idx = rng.permutation(len(X))
     return X[idx], y[idx]
 
 
-def main() -> None:
-    X, y = simulate_dataset(N_SAMPLES)
-    feature_names = ["emg_variability", "hr_trend_slope", "temp_anomaly"]
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Train the cognitive-decline risk model")
+    ooc = parser.add_argument_group("out-of-core training (constant memory, SGD + incremental scaler)")
+    ooc.add_argument("--out-of-core", action="store_true", help="Stream the data in chunks instead of fitting in memory")
+    ooc.add_argument("--rows", type=int, default=1_000_000, help="Simulated rows when no --data is given")
+    ooc.add_argument("--data", type=Path, help="CSV (feature columns + label) or .npy (label in the last column) to stream")
+    ooc.add_argument("--chunk-size", type=int, default=100_000)
+    ooc.add_argument("--epochs", type=int, default=3, help="Passes of SGD over the training rows")
+    ooc.add_argument("--holdout", type=float, default=0.2, help="Fraction of rows held out for evaluation")
+    sel = parser.add_argument_group("model selection (stratified K-fold CV, see model_selection.py)")
+    sel.add_argument("--select", action="store_true", help="Pick C / class_weight (and classifier) by CV before the final fit")
+    sel.add_argument("--folds", type=int, default=5)
+    sel.add_argument("--jobs", type=int, help="CV worker processes (default: all cores)")
+    sel.add_argument("--classifiers", default="logreg", help="Candidates to sweep: logreg, sgd or logreg,sgd")
+    parser.add_argument("--no-cache", action="store_true", help="Recompute every stage and leave artifacts/stage_cache alone")
+    parser.add_argument("--no-plots", action="store_true", help="Skip the figures (and matplotlib)")
+    args = parser.parse_args()
+    if args.select:
+        from model_selection import CLASSIFIERS
+
+        names = [name.strip() for name in args.classifiers.split(",") if name.strip()]
+        unknown = set(names) - set(CLASSIFIERS)
+        if not names or unknown:
+            parser.error(f"--classifiers: give one or more of {', '.join(CLASSIFIERS)}" + (f" (unknown: {', '.join(sorted(unknown))})" if unknown else ""))
+    return args
+
+
+CLASS_NAMES = ["Normal", "Mild Risk", "High Risk"]
+
 
+# --- Stages (each cached by stage_cache.StageCache; see main) ---------------
+
+
+def stage_data(n_samples: int, seed: int, test_size: float) -> dict:
+    X, y = simulate_dataset(n_samples, np.random.default_rng(seed))
     X_train, X_test, y_train, y_test = train_test_split(
-        X, y, test_size=0.25, stratify=y, random_state=42
+        X, y, test_size=test_size, stratify=y, random_state=42
     )
+    return {"X": X, "X_train": X_train, "X_test": X_test, "y_train": y_train, "y_test": y_test}
 
-    model = Pipeline(
-        [
-            ("scaler", StandardScaler()),
-            (
-                "clf",
-                LogisticRegression(
-                    max_iter=1000,
-                    solver="lbfgs",
+
+def stage_fit(data: dict, select: bool, folds: int, classifiers: str, jobs: int | None = None) -> dict:
+    cv = None
+    if select:
+        from model_selection import build_model, candidates, cross_validate, print_summary
+
+        names = [name.strip() for name in classifiers.split(",") if name.strip()]
+        cv = cross_validate(data["X_train"], data["y_train"], candidates(names), folds, jobs)
+        print_summary(cv)
+        model = build_model(cv["best"]["params"])
+    else:
+        model = Pipeline(
+            [
+                ("scaler", StandardScaler()),
+                (
+                    "clf",
+                    LogisticRegression(
+                        max_iter=1000,
+                        solver="lbfgs",
+                    ),
                 ),
-            ),
-        ]
-    )
-    model.fit(X_train, y_train)
+            ]
+        )
+    model.fit(data["X_train"], data["y_train"])
+    return {"model": model, "cv": cv}
 
-    proba = model.predict_proba(X_test)
-    pred = model.predict(X_test)
 
+def stage_evaluate(data: dict, fitted: dict, class_names: list, feature_names: list) -> dict:
+    pred = fitted["model"].predict(data["X_test"])
     report = classification_report(
-        y_test, pred, target_names=["Normal", "Mild Risk", "High Risk"], digits=3
+        data["y_test"], pred, target_names=class_names, digits=3
     )
-    cm = confusion_matrix(y_test, pred)
-
-    out_dir = HERE / "artifacts"
-    out_dir.mkdir(exist_ok=True)
-    joblib.dump(model, out_dir / "cognitive_decline_logreg.joblib")
-
+    cm = confusion_matrix(data["y_test"], pred)
     metrics = {
-        "n_train": int(len(X_train)),
-        "n_test": int(len(X_test)),
+        "n_train": int(len(data["X_train"])),
+        "n_test": int(len(data["X_test"])),
         "classification_report": report,
         "confusion_matrix": cm.tolist(),
-        "feature_names": feature_names,
+        "feature_names": list(feature_names),  # the order streaming_features.py produces
     }
-    (out_dir / "metrics.json").write_text(json.dumps(metrics, indent=2))
+    if fitted["cv"] is not None:
+        metrics["model_selection"] = fitted["cv"]
+    return metrics
+
+
+def stage_publish(fitted: dict, metrics: dict, class_names: list, format_version: int, out_dir: Path) -> dict:
+    """Write the model, its NumPy export and metrics.json; returns {path: sha256} like stage_plots.
+
+    format_version is the export format export_linear_model writes; it is taken
+    only so that a format bump changes this stage's cache key.
+    """
+    from stage_cache import file_digest
+
+    model = fitted["model"]
+    paths = [out_dir / "cognitive_decline_logreg.joblib"]
+    joblib.dump(model, paths[0])
+    # Same model as plain arrays for cognitive_decline_scorer.py (no sklearn/joblib at load time)
+    paths += export_linear_model(
+        model,
+        out_dir / "cognitive_decline_logreg",
+        metrics["feature_names"],
+        class_names,
+    )
+    paths.append(out_dir / "metrics.json")
+    paths[-1].write_text(json.dumps(metrics, indent=2))
+    return {str(path): file_digest(path) for path in paths}
+
+
+def stage_plots(data: dict, fitted: dict, class_names: list, feature_names: list, out_dir: Path) -> dict:
+    """Render both figures; returns {path: sha256} so a deleted or edited figure re-runs the stage."""
+    # Imported here so only a run that actually draws loads matplotlib
+    import matplotlib.pyplot as plt
 
-    print(report)
-    print("Confusion matrix:\n", cm)
+    from stage_cache import file_digest
+
+    model = fitted["model"]
+    X, X_test, y_test = data["X"], data["X_test"], data["y_test"]
 
     # --- Visualization: coefficient heatmap (multiclass one-vs-rest not stored; use clf.coef_)
     clf: LogisticRegression = model.named_steps["clf"]
@@ -119,7 +195,7 @@ def main() -> None:
     ax.set_xticks(range(3))
     ax.set_xticklabels(feature_names, rotation=15, ha="right")
     ax.set_yticks(range(3))
-    ax.set_yticklabels(["Normal", "Mild Risk", "High Risk"])
+    ax.set_yticklabels(class_names)
     ax.set_title(
         "Logistic regression coefficients (standardized features)\n"
         "direction of association with each class vs. others (multinomial)"
@@ -129,7 +205,6 @@ def main() -> None:
     fig_path = out_dir / "coefficient_heatmap.png"
     plt.savefig(fig_path, dpi=150)
     plt.close()
-    print(f"Saved {fig_path}")
 
     # Decision surface: EMG vs HR (fix temp at median)
     fig, ax = plt.subplots(figsize=(6.5, 5))
@@ -168,7 +243,77 @@ def main() -> None:
     surf_path = out_dir / "decision_surface_emg_hr.png"
     plt.savefig(surf_path, dpi=150)
     plt.close()
-    print(f"Saved {surf_path}")
+    return {str(path): file_digest(path) for path in (fig_path, surf_path)}
+
+
+def main() -> None:
+    args = parse_args()
+    if args.out_of_core:
+        from out_of_core import train_out_of_core
+
+        train_out_of_core(args, HERE / "artifacts")
+        return
+
+    from stage_cache import StageCache, files_unchanged
+
+    out_dir = HERE / "artifacts"
+    out_dir.mkdir(exist_ok=True)
+    cache = StageCache(enabled=not args.no_cache)
+
+    data = cache.run(
+        "data",
+        stage_data,
+        params={"n_samples": N_SAMPLES, "seed": 42, "test_size": 0.25},
+        code=(simulate_dataset,),
+    )
+    fit_code = ()
+    if args.select:
+        import model_selection
+
+        fit_code = (model_selection,)
+    fitted = cache.run(
+        "fit",
+        stage_fit,
+        (data,),
+        params={"select": args.select, "folds": args.folds, "classifiers": args.classifiers},
+        unkeyed={"jobs": args.jobs},
+        code=fit_code,
+    )
+    names = {"class_names": CLASS_NAMES, "feature_names": list(FEATURE_NAMES)}
+    evaluated = cache.run("evaluate", stage_evaluate, (data, fitted), params=names)
+    model, metrics = fitted.value["model"], evaluated.value
+
+    published = cache.run(
+        "publish",
+        stage_publish,
+        (fitted, evaluated),
+        params={"class_names": CLASS_NAMES, "format_version": FORMAT_VERSION},
+        unkeyed={"out_dir": out_dir},
+        code=(export_linear_model,),
+        verify=files_unchanged,
+    )
+    for path in published.value:
+        print(f"{'Up to date' if published.cached else 'Saved'} {path}")
+
+    print(metrics["classification_report"])
+    print("Confusion matrix:\n", np.array(metrics["confusion_matrix"]))
+
+    if not args.no_plots:
+        try:
+            plots = cache.run(
+                "plots", stage_plots, (data, fitted), params=names, unkeyed={"out_dir": out_dir}, verify=files_unchanged
+            )
+        except ModuleNotFoundError as exc:
+            if not (exc.name or "").startswith("matplotlib"):
+                raise
+            print("matplotlib is not installed; skipping plots (pip install -r requirements-ml.txt)")
+        else:
+            for path in plots.value:
+                print(f"{'Up to date' if plots.cached else 'Saved'} {path}")
+
+    print("Stages:")
+    print(cache.summary())
+    cache.prune()
 
     # Example probability row
     sample = np.array([[0.5, 0.4, 0.3]])
@@ -1,21 +1,44 @@
 #!/usr/bin/env python3
 """
-Send a file to the Raspberry Pi over USB serial (COM3).
+Send files to the Raspberry Pi over USB serial (COM3).
 
 This works by:
-1. Sending Ctrl+C to stop the thermal sender on the Pi
-2. Waiting for a shell prompt
-3. Writing the file contents via a heredoc-style echo command
+1. Sending Ctrl+C to stop the thermal sender on the Pi and waiting for a shell prompt
+2. Making sure the Pi has a current serial-file-receiver.py (typed in through the
+   shell with base64 echo only when its SHA-256 differs; it is a few KB)
+3. Running the receiver and streaming each file as zlib-compressed, CRC-framed
+   binary chunks with a sliding window of un-ACKed chunks. The Pi checks the
+   whole file's SHA-256 and moves it into place atomically
 4. Restarting the thermal sender
 
+If the cable drops mid-transfer, run the same command again: the receiver keeps
+the partial upload and the transfer resumes at the first missing chunk.
+
+--sync DIR is rsync for the sensor scripts: the Pi reports per-block rolling +
+SHA-256 checksums of its copy of each file, only changed files are sent, and
+only as copy-block/literal deltas. Every file is staged and verified before any
+is replaced; the Pi then restarts just the systemd units that run a replaced
+file. Several --port values update a row of Pis one after another.
+
 Usage:
-  python scripts/send-file-to-pi.py
+  python scripts/send-file-to-pi.py                       # serial-wifi-listener.py + thermal_codec.py
+  python scripts/send-file-to-pi.py "sensor code/thermal_sensor/usb-serial-thermal-sender.py" other.py
+  python scripts/send-file-to-pi.py FILE --to /home/pi --window 32 --chunk 4096
+  python scripts/send-file-to-pi.py --sync "sensor code/thermal_sensor" --port COM3 COM5 COM6
 """
 
+import argparse
 import base64
+import glob
+import hashlib
+import importlib.util
+import json
 import os
+import re
+import struct
 import sys
 import time
+import zlib
 
 try:
     import serial
@@ -26,12 +49,33 @@ except ImportError:
 PORT = os.environ.get("SERIAL_PORT", "COM3")
 BAUD = 115200
 PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+SENSOR_DIR = os.path.join(PROJECT_ROOT, "sensor code", "thermal_sensor")
+
+LOCAL_FILE = os.path.join(SENSOR_DIR, "serial-wifi-listener.py")
+CODEC_FILE = os.path.join(SENSOR_DIR, "thermal_codec.py")  # imported by the listener and the senders
+REMOTE_DIR = "/home/pi"
 
-LOCAL_FILE = os.path.join(PROJECT_ROOT, "sensor code", "thermal_sensor", "serial-wifi-listener.py")
-REMOTE_PATH = "/home/pi/serial-wifi-listener.py"
+RECEIVER_LOCAL = os.path.join(SENSOR_DIR, "serial-file-receiver.py")
+RECEIVER_REMOTE = "/home/pi/serial-file-receiver.py"
 
 THERMAL_SENDER_CMD = "python3 /home/pi/usb-serial-thermal-sender.py"
 
+DEFAULT_WINDOW = 16
+DEFAULT_CHUNK = 2048
+MAX_RETRIES = 8
+SYNC_BLOCK = 512
+
+
+def load_receiver():
+    """The receiver script doubles as the frame codec, so both ends always agree."""
+    spec = importlib.util.spec_from_file_location("serial_file_receiver", RECEIVER_LOCAL)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+receiver = load_receiver()
+
 
 def wait_for_prompt(ser, timeout=5):
     """Read until we see a shell prompt or timeout."""
@@ -47,26 +91,263 @@ def wait_for_prompt(ser, timeout=5):
     return False, buf.decode("utf-8", errors="replace")
 
 
-def main():
-    if not os.path.isfile(LOCAL_FILE):
-        print(f"File not found: {LOCAL_FILE}")
-        sys.exit(1)
+def shell_output(ser, command, wait=1.0):
+    """Run a shell command on the console and return whatever it printed within wait seconds."""
+    ser.read(ser.in_waiting or 1)
+    ser.write(f"{command}\r\n".encode())
+    deadline = time.time() + wait
+    buf = b""
+    while time.time() < deadline:
+        buf += ser.read(ser.in_waiting or 1)
+    return buf.decode("utf-8", errors="replace")
+
+
+def remote_sha256(ser, path):
+    match = re.search(r"\b([0-9a-f]{64})\s", shell_output(ser, f"sha256sum {path} 2>/dev/null"))
+    return match.group(1) if match else None
+
 
-    with open(LOCAL_FILE, "r") as f:
+def shell_upload(ser, content, remote_path):
+    """Type a small file into the shell as base64 echo lines (bootstrap only)."""
+    encoded = base64.b64encode(content).decode("ascii")
+    chunk_size = 512
+    chunks = [encoded[i:i + chunk_size] for i in range(0, len(encoded), chunk_size)]
+
+    ser.write(b"echo '' > /tmp/_transfer.b64\r\n")
+    time.sleep(0.3)
+    for i, chunk in enumerate(chunks):
+        ser.write(f"echo '{chunk}' >> /tmp/_transfer.b64\r\n".encode())
+        time.sleep(0.05)
+        if (i + 1) % 20 == 0:
+            time.sleep(0.2)
+    time.sleep(0.5)
+    ser.write(f"base64 -d /tmp/_transfer.b64 > {remote_path} && rm /tmp/_transfer.b64\r\n".encode())
+    time.sleep(0.5)
+
+
+def ensure_receiver(ser):
+    with open(RECEIVER_LOCAL, "rb") as f:
         content = f.read()
+    want = hashlib.sha256(content).hexdigest()
+    if remote_sha256(ser, RECEIVER_REMOTE) == want:
+        print("  Receiver is up to date.")
+        return True
+    print(f"  Installing receiver ({len(content)} bytes) via shell...")
+    shell_upload(ser, content, RECEIVER_REMOTE)
+    if remote_sha256(ser, RECEIVER_REMOTE) != want:
+        print("  Receiver checksum mismatch after upload.")
+        return False
+    return True
 
-    encoded = base64.b64encode(content.encode("utf-8")).decode("ascii")
 
-    print(f"File: {LOCAL_FILE}")
-    print(f"Size: {len(content)} bytes ({len(encoded)} base64)")
-    print(f"Target: {REMOTE_PATH} on Pi via {PORT}")
-    print()
+class Link:
+    """Frame I/O over the serial port."""
+
+    def __init__(self, ser, codec):
+        self.ser = ser
+        self.codec = codec
+        self.reader = codec.FrameReader()
+
+    def send(self, frame):
+        self.ser.write(frame)
+
+    def poll(self, timeout):
+        self.ser.timeout = timeout
+        return self.reader.feed(self.ser.read(self.ser.in_waiting or 1))
+
+    def expect(self, kinds, timeout):
+        """First frame of one of kinds within timeout, else None."""
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            for kind, seq, payload in self.poll(min(0.1, max(deadline - time.monotonic(), 0.001))):
+                if kind == self.codec.ERROR:
+                    raise RuntimeError(f"receiver error: {json.loads(payload).get('msg')}")
+                if kind in kinds:
+                    return kind, seq, payload
+        return None
+
+
+def make_delta(new, basis):
+    """Copy/literal script turning the Pi's file (described by basis signatures) into new."""
+    block = basis["block"]
+    table = {}
+    for index, (weak, strong) in enumerate(basis["blocks"]):
+        table.setdefault(weak, []).append((strong, index))
+
+    out = bytearray()
+    literal = bytearray()
+    run = None  # [start, count] of the copy run being extended
+
+    def flush_literal():
+        if literal:
+            out.extend(b"D" + struct.pack(">I", len(literal)) + literal)
+            literal.clear()
+
+    def flush_run():
+        nonlocal run
+        if run:
+            out.extend(b"C" + struct.pack(">II", *run))
+            run = None
+
+    i, n = 0, len(new)
+    weak = receiver.weak_checksum(new[:block]) if n >= block else None
+    while i + block <= n:
+        match = None
+        if weak in table:
+            strong = receiver.strong_checksum(new[i:i + block])
+            match = next((index for s, index in table[weak] if s == strong), None)
+        if match is not None:
+            flush_literal()
+            if run and run[0] + run[1] == match:
+                run[1] += 1
+            else:
+                flush_run()
+                run = [match, 1]
+            i += block
+            weak = receiver.weak_checksum(new[i:i + block]) if i + block <= n else None
+            continue
+        flush_run()
+        literal.append(new[i])
+        if i + block < n:
+            # roll the window one byte: a' = a - out + in, b' = b - block * out + a'
+            a, b = weak & 0xFFFF, weak >> 16
+            a = (a - new[i] + new[i + block]) & 0xFFFF
+            b = (b - block * new[i] + a) & 0xFFFF
+            weak = a | (b << 16)
+        i += 1
+    flush_run()
+    literal += new[i:]
+    flush_literal()
+    return bytes(out)
 
+
+def upload_file(link, local_path, remote_path, window, chunk_size, baud, basis=None, stage=False):
+    """Stream one file, as a delta against basis (the Pi's signatures) when given; returns (ok, message)."""
+    codec = link.codec
+    with open(local_path, "rb") as f:
+        raw = f.read()
+    digest = hashlib.sha256(raw).hexdigest()
+    payload, delta = raw, None
+    if basis and basis.get("size") is not None:
+        payload = make_delta(raw, basis)
+        delta = {"block": basis["block"], "base_sha256": basis["sha256"]}
+    blob = zlib.compress(payload, 6)
+    compressed = len(blob) < len(payload)
+    if not compressed:
+        blob = payload
+    chunks = [blob[i:i + chunk_size] for i in range(0, len(blob), chunk_size)] or [b""]
+
+    meta = {
+        "path": remote_path,
+        "size": len(raw),
+        "sha256": digest,
+        "compressed": compressed,
+        "chunk": chunk_size,
+        "mode": 0o755,
+        "delta": delta,
+        "stage": stage,
+    }
+    link.send(codec.encode_json(codec.HELLO, meta))
+    offer = link.expect({codec.OFFER}, 5)
+    if not offer:
+        return False, "no OFFER from receiver"
+    base = nxt = start = json.loads(offer[2])["next"]
+    if base:
+        print(f"  Resuming at chunk {base}/{len(chunks)}")
+
+    # Long enough for a full window to drain at the nominal baud rate, with margin
+    retry_after = max(1.0, 3 * window * chunk_size * 10 / baud)
+    started = time.perf_counter()
+    last_progress = time.monotonic()
+    retries = 0
+    resent = 0
+    while base < len(chunks):
+        while nxt < len(chunks) and nxt < base + window:
+            link.send(codec.encode_frame(codec.DATA, nxt, chunks[nxt]))
+            nxt += 1
+        for kind, seq, payload in link.poll(0.02):
+            if kind == codec.ACK and seq > base:
+                base = seq
+                last_progress = time.monotonic()
+                retries = 0
+            elif kind == codec.NAK and seq >= base:
+                resent += nxt - seq
+                base = nxt = seq
+            elif kind == codec.ERROR:
+                return False, json.loads(payload).get("msg", "receiver error")
+        if time.monotonic() - last_progress > retry_after:
+            retries += 1
+            if retries > MAX_RETRIES:
+                return False, f"no ACK progress after {MAX_RETRIES} retries (stopped at chunk {base}); re-run to resume"
+            resent += nxt - base
+            nxt = base
+            last_progress = time.monotonic()
+
+    link.send(codec.encode_frame(codec.END))
+    done = link.expect({codec.DONE}, 30)
+    if not done:
+        return False, "no DONE from receiver"
+    result = json.loads(done[2])
+    elapsed = max(time.perf_counter() - started, 1e-6)
+    rate = (len(blob) - start * chunk_size) / elapsed
+    print(
+        f"  {len(raw)} bytes → {len(blob)} on the wire ({len(blob) / max(len(raw), 1):.0%}), "
+        f"{'as delta, ' if delta else ''}{elapsed:.2f}s, {rate / 1024:.1f} KB/s ({rate * 10 / baud:.0%} of {baud} baud), resent {resent} chunk(s)"
+    )
+    return bool(result.get("ok")), result.get("msg", "")
+
+
+def sync_files(link, paths, remote_dir, window, chunk_size, baud):
+    """Send only changed blocks of changed files, staged; commit them all at the end. Returns failures."""
+    codec = link.codec
+    staged = []
+    failures = 0
+    for path in paths:
+        remote = f"{remote_dir.rstrip('/')}/{os.path.basename(path)}"
+        link.send(codec.encode_json(codec.SIGNATURES, {"path": remote, "block": SYNC_BLOCK}))
+        reply = link.expect({codec.SIGNATURES}, 10)
+        if not reply:
+            print(f"  {os.path.basename(path)}: no signatures from receiver")
+            failures += 1
+            continue
+        basis = json.loads(reply[2])
+        with open(path, "rb") as f:
+            if basis.get("sha256") == hashlib.sha256(f.read()).hexdigest():
+                print(f"  {os.path.basename(path)}: unchanged")
+                continue
+        print(f"  {os.path.basename(path)} → {remote}{'' if basis.get('size') is not None else ' (new)'}")
+        ok, msg = upload_file(link, path, remote, window, chunk_size, baud, basis=basis, stage=True)
+        if ok:
+            staged.append(remote)
+        else:
+            print(f"  FAILED: {msg}")
+            failures += 1
+
+    if failures:
+        print(f"  {failures} file(s) failed; nothing replaced on the Pi.")
+        return failures
+    if not staged:
+        print("  Everything up to date.")
+        return 0
+    link.send(codec.encode_json(codec.COMMIT, {"paths": staged}))
+    done = link.expect({codec.DONE}, 60)
+    if not done:
+        print("  No answer to COMMIT.")
+        return len(staged)
+    result = json.loads(done[2])
+    print(f"  Replaced {len(result.get('replaced', []))} file(s); restarted: {', '.join(result.get('restarted', [])) or 'none'}")
+    for error in result.get("errors", []):
+        print(f"  ERROR: {error}")
+    return len(result.get("errors", []))
+
+
+def open_console(port, baud):
+    """Stop the thermal sender and return the serial port at a shell prompt, or None."""
     try:
-        ser = serial.Serial(PORT, BAUD, timeout=1)
+        ser = serial.Serial(port, baud, timeout=1)
     except serial.SerialException as e:
-        print(f"Cannot open {PORT}: {e}")
-        sys.exit(1)
+        print(f"Cannot open {port}: {e}")
+        return None
 
     time.sleep(0.5)
 
@@ -92,50 +373,112 @@ def main():
         print("    2. Connect a keyboard/monitor to the Pi")
         print("    3. If Pi was previously on WiFi, power cycle it to reconnect")
         ser.close()
-        sys.exit(1)
+        return None
 
     print(f"  Shell detected!")
+    return ser
 
-    print(f"[3/5] Writing {REMOTE_PATH} via base64 decode...")
-    chunk_size = 512
-    chunks = [encoded[i:i + chunk_size] for i in range(0, len(encoded), chunk_size)]
 
-    ser.write(f"echo '' > /tmp/_transfer.b64\r\n".encode())
-    time.sleep(0.3)
+def run_session(port, args, files):
+    """Upload or sync files to the Pi on port; returns the number of failures."""
+    ser = open_console(port, args.baud)
+    if ser is None:
+        return len(files)
 
-    for i, chunk in enumerate(chunks):
-        ser.write(f"echo '{chunk}' >> /tmp/_transfer.b64\r\n".encode())
-        time.sleep(0.05)
-        if (i + 1) % 20 == 0:
-            print(f"  Sent {i + 1}/{len(chunks)} chunks...")
-            time.sleep(0.2)
+    print(f"[3/5] Checking {RECEIVER_REMOTE}...")
+    if not ensure_receiver(ser):
+        ser.close()
+        return len(files)
 
-    time.sleep(0.5)
-    ser.write(f"base64 -d /tmp/_transfer.b64 > {REMOTE_PATH}\r\n".encode())
-    time.sleep(0.5)
-    ser.write(f"chmod +x {REMOTE_PATH}\r\n".encode())
-    time.sleep(0.3)
-    ser.write(f"rm /tmp/_transfer.b64\r\n".encode())
+    print(f"[4/5] {'Syncing' if args.sync else 'Uploading'} {len(files)} file(s)...")
+    ser.write(f"python3 {RECEIVER_REMOTE}\r\n".encode())
+    link = Link(ser, receiver)
+    codec = receiver
+    failures = 0
+    try:
+        if not link.expect({codec.READY}, 10):
+            print("  Receiver did not start.")
+            failures = len(files)
+        else:
+            if args.sync:
+                failures = sync_files(link, files, args.to, args.window, args.chunk, args.baud)
+            else:
+                for path in files:
+                    remote = f"{args.to.rstrip('/')}/{os.path.basename(path)}"
+                    print(f"  {os.path.basename(path)} → {remote}")
+                    ok, msg = upload_file(link, path, remote, args.window, args.chunk, args.baud)
+                    print(f"  {'OK' if ok else 'FAILED'}: {msg}")
+                    failures += 0 if ok else 1
+            for _ in range(3):
+                link.send(codec.encode_frame(codec.BYE))
+                if link.expect({codec.BYE}, 1):
+                    break
+    except (serial.SerialException, RuntimeError) as e:
+        print(f"  Transfer interrupted: {e}")
+        failures = len(files)
     time.sleep(0.3)
 
-    print(f"[4/5] Verifying...")
-    ser.write(f"wc -c {REMOTE_PATH}\r\n".encode())
-    time.sleep(0.5)
-    ser.read(ser.in_waiting or 4096)
-    ser.write(f"head -1 {REMOTE_PATH}\r\n".encode())
-    time.sleep(0.5)
-    verify_out = ser.read(ser.in_waiting or 4096).decode("utf-8", errors="replace")
-    print(f"  {verify_out.strip()[:200]}")
-
-    print(f"[5/5] Restarting thermal sender in background...")
-    ser.write(f"nohup {THERMAL_SENDER_CMD} > /dev/null 2>&1 &\r\n".encode())
-    time.sleep(0.5)
+    if not args.no_restart:
+        print(f"[5/5] Restarting thermal sender in background...")
+        ser.write(f"nohup {THERMAL_SENDER_CMD} > /dev/null 2>&1 &\r\n".encode())
+        time.sleep(0.5)
 
     ser.close()
+    return failures
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Upload files to the Pi over the USB serial console")
+    parser.add_argument("files", nargs="*", help="Local files (default: serial-wifi-listener.py)")
+    parser.add_argument("--sync", metavar="DIR", help="Delta-sync the scripts in DIR (only changed blocks are sent)")
+    parser.add_argument("--pattern", default="*.py", help="Files in the --sync directory to consider (default: *.py)")
+    parser.add_argument("--to", default=REMOTE_DIR, help=f"Remote directory (default: {REMOTE_DIR})")
+    parser.add_argument("--port", nargs="+", default=[PORT], help="Serial port(s); several = one Pi after another")
+    parser.add_argument("--baud", type=int, default=BAUD)
+    parser.add_argument("--window", type=int, default=DEFAULT_WINDOW, help="Chunks in flight before waiting for an ACK")
+    parser.add_argument("--chunk", type=int, default=DEFAULT_CHUNK, help="Chunk size in bytes")
+    parser.add_argument("--no-restart", action="store_true", help="Do not restart the thermal sender afterwards")
+    args = parser.parse_args()
+
+    if args.sync and args.files:
+        parser.error("pass either files or --sync DIR, not both")
+    if args.sync:
+        files = sorted(p for p in glob.glob(os.path.join(args.sync, args.pattern)) if os.path.isfile(p))
+        if not files:
+            parser.error(f"no {args.pattern} files in {args.sync}")
+    else:
+        files = args.files or [LOCAL_FILE, CODEC_FILE]
+    for path in files:
+        if not os.path.isfile(path):
+            print(f"File not found: {path}")
+            sys.exit(1)
+    if not 0 < args.chunk <= receiver.MAX_PAYLOAD:
+        parser.error(f"--chunk must be between 1 and {receiver.MAX_PAYLOAD}")
+
+    print(f"Target: {args.to} on Pi via {', '.join(args.port)}")
+    for path in files:
+        print(f"  {path} ({os.path.getsize(path)} bytes)")
+
+    failed_ports = []
+    for port in args.port:
+        print()
+        if len(args.port) > 1:
+            print(f"=== {port} ===")
+        started = time.time()
+        failures = run_session(port, args, files)
+        if failures:
+            failed_ports.append(port)
+        elif len(args.port) > 1:
+            print(f"  {port} done in {time.time() - started:.1f}s")
+
     print()
-    print("Done! The file should now be on the Pi.")
-    print(f"To start the WiFi listener, SSH in or run on Pi:")
-    print(f"  sudo python3 {REMOTE_PATH} &")
+    if failed_ports:
+        print(f"Failed on {', '.join(failed_ports)}. Re-run the same command to resume.")
+        sys.exit(1)
+    print("Done! The files are on the Pi.")
+    if any(os.path.basename(p) == "serial-wifi-listener.py" for p in files) and not args.sync:
+        print(f"To start the WiFi listener, SSH in or run on Pi:")
+        print(f"  sudo python3 {args.to.rstrip('/')}/serial-wifi-listener.py &")
 
 
 if __name__ == "__main__":
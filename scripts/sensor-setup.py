@@ -8,80 +8,58 @@ Local CLI utility for configuring and connecting the AMG8833 thermal sensor
 Features:
   1. Scan and list serial ports, identifying likely devices
   2. Send WiFi credentials to Pi or ESP32 over USB serial
-  3. Test serial data from a connected device
-  4. Launch bridge processes to forward sensor data to CCA
+  3. Test serial data from a connected device (throughput, jitter and integrity diagnostics)
+  4. Run the sensor bridges (one supervised process) to forward data to CCA
+  5. Find Pi thermal/config servers on the LAN (UDP broadcast + concurrent TCP scan)
 
 Requirements:
-  pip install pyserial
+  pip install pyserial requests
 
 Usage:
   python scripts/sensor-setup.py              # interactive menu
   python scripts/sensor-setup.py --scan       # list ports and exit
+  python scripts/sensor-setup.py --test COM3 --duration 30 --export diag.csv
   python scripts/sensor-setup.py --wifi       # WiFi provisioning mode
-  python scripts/sensor-setup.py --bridges    # launch bridge processes
+  python scripts/sensor-setup.py --bridges    # run bridges under bridges/bridge-supervisor.py
+  python scripts/sensor-setup.py --discover   # find sensor servers on the local /24 (or --discover 10.0.5.0/24)
 """
 
 import argparse
+import asyncio
+import importlib.util
+import ipaddress
 import json
 import os
-import subprocess
+import socket
 import sys
 import time
 
 try:
     import serial
-    import serial.tools.list_ports
 except ImportError:
     print("pyserial is required. Install with: pip install pyserial")
     sys.exit(1)
 
 PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+BRIDGES_DIR = os.path.join(PROJECT_ROOT, "bridges")
+if BRIDGES_DIR not in sys.path:
+    sys.path.insert(0, BRIDGES_DIR)
+
+import serial_discovery as discovery  # noqa: E402  (lives in bridges/, shared with the EMG bridge)
 
-PI_USB_VID_PID = ("0525", "A4A7")  # Linux USB Gadget serial
-ESP32_KEYWORDS = ["cp210", "ch340", "ftdi", "silicon", "esp", "wch"]
 BAUD_RATES = [115200, 9600, 57600]
 DEFAULT_BAUD = 115200
+JOB_TIMEOUT = 40  # a Pi wifi_config job runs nmcli with a 30s timeout
+
+LAN_PORTS = {8091: "thermal-http", 8092: "thermal-ws", 8093: "pi-config"}
+DISCOVERY_PORT = int(os.environ.get("CCA_DISCOVERY_PORT", "8099"))
+LAN_CACHE_PATH = os.path.expanduser(os.environ.get("LAN_DISCOVERY_CACHE", "~/.cca-lan-devices.json"))
+CONNECT_TIMEOUT = 0.6
 
 
 def scan_ports():
     """Return list of serial port info dicts."""
-    ports = serial.tools.list_ports.comports()
-    results = []
-    for p in sorted(ports, key=lambda x: x.device):
-        device_type = identify_device(p)
-        results.append({
-            "port": p.device,
-            "description": p.description or "",
-            "manufacturer": p.manufacturer or "",
-            "vid": f"{p.vid:04X}" if p.vid else "",
-            "pid": f"{p.pid:04X}" if p.pid else "",
-            "serial_number": p.serial_number or "",
-            "device_type": device_type,
-        })
-    return results
-
-
-def identify_device(port_info):
-    """Guess what device is on this port."""
-    vid = f"{port_info.vid:04X}" if port_info.vid else ""
-    pid = f"{port_info.pid:04X}" if port_info.pid else ""
-    desc = (port_info.description or "").lower()
-    mfg = (port_info.manufacturer or "").lower()
-
-    if vid == PI_USB_VID_PID[0] and pid == PI_USB_VID_PID[1]:
-        return "Raspberry Pi (USB gadget serial)"
-
-    for kw in ESP32_KEYWORDS:
-        if kw in desc or kw in mfg:
-            return "ESP32 / MCU (USB-serial adapter)"
-
-    if "bluetooth" in desc or "bluetooth" in mfg:
-        return "Bluetooth serial"
-
-    if vid:
-        return "USB serial device"
-
-    return "Unknown"
+    return [discovery.describe_port(p) for p in discovery.list_ports()]
 
 
 def print_ports(ports):
@@ -134,6 +112,10 @@ def send_wifi_config_serial(port, ssid, password, baud=DEFAULT_BAUD, timeout=10)
                     resp = json.loads(line)
                     if resp.get("cmd") == "wifi_config":
                         if "ok" not in resp:
+                            if resp.get("job_id"):
+                                # Accepted as a background job; nmcli may take up to 30s
+                                print(f"  Device is connecting (job {resp['job_id']})...")
+                                deadline = max(deadline, time.time() + JOB_TIMEOUT)
                             continue
                         ser.close()
                         if resp.get("ok"):
@@ -149,92 +131,420 @@ def send_wifi_config_serial(port, ssid, password, baud=DEFAULT_BAUD, timeout=10)
         return False, f"Serial error: {e}"
 
 
-def test_serial_data(port, baud=DEFAULT_BAUD, duration=5):
-    """Read serial data from a port for a few seconds and print it."""
+SEQ_KEYS = ("seq", "sequence", "frame_id", "counter")
+
+
+def percentile(ordered, q):
+    if not ordered:
+        return None
+    return ordered[min(len(ordered) - 1, int(len(ordered) * q / 100))]
+
+
+def classify_line(line):
+    """(kind, seq, parse_ok, frames) for one received line.
+
+    frames is the number of sensor frames the line carries: 0 for non-frame
+    lines, the batch size for thermal_batch (whose seq is its first frame's).
+    """
+    if not line.startswith("{"):
+        return "text", None, True, 0
+    try:
+        obj = json.loads(line)
+    except json.JSONDecodeError:
+        return "corrupt", None, False, 0
+    if not isinstance(obj, dict):
+        return "other", None, True, 0
+    if obj.get("type") == "thermal_batch":
+        items = [f for f in obj.get("frames") or [] if isinstance(f, dict)]
+        first = items[0] if items else {}
+        seq = next((first[k] for k in SEQ_KEYS if isinstance(first.get(k), int)), None)
+        return "thermal", seq, True, len(items)
+    if "thermal_data" in obj or "pixels" in obj or obj.get("type") in ("thermal_packed", "thermal_delta"):
+        kind = "thermal"
+    elif obj.get("type") in ("emg_data", "calibration_data") or isinstance(obj.get("muscleActivity"), (int, float)):
+        kind = "emg"
+    elif "cmd" in obj:
+        kind = "command"
+    else:
+        kind = obj.get("type") or "other"
+    seq = next((obj[k] for k in SEQ_KEYS if isinstance(obj.get(k), int)), None)
+    return kind, seq, True, 1 if kind in ("thermal", "emg") else 0
+
+
+def summarize_link(records, duration, baud, usb_cdc=False):
+    """Throughput / jitter / integrity numbers from per-line records."""
+    frames = [r for r in records if r["kind"] in ("thermal", "emg")]
+    total_bytes = sum(r["bytes"] for r in records)
+    json_lines = [r for r in records if r["kind"] != "text"]
+    intervals = sorted(r["gap_ms"] for r in frames if r["gap_ms"] is not None)
+    sizes = sorted(r["bytes"] for r in frames)
+
+    # A batched line carries consecutive seqs starting at its own
+    seqs = [(r["seq"], r["frames"]) for r in frames if r["seq"] is not None]
+    missing = reordered = 0
+    for (prev, count), (cur, _) in zip(seqs, seqs[1:]):
+        expected = prev + max(count, 1)
+        if cur > expected:
+            missing += cur - expected
+        elif cur <= prev:
+            reordered += 1
+    frame_count = sum(r["frames"] for r in frames)
+
+    median = percentile(intervals, 50)
+    summary = {
+        "duration_s": round(duration, 2),
+        "baud": baud,
+        "usb_cdc": usb_cdc,
+        "lines": len(records),
+        "frames": frame_count,
+        "frame_kinds": {k: sum(r["frames"] for r in frames if r["kind"] == k) for k in sorted({r["kind"] for r in frames})},
+        "fps": round(frame_count / duration, 2) if duration else 0.0,
+        "bytes": total_bytes,
+        "bytes_per_s": round(total_bytes / duration, 1) if duration else 0.0,
+        # 8N1 framing: 10 bits on the wire per byte
+        "link_utilization": round(total_bytes * 10 / duration / baud, 4) if duration and baud else None,
+        "interarrival_ms": {
+            "p50": median,
+            "p90": percentile(intervals, 90),
+            "p99": percentile(intervals, 99),
+            "max": intervals[-1] if intervals else None,
+            "jitter_p99_minus_p50": round(percentile(intervals, 99) - median, 2) if intervals else None,
+        },
+        "parse_errors": sum(1 for r in records if not r["parse_ok"]),
+        "parse_error_rate": round(sum(1 for r in json_lines if not r["parse_ok"]) / len(json_lines), 4) if json_lines else 0.0,
+        "sequence": {"frames_with_seq": sum(max(count, 1) for _, count in seqs), "missing": missing, "out_of_order": reordered} if seqs else None,
+        "frame_bytes": {"min": sizes[0], "p50": percentile(sizes, 50), "p95": percentile(sizes, 95), "max": sizes[-1]} if sizes else None,
+    }
+    return summary
+
+
+def link_verdict(summary):
+    """Plain-language reading of the numbers for whoever is at the bedside."""
+    notes = []
+    util = summary["link_utilization"]
+    if not summary["lines"]:
+        return ["No data received. Check baud rate and that the sender is running on the device."]
+    if not summary["frames"]:
+        notes.append("Data is arriving but no thermal/EMG frames were recognized. Check the data format.")
+    if summary["parse_error_rate"] > 0.01:
+        notes.append(f"{summary['parse_error_rate']:.1%} of JSON lines are corrupt: wrong baud rate, noise or dropped bytes.")
+    if util is not None and not summary["usb_cdc"]:
+        if util > 0.85:
+            notes.append(f"Link is saturated ({util:.0%} of {summary['baud']} baud): lower the frame rate or use a more compact payload.")
+        elif summary["frames"] and util < 0.5:
+            notes.append(f"Link has headroom ({util:.0%} used): the frame rate is set by the sensor/sender, not the link.")
+    ia = summary["interarrival_ms"]
+    if ia["p50"] and ia["p99"] and ia["p99"] > 3 * ia["p50"]:
+        notes.append(f"Bursty delivery (p99 {ia['p99']:.0f} ms vs p50 {ia['p50']:.0f} ms): typical of Bluetooth/USB buffering or a busy sender.")
+    seq = summary["sequence"]
+    if seq and seq["missing"]:
+        notes.append(f"{seq['missing']} frame(s) missing by sequence number: frames are being dropped.")
+    if not notes:
+        notes.append("Link looks healthy.")
+    return notes
+
+
+def export_diagnostics(path, summary, records):
+    if path.lower().endswith(".csv"):
+        import csv
+
+        with open(path, "w", newline="") as f:
+            writer = csv.DictWriter(f, fieldnames=["t_ms", "gap_ms", "bytes", "kind", "frames", "seq", "parse_ok"])
+            writer.writeheader()
+            writer.writerows(records)
+        with open(os.path.splitext(path)[0] + ".summary.json", "w") as f:
+            json.dump(summary, f, indent=2)
+    else:
+        with open(path, "w") as f:
+            json.dump({"summary": summary, "lines": records}, f, indent=2)
+
+
+def test_serial_data(port, baud=DEFAULT_BAUD, duration=10, export=None):
+    """Read a port for duration seconds and report throughput, jitter and integrity diagnostics."""
     print(f"\n  Reading from {port} @ {baud} for {duration}s...\n")
+    records = []
     try:
-        ser = serial.Serial(port, baud, timeout=1)
-        start = time.time()
-        lines_read = 0
-        thermal_frames = 0
-        while time.time() - start < duration:
-            if ser.in_waiting:
-                line = ser.readline().decode("utf-8", errors="replace").strip()
+        ser = serial.Serial(port, baud, timeout=0.2)
+    except serial.SerialException as e:
+        print(f"  Error: {e}")
+        return None
+    usb_cdc = any(p.device == port and discovery.is_raspberry_pi(p) for p in discovery.list_ports())
+    try:
+        start = time.perf_counter()
+        last_frame_at = None
+        buf = b""
+        while time.perf_counter() - start < duration:
+            chunk = ser.read(ser.in_waiting or 1)
+            if not chunk:
+                continue
+            now = time.perf_counter()
+            buf += chunk
+            while b"\n" in buf:
+                raw, buf = buf.split(b"\n", 1)
+                line = raw.decode("utf-8", errors="replace").strip()
                 if not line:
                     continue
-                lines_read += 1
-                if lines_read <= 5:
+                kind, seq, parse_ok, count = classify_line(line)
+                gap = None
+                if kind in ("thermal", "emg"):
+                    gap = round((now - last_frame_at) * 1000, 2) if last_frame_at is not None else None
+                    last_frame_at = now
+                records.append({
+                    "t_ms": round((now - start) * 1000, 2),
+                    "gap_ms": gap,
+                    "bytes": len(raw) + 1,
+                    "kind": kind,
+                    "frames": count,
+                    "seq": seq,
+                    "parse_ok": parse_ok,
+                })
+                if len(records) <= 5:
                     preview = line[:120] + ("..." if len(line) > 120 else "")
-                    print(f"    [{lines_read}] {preview}")
-                try:
-                    obj = json.loads(line)
-                    if "thermal_data" in obj or "pixels" in obj:
-                        thermal_frames += 1
-                except json.JSONDecodeError:
-                    pass
-        ser.close()
-        print(f"\n  Summary: {lines_read} lines, {thermal_frames} thermal frames in {duration}s")
-        if thermal_frames > 0:
-            print("  Thermal data is flowing!")
-        elif lines_read > 0:
-            print("  Data is arriving but no thermal frames detected. Check the data format.")
-        else:
-            print("  No data received. Check baud rate and that the sender is running on the device.")
+                    print(f"    [{len(records)}] {preview}")
+        elapsed = time.perf_counter() - start
     except serial.SerialException as e:
         print(f"  Error: {e}")
+        return None
+    finally:
+        ser.close()
 
+    summary = summarize_link(records, elapsed, baud, usb_cdc=usb_cdc)
+    ia = summary["interarrival_ms"]
+    print(f"\n  Lines: {summary['lines']}   frames: {summary['frames']} {summary['frame_kinds'] or ''}")
+    print(f"  Rate:  {summary['fps']:.1f} frames/s, {summary['bytes_per_s'] / 1024:.1f} KB/s", end="")
+    if summary["usb_cdc"]:
+        print("  (USB gadget serial: baud rate is nominal, no utilization figure)")
+    else:
+        print(f", {summary['link_utilization']:.0%} of {baud} baud")
+    if ia["p50"] is not None:
+        print(f"  Inter-arrival: p50 {ia['p50']:.1f} ms, p90 {ia['p90']:.1f}, p99 {ia['p99']:.1f}, max {ia['max']:.1f} (jitter {ia['jitter_p99_minus_p50']:.1f} ms)")
+    if summary["frame_bytes"]:
+        fb = summary["frame_bytes"]
+        print(f"  Frame size: min {fb['min']} B, p50 {fb['p50']}, p95 {fb['p95']}, max {fb['max']}")
+    print(f"  Parse errors: {summary['parse_errors']} ({summary['parse_error_rate']:.2%} of JSON lines)")
+    if summary["sequence"]:
+        sq = summary["sequence"]
+        print(f"  Sequence: {sq['missing']} missing, {sq['out_of_order']} out of order ({sq['frames_with_seq']} numbered frames)")
+    print()
+    for note in link_verdict(summary):
+        print(f"  {note}")
 
-def launch_bridges(thermal_port=None, emg_mode=None, emg_port=None):
-    """Launch the appropriate bridge processes.
-    
-    emg_mode: None (skip), "wifi" (emg-server.js), "usb" (usb-serial-emg-receiver.js)
-    """
-    procs = []
-    env = os.environ.copy()
-
-    if thermal_port:
-        env["SERIAL_PORT"] = thermal_port
-        env["THERMAL_INPUT_MODE"] = "usb_serial"
-        bridge = os.path.join(PROJECT_ROOT, "bridges", "usb-serial-thermal-receiver.js")
-        if os.path.isfile(bridge):
-            print(f"\n  Starting thermal USB bridge: node {bridge} (port={thermal_port})")
-            procs.append(subprocess.Popen(["node", bridge], env=env, cwd=PROJECT_ROOT))
-        else:
-            print(f"  Warning: {bridge} not found")
+    if export:
+        try:
+            export_diagnostics(export, summary, records)
+            print(f"\n  Exported to {export}")
+        except OSError as e:
+            print(f"\n  Export failed: {e}")
+    return summary
 
-    if emg_mode == "wifi":
-        emg_server = os.path.join(PROJECT_ROOT, "bridges", "emg-server.js")
-        if os.path.isfile(emg_server):
-            print(f"  Starting EMG WiFi server: node {emg_server}")
-            procs.append(subprocess.Popen(["node", emg_server], env=env, cwd=PROJECT_ROOT))
-        else:
-            print(f"  Warning: {emg_server} not found")
-    elif emg_mode == "usb":
-        emg_env = env.copy()
-        if emg_port:
-            emg_env["EMG_SERIAL_PORT"] = emg_port
-        emg_bridge = os.path.join(PROJECT_ROOT, "bridges", "usb-serial-emg-receiver.js")
-        if os.path.isfile(emg_bridge):
-            print(f"  Starting EMG USB bridge: node {emg_bridge}{' (port=' + emg_port + ')' if emg_port else ''}")
-            procs.append(subprocess.Popen(["node", emg_bridge], env=emg_env, cwd=PROJECT_ROOT))
-        else:
-            print(f"  Warning: {emg_bridge} not found")
 
-    if not procs:
+def local_subnet():
+    """The /24 of the interface holding the default route (nothing is actually sent)."""
+    s = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    try:
+        s.connect(("8.8.8.8", 80))
+        ip = s.getsockname()[0]
+    except OSError:
+        return None
+    finally:
+        s.close()
+    return ipaddress.ip_network(f"{ip}/24", strict=False)
+
+
+def connect_limit():
+    """How many TCP connects to keep in flight without running out of file descriptors."""
+    try:
+        import resource
+    except ImportError:
+        return 1024  # Windows: the proactor event loop has no select() descriptor limit
+    soft, _ = resource.getrlimit(resource.RLIMIT_NOFILE)
+    return max(32, min(1024, soft - 64))
+
+
+async def probe_tcp(host, port, limit):
+    """(host, port, connect ms) if host accepts a connection on port, else None."""
+    async with limit:
+        started = time.perf_counter()
+        try:
+            _, writer = await asyncio.wait_for(asyncio.open_connection(host, port), CONNECT_TIMEOUT)
+        except (OSError, asyncio.TimeoutError):
+            return None
+        latency = (time.perf_counter() - started) * 1000
+        writer.close()
+        try:
+            await writer.wait_closed()
+        except OSError:
+            pass
+        return host, port, latency
+
+
+class DiscoveryReplies(asyncio.DatagramProtocol):
+    def __init__(self):
+        self.replies = []
+
+    def datagram_received(self, data, addr):
+        try:
+            msg = json.loads(data)
+        except ValueError:
+            return
+        if isinstance(msg, dict) and msg.get("cmd") == "discover" and msg.get("service"):
+            if isinstance(msg.get("t0"), (int, float)):
+                msg["rtt_ms"] = round((time.time() - msg["t0"]) * 1000, 1)
+            self.replies.append((addr[0], msg))
+
+
+async def broadcast_probe(subnet, timeout):
+    """Broadcast a discover probe and collect the Pi servers' replies for timeout seconds."""
+    loop = asyncio.get_running_loop()
+    transport, protocol = await loop.create_datagram_endpoint(
+        DiscoveryReplies, local_addr=("0.0.0.0", 0), allow_broadcast=True
+    )
+    try:
+        probe = json.dumps({"cmd": "discover", "t0": time.time()}).encode("utf-8")
+        targets = {"255.255.255.255"} | ({str(subnet.broadcast_address)} if subnet else set())
+        for target in targets:
+            try:
+                transport.sendto(probe, (target, DISCOVERY_PORT))
+            except OSError:
+                pass
+        await asyncio.sleep(timeout)
+    finally:
+        transport.close()
+    return protocol.replies
+
+
+async def discover_lan(subnet, timeout=1.0):
+    """Scan subnet's hosts on LAN_PORTS concurrently while a broadcast probe runs; {ip: device}."""
+    limit = asyncio.Semaphore(connect_limit())
+    hosts = [str(h) for h in subnet.hosts()] if subnet else []
+    scans = [probe_tcp(h, port, limit) for h in hosts for port in LAN_PORTS]
+    replies, *results = await asyncio.gather(broadcast_probe(subnet, timeout), *scans)
+
+    devices = {}
+
+    def device(ip):
+        return devices.setdefault(ip, {"ip": ip, "open_ports": {}, "services": {}})
+
+    for result in results:
+        if result:
+            ip, port, latency = result
+            device(ip)["open_ports"][str(port)] = round(latency, 1)
+    for ip, msg in replies:
+        device(ip)["services"][msg["service"]] = {
+            k: msg[k] for k in ("host", "ports", "firmware", "wifi", "uptime_s", "rtt_ms") if msg.get(k) is not None
+        }
+    for dev in devices.values():
+        latencies = list(dev["open_ports"].values()) + [s["rtt_ms"] for s in dev["services"].values() if "rtt_ms" in s]
+        dev["latency_ms"] = min(latencies) if latencies else None
+    return devices
+
+
+def load_lan_cache():
+    if not LAN_CACHE_PATH:
+        return {}
+    try:
+        with open(LAN_CACHE_PATH) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def save_lan_cache(devices):
+    """Merge this scan into the cache (devices not seen now keep their last_seen)."""
+    if not LAN_CACHE_PATH:
+        return
+    cache = load_lan_cache()
+    now = time.time()
+    for ip, dev in devices.items():
+        cache[ip] = dict(dev, last_seen=now)
+    try:
+        tmp = LAN_CACHE_PATH + ".tmp"
+        with open(tmp, "w") as f:
+            json.dump(cache, f, indent=2)
+        os.replace(tmp, LAN_CACHE_PATH)
+    except OSError:
+        pass
+
+
+def describe_device(dev):
+    parts = []
+    for name, info in dev["services"].items():
+        detail = info.get("host") or ""
+        firmware = info.get("firmware") or {}
+        if firmware.get("sensor"):
+            detail += f", {firmware['sensor']}"
+        if firmware.get("update_interval"):
+            detail += f" @ {1 / firmware['update_interval']:.0f} fps"
+        if (info.get("wifi") or {}).get("ssid"):
+            detail += f", WiFi {info['wifi']['ssid']}"
+        parts.append(f"{name} ({detail.strip(', ')})" if detail else name)
+    ports = ", ".join(f"{p}/{LAN_PORTS.get(int(p), '?')}" for p in sorted(dev["open_ports"]))
+    if ports:
+        parts.append(f"open: {ports}")
+    return "; ".join(parts)
+
+
+def discover_flow(subnet=None):
+    """Find sensor servers on the LAN, print them and update the cache."""
+    subnet = ipaddress.ip_network(subnet, strict=False) if subnet else local_subnet()
+    if subnet and subnet.num_addresses > 4096:
+        print(f"  {subnet} is too large to scan; use a /20 or smaller.")
+        return {}
+    print(f"\n  Discovering sensor servers on {subnet or 'broadcast only'} (UDP {DISCOVERY_PORT} + TCP {', '.join(map(str, LAN_PORTS))})...")
+    started = time.perf_counter()
+    devices = asyncio.run(discover_lan(subnet))
+    elapsed = time.perf_counter() - started
+    cache = load_lan_cache()
+    save_lan_cache(devices)
+
+    if not devices:
+        print(f"  Nothing found in {elapsed:.1f}s. Is the Pi on the same network (and the thermal server running)?")
+    else:
+        print(f"  Found {len(devices)} device(s) in {elapsed:.1f}s:\n")
+        for ip in sorted(devices, key=ipaddress.ip_address):
+            dev = devices[ip]
+            latency = f"{dev['latency_ms']:.1f} ms" if dev["latency_ms"] is not None else "-"
+            print(f"    {ip:<16} {latency:>9}   {describe_device(dev)}")
+            if "thermal" in dev["services"] or "8091" in dev["open_ports"]:
+                print(f"    {'':<16} {'':>9}   → CCA thermal API: /api/thermal?ip={ip}")
+    missing = [ip for ip in cache if ip not in devices]
+    if missing:
+        print("\n  Seen before but not now:")
+        for ip in sorted(missing, key=ipaddress.ip_address):
+            age = (time.time() - cache[ip].get("last_seen", 0)) / 60
+            print(f"    {ip:<16} last seen {age:.0f} min ago   {describe_device(cache[ip])}")
+    print()
+    return devices
+
+
+def load_supervisor():
+    """Import bridges/bridge-supervisor.py (hyphenated, so not importable by name)."""
+    spec = importlib.util.spec_from_file_location("bridge_supervisor", os.path.join(BRIDGES_DIR, "bridge-supervisor.py"))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def launch_bridges(thermal_port=None, emg_mode=None, emg_port=None):
+    """Run the bridges under the Python bridge supervisor, in this process.
+
+    emg_mode: None (skip), "wifi" (emg-server.js as a supervised child), "usb" (ESP32 over USB serial)
+    """
+    if not thermal_port and not emg_mode:
         print("  No bridges started.")
         return
 
-    print(f"\n  {len(procs)} bridge(s) running. Press Ctrl+C to stop.\n")
+    supervisor = load_supervisor()
+    print(f"\n  Starting bridge supervisor (thermal={thermal_port or 'off'}, emg={emg_mode or 'off'})")
+    print(f"  Status: http://{supervisor.STATUS_HOST}:{supervisor.STATUS_PORT}/status — press Ctrl+C to stop.\n")
     try:
-        for p in procs:
-            p.wait()
+        asyncio.run(supervisor.supervise(
+            thermal_port=thermal_port,
+            emg_port=(emg_port or "auto") if emg_mode == "usb" else None,
+            emg_wifi=emg_mode == "wifi",
+        ))
     except KeyboardInterrupt:
-        print("\n  Stopping bridges...")
-        for p in procs:
-            p.terminate()
-        for p in procs:
-            p.wait(timeout=5)
-        print("  Done.")
+        print("\n  Bridges stopped.")
 
 
 def wifi_flow(ports):
@@ -296,9 +606,10 @@ def interactive_menu():
         print("    1. Rescan ports")
         print("    2. Send WiFi credentials to device")
         print("    3. Test serial data from a port")
-        print("    4. Launch bridge processes")
-        print("    5. Quit")
-        choice = input("\n  Choose [1-5]: ").strip()
+        print("    4. Run sensor bridges")
+        print("    5. Find sensors on the LAN")
+        print("    6. Quit")
+        choice = input("\n  Choose [1-6]: ").strip()
 
         if choice == "1":
             ports = scan_ports()
@@ -317,7 +628,8 @@ def interactive_menu():
                 continue
             baud_str = input(f"  Baud rate [{DEFAULT_BAUD}]: ").strip()
             baud = int(baud_str) if baud_str.isdigit() else DEFAULT_BAUD
-            test_serial_data(port, baud)
+            export = input("  Export to .csv/.json file [none]: ").strip() or None
+            test_serial_data(port, baud, export=export)
 
         elif choice == "4":
             use_thermal = pi_port or ""
@@ -338,6 +650,9 @@ def interactive_menu():
             )
 
         elif choice == "5":
+            discover_flow()
+
+        elif choice == "6":
             print("\n  Goodbye!\n")
             break
         else:
@@ -348,9 +663,13 @@ def main():
     parser = argparse.ArgumentParser(description="CCA Sensor Setup Tool")
     parser.add_argument("--scan", action="store_true", help="Scan and list serial ports")
     parser.add_argument("--wifi", action="store_true", help="WiFi provisioning mode")
-    parser.add_argument("--bridges", action="store_true", help="Launch bridge processes")
+    parser.add_argument("--bridges", action="store_true", help="Run sensor bridges (supervised, one process)")
     parser.add_argument("--test", metavar="PORT", help="Test serial data from PORT")
+    parser.add_argument("--discover", metavar="SUBNET", nargs="?", const="", default=None,
+                        help="Find Pi sensor servers on the LAN (default: this machine's /24)")
     parser.add_argument("--baud", type=int, default=DEFAULT_BAUD, help="Baud rate (default: 115200)")
+    parser.add_argument("--duration", type=float, default=10, help="Seconds to sample with --test (default: 10)")
+    parser.add_argument("--export", metavar="FILE", help="With --test: write per-line records to FILE (.csv or .json)")
     args = parser.parse_args()
 
     if args.scan:
@@ -365,7 +684,11 @@ def main():
         return
 
     if args.test:
-        test_serial_data(args.test, args.baud)
+        test_serial_data(args.test, args.baud, duration=args.duration, export=args.export)
+        return
+
+    if args.discover is not None:
+        discover_flow(args.discover or None)
         return
 
     if args.bridges:
@@ -7,20 +7,46 @@ WiFi and Bluetooth. Must be run with sudo for config changes.
   sudo python3 pi-config-server.py
 
 Listens on 0.0.0.0:8093. Endpoints:
-  POST /configure-wifi   { "ssid": "...", "password": "..." }
-  POST /configure-bluetooth  { "discoverable": true }
-  GET  /status   { "wifi": {...}, "bluetooth": {...} }
+  POST /configure-wifi   { "ssid": "...", "password": "..." }       → 202 { "job_id": ... }
+  POST /configure-bluetooth  { "discoverable": true }              → 202 { "job_id": ... }
+  GET  /jobs/<id>[?wait=10]   { "state": "running" | "done" | "failed", "success", "message" }
+  GET  /status   { "wifi": {...}, "bluetooth": {...}, "age_s": ... }
+
+Configure calls run as jobs on a worker pool (one at a time per kind, so two
+nmcli connects never race) and return a job ID immediately; poll /jobs/<id>,
+or pass ?wait=N (max 30) to long-poll until it finishes. POST ?wait=N does the
+same inline for callers that want the old blocking behaviour. Finished jobs
+are kept for PI_CONFIG_JOB_TTL seconds (default 300).
+
+Also answers LAN discovery probes ({"cmd": "discover"} on UDP CCA_DISCOVERY_PORT,
+default 8099, shared with the thermal server) with its port and WiFi status.
+
+/status answers from memory: a background thread re-reads WiFi/Bluetooth state
+(nmcli, bluetoothctl) every PI_CONFIG_STATUS_TTL seconds (default 5) and right
+after any configure call. Requests are served on threads, so polling stays
+instant while an `nmcli device wifi connect` is still running.
 """
 
 import json
 import logging
 import os
+import socket
 import subprocess
 import sys
-from http.server import BaseHTTPRequestHandler, HTTPServer
+import threading
+import time
+import uuid
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
 from urllib.parse import parse_qs, urlparse
 
 CONFIG_PORT = int(os.getenv("PI_CONFIG_PORT", "8093"))
+STATUS_TTL = float(os.getenv("PI_CONFIG_STATUS_TTL", "5"))
+JOB_TTL = float(os.getenv("PI_CONFIG_JOB_TTL", "300"))
+DISCOVERY_PORT = int(os.getenv("CCA_DISCOVERY_PORT", "8099"))
+JOB_WORKERS = 4
+MAX_WAIT = 30.0
 WPA_SUPPLICANT_CONF = "/etc/wpa_supplicant/wpa_supplicant.conf"
 WPA_SUPPLICANT_CONF_ALT = "/boot/firmware/wpa_supplicant.conf"
 
@@ -132,6 +158,144 @@ def configure_bluetooth(discoverable: bool = True, pairable: bool = True) -> tup
     return True, "Bluetooth settings updated."
 
 
+class StatusCache:
+    """WiFi/Bluetooth status refreshed in the background; readers never spawn processes."""
+
+    def __init__(self, ttl):
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._ready = threading.Event()
+        self._wake = threading.Event()
+        self._status = {"wifi": None, "bluetooth": None}
+        self._updated_at = 0.0
+
+    def start(self):
+        threading.Thread(target=self._refresh_loop, name="status-refresh", daemon=True).start()
+
+    def invalidate(self):
+        """Re-read status now (after a configure call changed it)."""
+        self._wake.set()
+
+    def get(self):
+        self._ready.wait(20)
+        with self._lock:
+            status = dict(self._status)
+            status["age_s"] = round(time.time() - self._updated_at, 2) if self._updated_at else None
+        return status
+
+    def _refresh_loop(self):
+        while True:
+            self._wake.clear()
+            wifi = get_wifi_status()
+            bluetooth = get_bluetooth_status()
+            with self._lock:
+                self._status = {"wifi": wifi, "bluetooth": bluetooth}
+                self._updated_at = time.time()
+            self._ready.set()
+            self._wake.wait(self.ttl)
+
+
+status_cache = StatusCache(STATUS_TTL)
+
+
+class JobStore:
+    """Configure calls run on a worker pool; results are kept for ttl seconds after finishing."""
+
+    def __init__(self, ttl, workers=JOB_WORKERS):
+        self.ttl = ttl
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="config-job")
+        self._kind_locks = defaultdict(threading.Lock)
+        self._cond = threading.Condition()
+        self._jobs = {}
+
+    def submit(self, kind, fn, *args, **kwargs):
+        job = {
+            "job_id": uuid.uuid4().hex[:12],
+            "kind": kind,
+            "state": "running",
+            "success": None,
+            "message": None,
+            "created_at": time.time(),
+            "finished_at": None,
+        }
+        with self._cond:
+            self._expire()
+            self._jobs[job["job_id"]] = job
+        self._pool.submit(self._run, job, fn, args, kwargs)
+        return dict(job)
+
+    def get(self, job_id, wait=0.0):
+        """Job snapshot (None if unknown/expired), waiting up to wait seconds for it to finish."""
+        deadline = time.monotonic() + min(max(wait, 0.0), MAX_WAIT)
+        with self._cond:
+            job = self._jobs.get(job_id)
+            while job and job["state"] == "running":
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                self._cond.wait(remaining)
+            return dict(job) if job else None
+
+    def _run(self, job, fn, args, kwargs):
+        with self._kind_locks[job["kind"]]:
+            try:
+                ok, msg = fn(*args, **kwargs)
+            except Exception as e:
+                logger.exception("%s job failed", job["kind"])
+                ok, msg = False, str(e)
+        status_cache.invalidate()
+        logger.info("Job %s (%s) finished: %s", job["job_id"], job["kind"], msg)
+        with self._cond:
+            job.update(state="done" if ok else "failed", success=ok, message=msg, finished_at=time.time())
+            self._cond.notify_all()
+
+    def _expire(self):
+        cutoff = time.time() - self.ttl
+        for job_id in [j for j, job in self._jobs.items() if job["finished_at"] and job["finished_at"] < cutoff]:
+            del self._jobs[job_id]
+
+
+jobs = JobStore(JOB_TTL)
+
+
+def answer_discovery():
+    """Reply to {"cmd": "discover", "t0": ...} UDP broadcasts (runs on its own thread)."""
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    try:
+        sock.bind(("0.0.0.0", DISCOVERY_PORT))
+    except OSError as e:
+        logger.warning("LAN discovery disabled (UDP %s: %s)", DISCOVERY_PORT, e)
+        return
+    started_at = time.time()
+    while True:
+        data, addr = sock.recvfrom(2048)
+        try:
+            msg = json.loads(data)
+        except ValueError:
+            continue
+        if not isinstance(msg, dict) or msg.get("cmd") != "discover":
+            continue
+        reply = {
+            "cmd": "discover",
+            "t0": msg.get("t0"),
+            "service": "config",
+            "host": socket.gethostname(),
+            "ports": {"http": CONFIG_PORT},
+            "firmware": {"script": os.path.basename(__file__)},
+            "wifi": status_cache.get()["wifi"],
+            "uptime_s": round(time.time() - started_at),
+        }
+        sock.sendto(json.dumps(reply).encode("utf-8"), addr)
+
+
+def wait_param(url):
+    try:
+        return float(parse_qs(url.query).get("wait", ["0"])[0])
+    except ValueError:
+        return 0.0
+
+
 class ConfigHandler(BaseHTTPRequestHandler):
     def _cors_headers(self):
         self.send_header("Access-Control-Allow-Origin", "*")
@@ -144,21 +308,28 @@ class ConfigHandler(BaseHTTPRequestHandler):
         self.end_headers()
 
     def do_GET(self):
-        if urlparse(self.path).path == "/status":
-            wifi = get_wifi_status()
-            bluetooth = get_bluetooth_status()
-            body = json.dumps({"wifi": wifi, "bluetooth": bluetooth}).encode("utf-8")
+        url = urlparse(self.path)
+        if url.path == "/status":
+            body = json.dumps(status_cache.get()).encode("utf-8")
             self.send_response(200)
             self.send_header("Content-Type", "application/json")
             self._cors_headers()
             self.end_headers()
             self.wfile.write(body)
             return
+        if url.path.startswith("/jobs/"):
+            job = jobs.get(url.path[len("/jobs/"):], wait=wait_param(url))
+            if job is None:
+                self._send_json(404, {"error": "Unknown or expired job"})
+            else:
+                self._send_json(200, job)
+            return
         self.send_response(404)
         self.end_headers()
 
     def do_POST(self):
-        path = urlparse(self.path).path
+        url = urlparse(self.path)
+        path = url.path
         content_length = int(self.headers.get("Content-Length", 0))
         body = self.rfile.read(content_length)
         try:
@@ -170,18 +341,27 @@ class ConfigHandler(BaseHTTPRequestHandler):
         if path == "/configure-wifi":
             ssid = data.get("ssid", "")
             password = data.get("password", "")
-            ok, msg = configure_wifi(ssid, password)
-            self._send_json(200 if ok else 400, {"success": ok, "message": msg})
+            self._send_job(jobs.submit("wifi", configure_wifi, ssid, password), wait_param(url))
             return
         if path == "/configure-bluetooth":
             discoverable = data.get("discoverable", True)
             pairable = data.get("pairable", True)
-            ok, msg = configure_bluetooth(discoverable=discoverable, pairable=pairable)
-            self._send_json(200 if ok else 400, {"success": ok, "message": msg})
+            job = jobs.submit("bluetooth", configure_bluetooth, discoverable=discoverable, pairable=pairable)
+            self._send_job(job, wait_param(url))
             return
         self.send_response(404)
         self.end_headers()
 
+    def _send_job(self, job, wait):
+        """202 + job ID, or the finished job (200/400) if it completes within wait seconds."""
+        if wait > 0:
+            job = jobs.get(job["job_id"], wait=wait)
+        if job["state"] == "running":
+            job["status_url"] = f"/jobs/{job['job_id']}"
+            self._send_json(202, job)
+        else:
+            self._send_json(200 if job["success"] else 400, job)
+
     def _send_json(self, status, obj):
         body = json.dumps(obj).encode("utf-8")
         self.send_response(status)
@@ -197,7 +377,10 @@ class ConfigHandler(BaseHTTPRequestHandler):
 def main():
     if os.geteuid() != 0:
         logger.warning("Not running as root. WiFi/Bluetooth config may fail. Run with: sudo python3 %s", sys.argv[0])
-    server = HTTPServer(("0.0.0.0", CONFIG_PORT), ConfigHandler)
+    status_cache.start()
+    threading.Thread(target=answer_discovery, name="discovery", daemon=True).start()
+    server = ThreadingHTTPServer(("0.0.0.0", CONFIG_PORT), ConfigHandler)
+    server.daemon_threads = True
     logger.info("Pi config server listening on 0.0.0.0:%s (WiFi & Bluetooth)", CONFIG_PORT)
     try:
         server.serve_forever()
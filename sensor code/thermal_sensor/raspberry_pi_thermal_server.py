@@ -5,15 +5,25 @@ AMG8833 Thermal Sensor Server
 - Streams raw 8x8 frames from the AMG8833 over HTTP and WebSocket.
 - Leaves all filtering, calibration, and visualization to the client.
 - Exits with an error if the sensor is unavailable.
+- Answers LAN discovery probes ({"cmd": "discover"} on UDP CCA_DISCOVERY_PORT,
+  default 8099) with its ports and sensor info, for scripts/sensor-setup.py --discover.
+- WebSocket clients may send {"cmd": "configure", "fps": 5, "encoding": "delta",
+  "batch": 4, "smoothing": 0.3} (any subset) to change their own stream from the
+  next frame on; the reply carries the effective settings. Encodings and
+  defaults are in thermal_codec.py; clients that never ask keep getting JSON.
 """
 
 import asyncio
 import json
 import logging
 import os
+import socket
+import time
 from datetime import datetime
 from http.server import BaseHTTPRequestHandler, HTTPServer
 
+from thermal_codec import LIMITS, FrameEncoder
+
 try:
     import websockets
     from websockets.server import serve
@@ -36,6 +46,8 @@ except ImportError as exc:
 # Server configuration
 HTTP_PORT = 8091
 WEBSOCKET_PORT = 8092
+DISCOVERY_PORT = int(os.getenv("CCA_DISCOVERY_PORT", "8099"))
+STARTED_AT = time.time()
 
 # Sensor configuration
 GRID_WIDTH = 8
@@ -140,18 +152,97 @@ class ThermalDataHandler(BaseHTTPRequestHandler):
         logger.debug("HTTP: " + format % args)
 
 
+async def answer_commands(websocket, encoder):
+    """Reply to {"cmd": "ping", "t0": ...} with t1/t2 (Pi clock) so clients can estimate clock offset,
+    and apply {"cmd": "configure", ...} to this connection's encoder."""
+    try:
+        async for message in websocket:
+            received_at = time.time()
+            try:
+                msg = json.loads(message)
+            except (TypeError, ValueError):
+                continue
+            if not isinstance(msg, dict):
+                continue
+            if msg.get("cmd") == "ping":
+                reply = {"cmd": "ping", "ok": True, "t0": msg.get("t0"), "t1": received_at}
+                reply["t2"] = time.time()
+                await websocket.send(json.dumps(reply))
+            elif msg.get("cmd") == "configure":
+                try:
+                    pending = encoder.configure(msg)
+                except ValueError as exc:
+                    await websocket.send(json.dumps({"cmd": "configure", "ok": False, "msg": str(exc)}))
+                    continue
+                for frame in pending:
+                    await websocket.send(json.dumps(frame))
+                await websocket.send(json.dumps({"cmd": "configure", "ok": True, "config": encoder.config}))
+                logger.info(f"WebSocket client {websocket.remote_address} settings: {encoder.config}")
+    except websockets.exceptions.ConnectionClosed:
+        pass
+
+
+class DiscoveryResponder(asyncio.DatagramProtocol):
+    """Answers {"cmd": "discover", "t0": ...} broadcasts with where and what this server is."""
+
+    def connection_made(self, transport):
+        self.transport = transport
+
+    def datagram_received(self, data, addr):
+        try:
+            msg = json.loads(data)
+        except (TypeError, ValueError):
+            return
+        if not isinstance(msg, dict) or msg.get("cmd") != "discover":
+            return
+        reply = {
+            "cmd": "discover",
+            "t0": msg.get("t0"),
+            "service": "thermal",
+            "host": socket.gethostname(),
+            "ports": {"http": HTTP_PORT, "websocket": WEBSOCKET_PORT},
+            "firmware": {
+                "script": os.path.basename(__file__),
+                "sensor": "AMG8833",
+                "update_interval": UPDATE_INTERVAL,
+            },
+            "uptime_s": round(time.time() - STARTED_AT),
+        }
+        self.transport.sendto(json.dumps(reply).encode("utf-8"), addr)
+
+
+async def start_discovery_responder(loop):
+    # SO_REUSEADDR lets pi-config-server.py listen on the same port; both get each broadcast
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    try:
+        sock.bind(("0.0.0.0", DISCOVERY_PORT))
+    except OSError as exc:
+        logger.warning(f"LAN discovery disabled (UDP {DISCOVERY_PORT}: {exc})")
+        sock.close()
+        return
+    await loop.create_datagram_endpoint(DiscoveryResponder, sock=sock)
+    logger.info(f"Answering LAN discovery on UDP {DISCOVERY_PORT}")
+
+
 async def websocket_handler(websocket):
     peer = websocket.remote_address
     logger.info(f"WebSocket client connected: {peer}")
+    # the codec accepts 0.1-50 fps; intervals beyond that stream at its nearest limit
+    low, high = LIMITS["fps"]
+    encoder = FrameEncoder(build_payload, {"fps": min(max(1.0 / UPDATE_INTERVAL, low), high)})
+    commands = asyncio.create_task(answer_commands(websocket, encoder))
     try:
         while True:
-            payload = build_payload(get_frame())
-            await websocket.send(json.dumps(payload))
-            await asyncio.sleep(UPDATE_INTERVAL)
+            for message in encoder.encode(get_frame()):
+                await websocket.send(json.dumps(message))
+            await asyncio.sleep(encoder.interval)
     except websockets.exceptions.ConnectionClosed:
         logger.info(f"WebSocket client disconnected: {peer}")
     except Exception as exc:  # pragma: no cover
         logger.error(f"WebSocket error: {exc}")
+    finally:
+        commands.cancel()
 
 
 async def main():
@@ -165,6 +256,7 @@ async def main():
     http_task = loop.run_in_executor(None, start_http)
     ws_server = await serve(websocket_handler, "0.0.0.0", WEBSOCKET_PORT)
     logger.info(f"WebSocket server listening on 0.0.0.0:{WEBSOCKET_PORT}")
+    await start_discovery_responder(loop)
 
     await asyncio.gather(http_task, ws_server.wait_closed())
 
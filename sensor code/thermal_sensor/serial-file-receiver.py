@@ -0,0 +1,362 @@
+#!/usr/bin/env python3
+"""
+Serial file receiver — the Pi side of scripts/send-file-to-pi.py.
+
+send-file-to-pi.py starts this from the serial console shell. It switches the
+tty to raw mode and speaks a small framed binary protocol on stdin/stdout until
+the PC says BYE (or nothing arrives for IDLE_TIMEOUT seconds), then restores
+the tty and exits back to the shell.
+
+  frame = A5 5A | type (u8) | seq (u32) | length (u16) | payload | crc32 (u32)
+
+  Pi → PC   READY  {"version": 1}
+  PC → Pi   HELLO  {"path", "size", "sha256", "compressed", "chunk", "mode"}
+  Pi → PC   OFFER  {"next": <first chunk still missing>}   (resume support)
+  PC → Pi   DATA   seq = chunk index, payload = chunk of the (zlib) stream
+  Pi → PC   ACK    seq = next chunk expected (cumulative); NAK once per gap
+  PC → Pi   END    → DONE {"ok", "msg"} after the SHA-256 check and atomic rename
+  PC → Pi   BYE
+
+Partial uploads are kept in <path>.part next to a <path>.part.json sidecar
+naming the file's SHA-256, so re-running the sender after a disconnect picks up
+at the first missing chunk.
+
+Delta sync (send-file-to-pi.py --sync) adds:
+
+  PC → Pi   SIGNATURES {"path", "block"} → {"size", "sha256", "block", "blocks": [[weak, strong], ...]}
+  PC → Pi   HELLO with "delta": {"block", "base_sha256"} — the stream is a copy/literal
+            script against the current file (see apply_delta) — and "stage": true,
+            which leaves the verified result in <path>.staged
+  PC → Pi   COMMIT {"paths": [...]} → DONE {"ok", "replaced", "restarted", "errors"}
+
+COMMIT only starts once every file has been received and verified; it renames
+each staged file into place and restarts the systemd units whose ExecStart runs
+one of them (via sudo -n, only if the unit is active).
+
+This file is self-contained (stdlib only) because it is itself uploaded to the
+Pi; send-file-to-pi.py imports it for the frame codec so both ends agree.
+"""
+
+import glob
+import hashlib
+import json
+import os
+import select
+import struct
+import subprocess
+import sys
+import zlib
+
+VERSION = 1
+MAGIC = b"\xa5\x5a"
+HEADER = struct.Struct(">BIH")  # type, seq, payload length
+CRC = struct.Struct(">I")
+MAX_PAYLOAD = 16384
+IDLE_TIMEOUT = 30.0
+MAX_SIGNATURE_BLOCKS = 400  # keeps a SIGNATURES reply within one frame
+SYSTEMD_DIR = "/etc/systemd/system"
+
+READY, HELLO, OFFER, DATA, ACK, NAK, END, DONE, BYE, ERROR, SIGNATURES, COMMIT = range(1, 13)
+
+
+def encode_frame(kind, seq=0, payload=b""):
+    body = HEADER.pack(kind, seq, len(payload)) + payload
+    return MAGIC + body + CRC.pack(zlib.crc32(body))
+
+
+def encode_json(kind, obj, seq=0):
+    return encode_frame(kind, seq, json.dumps(obj).encode("utf-8"))
+
+
+def weak_checksum(block):
+    """rsync's rolling checksum (a | b << 16) of one block."""
+    a = b = 0
+    n = len(block)
+    for i, x in enumerate(block):
+        a += x
+        b += (n - i) * x
+    return (a & 0xFFFF) | ((b & 0xFFFF) << 16)
+
+
+def strong_checksum(block):
+    return hashlib.sha256(block).hexdigest()[:16]
+
+
+def signatures(path, block):
+    """Per-block checksums of path for the PC to diff against ({"size": None} if missing)."""
+    try:
+        with open(os.path.expanduser(path), "rb") as f:
+            data = f.read()
+    except OSError:
+        return {"size": None}
+    block = max(block, -(-len(data) // MAX_SIGNATURE_BLOCKS))
+    blocks = [data[i : i + block] for i in range(0, len(data), block)]
+    return {
+        "size": len(data),
+        "sha256": hashlib.sha256(data).hexdigest(),
+        "block": block,
+        "blocks": [[weak_checksum(b), strong_checksum(b)] for b in blocks],
+    }
+
+
+def apply_delta(base, delta, block):
+    """Rebuild a file from base and a script of b"C" start count (copy blocks) / b"D" length data ops."""
+    out = bytearray()
+    pos = 0
+    while pos < len(delta):
+        op = delta[pos : pos + 1]
+        if op == b"C":
+            start, count = struct.unpack_from(">II", delta, pos + 1)
+            out += base[start * block : (start + count) * block]
+            pos += 9
+        elif op == b"D":
+            (length,) = struct.unpack_from(">I", delta, pos + 1)
+            out += delta[pos + 5 : pos + 5 + length]
+            pos += 5 + length
+        else:
+            raise ValueError(f"bad delta op {op!r} at {pos}")
+    return bytes(out)
+
+
+def units_running(paths):
+    """systemd units whose ExecStart runs one of paths."""
+    wanted = {os.path.abspath(os.path.expanduser(p)) for p in paths}
+    units = []
+    for unit in sorted(glob.glob(os.path.join(SYSTEMD_DIR, "*.service"))):
+        try:
+            with open(unit) as f:
+                lines = [line.strip() for line in f if line.strip().startswith("ExecStart=")]
+        except OSError:
+            continue
+        commands = " ".join(lines).replace("\\x20", " ")
+        if any(p in commands for p in wanted):
+            units.append(os.path.basename(unit))
+    return units
+
+
+def restart_units(units):
+    restarted, errors = [], []
+    for unit in units:
+        try:
+            if subprocess.run(["systemctl", "is-active", "--quiet", unit]).returncode != 0:
+                continue
+            r = subprocess.run(["sudo", "-n", "systemctl", "restart", unit], capture_output=True, text=True)
+        except OSError as e:
+            errors.append(f"{unit}: {e}")
+            continue
+        if r.returncode == 0:
+            restarted.append(unit)
+        else:
+            errors.append(f"{unit}: {(r.stderr or r.stdout).strip() or r.returncode}")
+    return restarted, errors
+
+
+def commit(staged, paths):
+    """Move verified staged files into place, then restart the units that run them."""
+    replaced, errors = [], []
+    for path in paths:
+        path = os.path.expanduser(path)
+        if path not in staged:
+            errors.append(f"{path}: not staged")
+            continue
+        os.replace(staged.pop(path), path)
+        replaced.append(path)
+    restarted, restart_errors = restart_units(units_running(replaced)) if replaced else ([], [])
+    errors += restart_errors
+    return {"ok": not errors, "replaced": replaced, "restarted": restarted, "errors": errors}
+
+
+class FrameReader:
+    """Incremental frame decoder; skips line noise (e.g. shell echo) and frames with a bad CRC."""
+
+    def __init__(self):
+        self.buf = bytearray()
+        self.corrupt = 0
+
+    def feed(self, data):
+        self.buf += data
+        frames = []
+        while True:
+            start = self.buf.find(MAGIC)
+            if start < 0:
+                del self.buf[:-1]  # the last byte may be the first half of a magic
+                return frames
+            del self.buf[:start]
+            if len(self.buf) < len(MAGIC) + HEADER.size:
+                return frames
+            kind, seq, length = HEADER.unpack_from(self.buf, len(MAGIC))
+            if length > MAX_PAYLOAD:
+                self.corrupt += 1
+                del self.buf[: len(MAGIC)]
+                continue
+            end = len(MAGIC) + HEADER.size + length + CRC.size
+            if len(self.buf) < end:
+                return frames
+            body = bytes(self.buf[len(MAGIC) : end - CRC.size])
+            if CRC.unpack_from(self.buf, end - CRC.size)[0] != zlib.crc32(body):
+                self.corrupt += 1
+                del self.buf[: len(MAGIC)]
+                continue
+            frames.append((kind, seq, body[HEADER.size :]))
+            del self.buf[:end]
+
+
+class Upload:
+    """One file being received into <path>.part."""
+
+    def __init__(self, meta):
+        self.path = os.path.expanduser(meta["path"])
+        self.sha256 = meta["sha256"]
+        self.size = int(meta["size"])
+        self.chunk = int(meta["chunk"])
+        self.compressed = bool(meta.get("compressed"))
+        self.mode = meta.get("mode")
+        self.delta = meta.get("delta")
+        self.stage = bool(meta.get("stage"))
+        self.target = self.path + ".staged" if self.stage else self.path
+        self.part = self.path + ".part"
+        self.sidecar = self.part + ".json"
+        self.next = 0
+        self.nak_sent = False
+
+        resume = {"sha256": self.sha256, "chunk": self.chunk, "compressed": self.compressed, "delta": self.delta}
+        try:
+            with open(self.sidecar) as f:
+                if json.load(f) == resume and os.path.exists(self.part):
+                    self.next = os.path.getsize(self.part) // self.chunk
+        except (OSError, ValueError):
+            pass
+        if not self.next:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            with open(self.sidecar, "w") as f:
+                json.dump(resume, f)
+        self.f = open(self.part, "r+b" if self.next else "wb")
+        self.f.truncate(self.next * self.chunk)
+        self.f.seek(self.next * self.chunk)
+
+    def write(self, data):
+        self.f.write(data)
+        self.f.flush()  # survives the receiver being killed, which is what resume needs
+        self.next += 1
+        self.nak_sent = False
+
+    def finish(self):
+        """Verify and move the file into place. Returns (ok, message)."""
+        self.f.close()
+        with open(self.part, "rb") as f:
+            data = f.read()
+        try:
+            if self.compressed:
+                data = zlib.decompress(data)
+        except zlib.error as e:
+            self.discard()
+            return False, f"decompress failed: {e}"
+        if self.delta:
+            try:
+                with open(self.path, "rb") as f:
+                    base = f.read()
+            except OSError as e:
+                self.discard()
+                return False, f"delta base unreadable: {e}"
+            if hashlib.sha256(base).hexdigest() != self.delta["base_sha256"]:
+                self.discard()
+                return False, "file changed on the Pi since its signatures were taken; sync again"
+            try:
+                data = apply_delta(base, data, int(self.delta["block"]))
+            except (ValueError, struct.error) as e:
+                self.discard()
+                return False, f"delta apply failed: {e}"
+        digest = hashlib.sha256(data).hexdigest()
+        if digest != self.sha256:
+            self.discard()
+            return False, f"SHA-256 mismatch ({digest[:12]} != {self.sha256[:12]}); partial upload discarded"
+        tmp = self.path + ".tmp"
+        with open(tmp, "wb") as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        if self.mode is not None:
+            os.chmod(tmp, int(self.mode))
+        os.replace(tmp, self.target)
+        self.discard()
+        return True, f"{len(data)} bytes {'staged for' if self.stage else 'written to'} {self.path}"
+
+    def discard(self):
+        if not self.f.closed:
+            self.f.close()
+        for p in (self.part, self.sidecar):
+            try:
+                os.remove(p)
+            except OSError:
+                pass
+
+
+def serve(fd_in, out):
+    def send(frame):
+        out.write(frame)
+        out.flush()
+
+    reader = FrameReader()
+    upload = None
+    staged = {}
+    send(encode_json(READY, {"version": VERSION}))
+    while True:
+        ready, _, _ = select.select([fd_in], [], [], IDLE_TIMEOUT)
+        if not ready:
+            return
+        data = os.read(fd_in, 65536)
+        if not data:
+            return
+        for kind, seq, payload in reader.feed(data):
+            try:
+                if kind == HELLO:
+                    if upload:
+                        upload.f.close()
+                    upload = Upload(json.loads(payload))
+                    send(encode_json(OFFER, {"next": upload.next}))
+                elif kind == DATA and upload:
+                    if seq == upload.next:
+                        upload.write(payload)
+                        send(encode_frame(ACK, upload.next))
+                    elif seq < upload.next:
+                        send(encode_frame(ACK, upload.next))  # duplicate after a go-back
+                    elif not upload.nak_sent:
+                        upload.nak_sent = True
+                        send(encode_frame(NAK, upload.next))
+                elif kind == END and upload:
+                    ok, msg = upload.finish()
+                    if ok and upload.stage:
+                        staged[upload.path] = upload.target
+                    upload = None
+                    send(encode_json(DONE, {"ok": ok, "msg": msg}))
+                elif kind == SIGNATURES:
+                    request = json.loads(payload)
+                    send(encode_json(SIGNATURES, signatures(request["path"], int(request["block"]))))
+                elif kind == COMMIT:
+                    send(encode_json(DONE, commit(staged, json.loads(payload)["paths"])))
+                elif kind == BYE:
+                    send(encode_frame(BYE))
+                    return
+            except (OSError, ValueError, KeyError) as e:
+                upload = None
+                send(encode_json(ERROR, {"msg": f"{type(e).__name__}: {e}"}))
+
+
+def main():
+    fd_in = sys.stdin.fileno()
+    saved = None
+    if os.isatty(fd_in):
+        import termios
+        import tty
+
+        saved = termios.tcgetattr(fd_in)
+        tty.setraw(fd_in)  # no echo, no CR/LF translation: the link carries raw bytes
+    try:
+        serve(fd_in, sys.stdout.buffer)
+    finally:
+        if saved is not None:
+            termios.tcsetattr(fd_in, termios.TCSADRAIN, saved)
+
+
+if __name__ == "__main__":
+    main()
@@ -14,10 +14,27 @@ Protocol:
 Supported commands:
   {"cmd": "wifi_config", "ssid": "MyNetwork", "password": "secret"}
   {"cmd": "wifi_status"}
-  {"cmd": "ping"}
+  {"cmd": "job_status", "job_id": "...", "wait": 10}
+  {"cmd": "sender_config", "fps": 5, "encoding": "delta", "batch": 4, "smoothing": 0.3}
+                                        → any subset (none = just report); the
+                                          thermal sender applies it on its next frame
+  {"cmd": "ping", "t0": <sender time>}   → also returns t1 (received) and t2
+                                          (answered), Pi clock, for clock sync
 
 Responses are written back as JSON lines on the same serial port.
 
+wifi_config runs as a background job (nmcli can take 30 s): the listener first
+answers {"cmd": "wifi_config", "job_id": ..., "state": "running"} (no "ok"
+key), then writes the final {"cmd": "wifi_config", "job_id": ..., "ok", "msg"}
+line when the job finishes. job_status returns a job's state, waiting up to
+"wait" seconds (max 30) for it to finish; results are kept for JOB_TTL seconds.
+The read loop never blocks, so pings and status queries are answered while
+WiFi is reconnecting.
+
+sender_config validates the settings (see thermal_codec.py), merges them into
+THERMAL_CONTROL_FILE and answers with the full effective set as "config"; a
+bad value is rejected with ok=false and nothing changes.
+
 Usage on Pi:
   sudo python3 serial-wifi-listener.py &
   python3 usb-serial-thermal-sender.py
@@ -33,12 +50,23 @@ import subprocess
 import sys
 import threading
 import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+import thermal_codec
 
 logging.basicConfig(level=logging.INFO, format="%(asctime)s [serial-wifi] %(message)s")
 log = logging.getLogger("serial-wifi")
 
 USB_SERIAL_DEV = os.environ.get("THERMAL_USB_SERIAL", "/dev/ttyGS0")
 WPA_SUPPLICANT_CONF = "/etc/wpa_supplicant/wpa_supplicant.conf"
+JOB_TTL = 300.0
+MAX_WAIT = 30.0
+
+write_lock = threading.Lock()
+job_pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix="wifi-job")  # one nmcli connect at a time
+job_cond = threading.Condition()
+jobs = {}
 
 
 def run_cmd(cmd, timeout=15):
@@ -93,34 +121,130 @@ def configure_wifi(ssid, password):
         return False, "Permission denied. Run with sudo."
 
 
+def write_response(ser, resp):
+    line = json.dumps(resp) + "\n"
+    try:
+        with write_lock:
+            ser.write(line.encode("utf-8"))
+            ser.flush()
+    except Exception as e:
+        log.error("Failed to write response: %s", e)
+
+
+def in_background(fn, *args):
+    threading.Thread(target=fn, args=args, daemon=True).start()
+
+
+def expire_jobs():
+    cutoff = time.time() - JOB_TTL
+    for job_id in [j for j, job in jobs.items() if job["finished_at"] and job["finished_at"] < cutoff]:
+        del jobs[job_id]
+
+
+def start_wifi_job(ssid, password, ser):
+    job = {"job_id": uuid.uuid4().hex[:12], "state": "running", "ok": None, "msg": None, "finished_at": None}
+    with job_cond:
+        expire_jobs()
+        jobs[job["job_id"]] = job
+
+    def run():
+        try:
+            ok, msg = configure_wifi(ssid, password)
+        except Exception as e:
+            ok, msg = False, str(e)
+        with job_cond:
+            job.update(state="done" if ok else "failed", ok=ok, msg=msg, finished_at=time.time())
+            job_cond.notify_all()
+        write_response(ser, {"cmd": "wifi_config", "job_id": job["job_id"], "ok": ok, "msg": msg})
+        log.info("wifi_config job %s → ok=%s", job["job_id"], ok)
+
+    job_pool.submit(run)
+    return job["job_id"]
+
+
+def job_snapshot(job_id, wait):
+    deadline = time.monotonic() + min(max(wait, 0.0), MAX_WAIT)
+    with job_cond:
+        job = jobs.get(job_id)
+        while job and job["state"] == "running":
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            job_cond.wait(remaining)
+        return dict(job) if job else None
+
+
+def answer_job_status(job_id, wait, ser):
+    job = job_snapshot(job_id, wait)
+    if job is None:
+        write_response(ser, {"cmd": "job_status", "job_id": job_id, "ok": False, "msg": "Unknown or expired job"})
+        return
+    resp = {"cmd": "job_status", "job_id": job_id, "state": job["state"], "ok": job["ok"]}
+    if job["msg"] is not None:
+        resp["msg"] = job["msg"]
+    write_response(ser, resp)
+
+
+def answer_wifi_status(ser):
+    resp = {"cmd": "wifi_status", "ok": True}
+    resp.update(get_wifi_status())
+    write_response(ser, resp)
+
+
+def sender_config(obj):
+    update = {k: v for k, v in obj.items() if k in thermal_codec.DEFAULTS}
+    try:
+        config = thermal_codec.write_control(update) if update else thermal_codec.read_control()
+    except ValueError as e:
+        return False, str(e), None
+    except OSError as e:
+        return False, f"Cannot write {thermal_codec.CONTROL_FILE}: {e}", None
+    return True, "Applied on the next frame" if update else "Current settings", config
+
+
 def handle_command(obj, ser):
+    received_at = time.time()
     cmd = obj.get("cmd", "")
     resp = {"cmd": cmd}
 
     if cmd == "ping":
         resp["ok"] = True
         resp["msg"] = "pong"
+        if "t0" in obj:
+            # NTP-style timestamps so the PC bridge can estimate clock offset and RTT
+            resp["t0"] = obj["t0"]
+            resp["t1"] = received_at
     elif cmd == "wifi_status":
-        status = get_wifi_status()
-        resp["ok"] = True
-        resp.update(status)
+        in_background(answer_wifi_status, ser)
+        return
     elif cmd == "wifi_config":
-        ssid = obj.get("ssid", "")
-        password = obj.get("password", "")
-        ok, msg = configure_wifi(ssid, password)
-        resp["ok"] = ok
-        resp["msg"] = msg
+        resp["job_id"] = start_wifi_job(obj.get("ssid", ""), obj.get("password", ""), ser)
+        resp["state"] = "running"
+    elif cmd == "sender_config":
+        resp["ok"], resp["msg"], config = sender_config(obj)
+        if config is not None:
+            resp["config"] = config
+    elif cmd == "job_status":
+        try:
+            wait = float(obj.get("wait", 0) or 0)
+        except (TypeError, ValueError):
+            wait = 0.0
+        if wait > 0:
+            in_background(answer_job_status, obj.get("job_id"), wait, ser)
+        else:
+            answer_job_status(obj.get("job_id"), 0, ser)
+        return
     else:
         resp["ok"] = False
         resp["msg"] = f"Unknown command: {cmd}"
 
-    line = json.dumps(resp) + "\n"
-    try:
-        ser.write(line.encode("utf-8"))
-        ser.flush()
-    except Exception as e:
-        log.error("Failed to write response: %s", e)
-    log.info("Handled cmd=%s → ok=%s", cmd, resp.get("ok"))
+    if "t1" in resp:
+        resp["t2"] = time.time()
+    write_response(ser, resp)
+    if cmd == "ping":
+        log.debug("Handled ping")
+    else:
+        log.info("Handled cmd=%s → %s", cmd, resp.get("state") or f"ok={resp.get('ok')}")
 
 
 def listen_loop():
@@ -0,0 +1,290 @@
+#!/usr/bin/env python3
+"""
+Thermal frame encodings and live sender settings, shared by the Pi senders and
+the PC bridge (bridges/usb-thermal-receiver.py imports this file directly).
+
+Settings (all optional in a control update; anything omitted keeps its value):
+  fps             frames per second (0.1–50; the AMG8833 itself samples at 10)
+  encoding        "json"   – the usual {"type": "thermal_data", ...} line
+                  "binary" – {"type": "thermal_packed", ...}: the grid as int16
+                             little-endian centi-degrees, base64 (~4x smaller)
+                  "delta"  – {"type": "thermal_delta", ...}: a packed keyframe
+                             every keyframe_every frames, otherwise only the
+                             pixels whose centi-degree value changed
+  batch           frames per line; >1 sends {"type": "thermal_batch", "frames": [...]}
+  smoothing       exponential moving average weight of the previous frame (0 = raw)
+  keyframe_every  delta keyframe interval (also bounds recovery after a lost line)
+
+Every encoded frame carries "seq" so the receiver can tell when a delta has
+nothing to apply to; FrameDecoder turns all of the above back into plain
+thermal_data dicts and skips deltas until the next keyframe after a gap.
+
+The USB sender picks settings up from CONTROL_FILE (written by
+serial-wifi-listener.py's {"cmd": "sender_config"}), checked once per frame, so
+a change applies on the next frame without a restart.
+"""
+
+import base64
+import json
+import os
+import struct
+import tempfile
+
+CONTROL_FILE = os.environ.get("THERMAL_CONTROL_FILE", "/var/tmp/cca-thermal-control.json")
+
+ENCODINGS = ("json", "binary", "delta")
+DEFAULTS = {"fps": 10.0, "encoding": "json", "batch": 1, "smoothing": 0.0, "keyframe_every": 20}
+LIMITS = {"fps": (0.1, 50.0), "batch": (1, 50), "smoothing": (0.0, 0.95), "keyframe_every": (1, 600)}
+FRAME_TYPES = ("thermal_data", "thermal_packed", "thermal_delta", "thermal_batch")
+
+SCALE = 100  # centi-degrees: int16 covers ±327 °C at 0.01 °C, finer than the AMG8833's 0.25 °C
+DELTA_ENTRY = struct.Struct("<Bh")  # pixel index, change in centi-degrees
+
+
+def validate(update):
+    """Cleaned copy of the known settings in update; raises ValueError on a bad value."""
+    if not isinstance(update, dict):
+        raise ValueError("settings must be a JSON object")
+    clean = {}
+    for key in DEFAULTS:
+        if key not in update:
+            continue
+        value = update[key]
+        if key == "encoding":
+            if value not in ENCODINGS:
+                raise ValueError(f"encoding must be one of {', '.join(ENCODINGS)}")
+            clean[key] = value
+            continue
+        kind = float if isinstance(DEFAULTS[key], float) else int
+        try:
+            if isinstance(value, bool) or (kind is int and float(value) != int(value)):
+                raise ValueError
+            value = kind(value)
+        except (TypeError, ValueError):
+            raise ValueError(f"{key} must be a {'number' if kind is float else 'whole number'}")
+        low, high = LIMITS[key]
+        if not low <= value <= high:
+            raise ValueError(f"{key} must be between {low} and {high}")
+        clean[key] = value
+    return clean
+
+
+def read_control(path=CONTROL_FILE):
+    """Current settings: DEFAULTS overlaid with whatever valid values the control file holds."""
+    config = dict(DEFAULTS)
+    try:
+        with open(path) as f:
+            config.update(validate(json.load(f)))
+    except (OSError, ValueError):
+        pass
+    return config
+
+
+def write_control(update, path=CONTROL_FILE):
+    """Merge a validated update into the control file (atomically) and return the result."""
+    config = read_control(path)
+    config.update(validate(update))
+    directory = os.path.dirname(path) or "."
+    fd, tmp = tempfile.mkstemp(prefix=".thermal-control-", dir=directory)
+    try:
+        with os.fdopen(fd, "w") as f:
+            json.dump(config, f)
+        os.chmod(tmp, 0o644)
+        os.replace(tmp, path)
+    except BaseException:
+        os.unlink(tmp)
+        raise
+    return config
+
+
+class ControlFile:
+    """Polls the control file by mtime; changed() returns the new settings or None."""
+
+    def __init__(self, path=CONTROL_FILE):
+        self.path = path
+        self.mtime = None
+
+    def changed(self):
+        try:
+            mtime = os.stat(self.path).st_mtime_ns
+        except OSError:
+            mtime = None
+        if mtime == self.mtime:
+            return None
+        self.mtime = mtime
+        return read_control(self.path)
+
+
+def pack_grid(values):
+    return base64.b64encode(struct.pack(f"<{len(values)}h", *values)).decode("ascii")
+
+
+def unpack_grid(data):
+    raw = base64.b64decode(data)
+    return list(struct.unpack(f"<{len(raw) // 2}h", raw))
+
+
+class FrameEncoder:
+    """Turns sensor frames into the lines to send under the current settings."""
+
+    def __init__(self, build_payload, config=None):
+        self.build_payload = build_payload
+        self.config = dict(DEFAULTS)
+        self.seq = 0
+        self.smoothed = None
+        self.reference = None  # last quantised grid the receiver holds (delta)
+        self.since_key = 0
+        self.pending = []
+        if config:
+            self.configure(config)
+
+    @property
+    def interval(self):
+        return 1.0 / self.config["fps"]
+
+    def configure(self, update):
+        """Apply validated settings; the next encode() uses them. Returns lines to flush now."""
+        previous = self.config
+        self.config = {**previous, **validate(update)}
+        if self.config["encoding"] != previous["encoding"]:
+            self.reference = None  # next delta frame is a keyframe
+        if self.config["smoothing"] == 0:
+            self.smoothed = None
+        if len(self.pending) >= self.config["batch"]:
+            return self.flush()
+        return []
+
+    def encode(self, frame):
+        """Lines (dicts) to send for this frame; empty while a batch is filling."""
+        flat = [value for row in frame for value in row]
+        alpha = self.config["smoothing"]
+        if alpha and self.smoothed is not None and len(self.smoothed) == len(flat):
+            self.smoothed = [alpha * s + (1 - alpha) * x for s, x in zip(self.smoothed, flat)]
+        else:
+            self.smoothed = flat
+        if alpha:
+            flat = self.smoothed
+        width = len(frame[0]) if frame else 0
+        grid = [flat[i : i + width] for i in range(0, len(flat), width)] if width else []
+
+        self.seq += 1
+        encoding = self.config["encoding"]
+        if encoding == "json":
+            message = self.build_payload([[round(v, 2) for v in row] for row in grid] if alpha else grid)
+            message["seq"] = self.seq
+        else:
+            message = self._packed(grid, flat, delta=encoding == "delta")
+
+        self.pending.append(message)
+        if len(self.pending) >= self.config["batch"]:
+            return self.flush()
+        return []
+
+    def _packed(self, grid, flat, delta):
+        payload = self.build_payload(grid)
+        values = [int(round(v * SCALE)) for v in flat]
+        message = {
+            "type": "thermal_packed",
+            "seq": self.seq,
+            "timestamp": payload["timestamp"],
+            "w": len(grid[0]) if grid else 0,
+            "h": len(grid),
+            "scale": SCALE,
+        }
+        if not delta:
+            message["data"] = pack_grid(values)
+            return message
+        message["type"] = "thermal_delta"
+        keyframe = (
+            self.reference is None
+            or len(self.reference) != len(values)
+            or self.since_key >= self.config["keyframe_every"]
+        )
+        changes = [] if keyframe else [(i, v - r) for i, (v, r) in enumerate(zip(values, self.reference)) if v != r]
+        # A delta entry is 3 bytes against 2 per pixel in a keyframe; past ~2/3 changed a keyframe is cheaper
+        if keyframe or len(changes) * 3 >= len(values) * 2:
+            message["key"] = True
+            message["data"] = pack_grid(values)
+            self.since_key = 1
+        else:
+            message["key"] = False
+            message["data"] = base64.b64encode(b"".join(DELTA_ENTRY.pack(i, d) for i, d in changes)).decode("ascii")
+            self.since_key += 1
+        self.reference = values
+        return message
+
+    def flush(self):
+        pending, self.pending = self.pending, []
+        if not pending:
+            return []
+        if len(pending) == 1:
+            return pending
+        return [{"type": "thermal_batch", "frames": pending}]
+
+
+class FrameDecoder:
+    """Rebuilds thermal_data dicts from any FRAME_TYPES message (one decoder per device)."""
+
+    def __init__(self, sensor_info=None):
+        self.sensor_info = sensor_info or {"model": "AMG8833", "temperature_unit": "C", "data_source": "sensor"}
+        self.reference = None
+        self.last_seq = None
+        self.dropped = 0  # delta frames skipped while waiting for a keyframe
+
+    def decode(self, message):
+        kind = message.get("type")
+        if kind == "thermal_batch":
+            frames = []
+            for item in message.get("frames") or []:
+                if isinstance(item, dict):
+                    frames += self.decode(item)
+            return frames
+        if kind == "thermal_data":
+            self._track(message.get("seq"))
+            return [message]
+        if kind not in ("thermal_packed", "thermal_delta"):
+            return []
+        try:
+            return self._unpack(message)
+        except (KeyError, TypeError, ValueError, struct.error):
+            self.reference = None
+            self.dropped += 1
+            return []
+
+    def _track(self, seq):
+        gap = isinstance(seq, int) and self.last_seq is not None and seq != self.last_seq + 1
+        if isinstance(seq, int):
+            self.last_seq = seq
+        return gap
+
+    def _unpack(self, message):
+        seq = message.get("seq")
+        gap = self._track(seq)
+        width, height = int(message["w"]), int(message["h"])
+        scale = message.get("scale") or SCALE
+        if message["type"] == "thermal_packed" or message.get("key"):
+            values = unpack_grid(message["data"])
+        else:
+            if gap or self.reference is None:
+                self.reference = None
+                self.dropped += 1
+                return []
+            values = list(self.reference)
+            raw = base64.b64decode(message["data"])
+            for i, d in DELTA_ENTRY.iter_unpack(raw[: len(raw) - len(raw) % DELTA_ENTRY.size]):
+                values[i] += d
+        if len(values) != width * height:
+            raise ValueError("grid size mismatch")
+        self.reference = values if message["type"] == "thermal_delta" else None
+        grid = [[values[r * width + c] / scale for c in range(width)] for r in range(height)]
+        return [
+            {
+                "type": "thermal_data",
+                "timestamp": message.get("timestamp"),
+                "thermal_data": grid,
+                "grid_size": {"width": width, "height": height},
+                "sensor_info": dict(self.sensor_info),
+                "status": "active",
+                "seq": seq,
+            }
+        ]
@@ -12,6 +12,12 @@ Same JSON format as the Bluetooth sender, so use the same bridge on the PC:
   Pi: python3 usb-serial-thermal-sender.py
 
 Requires the Pi to be in USB serial gadget mode (g_serial); no Bluetooth deps.
+
+Frame rate, encoding (json/binary/delta), batching and smoothing can be changed
+while it runs: serial-wifi-listener.py's {"cmd": "sender_config", "fps": 5,
+"encoding": "delta"} writes them to THERMAL_CONTROL_FILE, which this loop
+checks before every frame (see thermal_codec.py). Anything but json needs
+bridges/usb-thermal-receiver.py on the PC, which decodes all of them.
 """
 
 import json
@@ -20,6 +26,8 @@ import os
 import time
 from datetime import datetime
 
+from thermal_codec import ControlFile, FrameEncoder
+
 try:
     import board
     import busio
@@ -34,7 +42,7 @@ logger = logging.getLogger("thermal-usb-serial")
 
 GRID_WIDTH = 8
 GRID_HEIGHT = 8
-UPDATE_INTERVAL = 0.1  # 10 Hz
+UPDATE_INTERVAL = 0.1  # 10 Hz until a control update says otherwise
 # USB serial gadget (g_serial) on Pi; over USB this becomes COMx on Windows
 USB_SERIAL_DEV = os.environ.get("THERMAL_USB_SERIAL", "/dev/ttyGS0")
 WAIT_INTERVAL = 2.0
@@ -69,6 +77,10 @@ def build_payload(frame):
     }
 
 
+def write_message(ser, message):
+    ser.write((json.dumps(message, separators=(",", ":")) + "\n").encode("utf-8"))
+
+
 def main():
     logger.info("📡 Waiting for %s (connect Pi via USB; on PC run: node bluetooth-thermal-receiver.js COM3)", USB_SERIAL_DEV)
     while not os.path.exists(USB_SERIAL_DEV):
@@ -83,14 +95,20 @@ def main():
     logger.info("✅ Opened %s — sending thermal data (same format as Bluetooth)", USB_SERIAL_DEV)
     last_log_time = time.time()
     frame_count = 0
+    encoder = FrameEncoder(build_payload, {"fps": 1.0 / UPDATE_INTERVAL})
+    control = ControlFile()
 
     try:
         while True:
             try:
+                settings = control.changed()
+                if settings is not None:
+                    for message in encoder.configure(settings):
+                        write_message(ser, message)
+                    logger.info("⚙️  Sender settings: %s", encoder.config)
                 frame = read_sensor_frame()
-                payload = build_payload(frame)
-                message = (json.dumps(payload) + "\n").encode("utf-8")
-                ser.write(message)
+                for message in encoder.encode(frame):
+                    write_message(ser, message)
                 frame_count += 1
                 current_time = time.time()
                 if current_time - last_log_time >= 5.0:
@@ -110,7 +128,7 @@ def main():
                 else:
                     logger.warning("OSError reading sensor: %s; retrying in 1s...", e)
                 time.sleep(1.0)
-            time.sleep(UPDATE_INTERVAL)
+            time.sleep(encoder.interval)
     except KeyboardInterrupt:
         logger.info("🛑 Stopping...")
     finally:
@@ -37,10 +37,12 @@ export async function POST(request: NextRequest) {
     const { ReadlineParser } = await import("@serialport/parser-readline");
 
     const result = await new Promise<{ ok: boolean; msg: string }>((resolve) => {
-      const timeout = setTimeout(() => {
-        try { sp.close(); } catch {}
-        resolve({ ok: false, msg: `No response from device on ${port} within 8s. Is the WiFi listener running?` });
-      }, 8000);
+      const giveUp = (seconds: number, msg: string) =>
+        setTimeout(() => {
+          try { sp.close(); } catch {}
+          resolve({ ok: false, msg });
+        }, seconds * 1000);
+      let timeout = giveUp(8, `No response from device on ${port} within 8s. Is the WiFi listener running?`);
 
       const sp = new SerialPort({ path: port, baudRate: baud, autoOpen: false });
       const parser = sp.pipe(new ReadlineParser({ delimiter: "\n" }));
@@ -54,6 +56,12 @@ export async function POST(request: NextRequest) {
         try {
           const resp = JSON.parse(line.trim());
           if (resp.cmd === "wifi_config") {
+            // The Pi listener first acks with { job_id, state: "running" } and no "ok"; wait for the result line
+            if (!("ok" in resp)) {
+              clearTimeout(timeout);
+              timeout = giveUp(40, `Device accepted WiFi config (job ${resp.job_id}) but reported no result within 40s.`);
+              return;
+            }
             clearTimeout(timeout);
             try { sp.close(); } catch {}
             resolve({ ok: Boolean(resp.ok), msg: resp.msg || (resp.ok ? "WiFi configured" : "Device error") });